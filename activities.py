@@ -0,0 +1,186 @@
+"""
+Writes to the activity table: start (returns the new row's id as the activity handle),
+stop by handle, close everything open, and batches of queued client events; and the
+latest open activity, which the live board shows.
+
+Every close goes through rollup.with_rollup so the daily rollup commits with it.
+The caller owns the transaction.
+"""
+import os
+from datetime import datetime, timedelta
+
+from presence import ACTIVITY_LABELS
+from rollup import CLOSED_OUTPUT, with_rollup
+
+ACTIVITY_BATCH_MAX_EVENTS = int(os.environ.get('ACTIVITY_BATCH_MAX_EVENTS', '200'))
+# Client timestamps further in the future than this are clamped to the server time
+ACTIVITY_CLOCK_SKEW = float(os.environ.get('ACTIVITY_CLOCK_SKEW', '300'))
+# Idempotency keys are remembered this many days
+EVENT_KEY_RETENTION_DAYS = int(os.environ.get('EVENT_KEY_RETENTION_DAYS', '7'))
+
+# Duration from start_time to the stop time parameter, as HH:MM:SS
+_DURATION_TO = "CONVERT(VARCHAR(8), DATEADD(SECOND, DATEDIFF(SECOND, start_time, ?), 0), 108)"
+
+
+class BatchError(ValueError):
+    """An event of a batch is malformed; nothing of the batch is applied."""
+
+    def __init__(self, index, message):
+        super().__init__(f"event {index}: {message}")
+        self.index = index
+
+
+def start(cursor, emp_id, activity_type, activity_name, start_time):
+    """Insert an open activity and return its id (the handle /stop takes)."""
+    cursor.execute("""
+        INSERT INTO activity (emp_id, activity_type, activity_name, start_time)
+        OUTPUT INSERTED.id
+        VALUES (?, ?, ?, ?)
+    """, emp_id, activity_type, activity_name, start_time)
+    return int(cursor.fetchone()[0])
+
+
+def stop(cursor, emp_id, activity_id, stop_time):
+    """Close the employee's open activity `activity_id`; returns whether a row was closed."""
+    cursor.execute(with_rollup(f"""
+        UPDATE activity
+        SET stop_time = ?, total_duration = {_DURATION_TO}
+        {CLOSED_OUTPUT}
+        WHERE id = ? AND emp_id = ? AND stop_time IS NULL AND start_time <= ?
+    """) + "SELECT COUNT(*) FROM @closed;", stop_time, stop_time, activity_id, emp_id, stop_time)
+    return cursor.fetchone()[0] > 0
+
+
+def close_open(cursor, emp_id, stop_time):
+    """Close all open activities of the employee; returns how many were closed."""
+    cursor.execute(with_rollup(f"""
+        UPDATE activity
+        SET stop_time = ?, total_duration = {_DURATION_TO}
+        {CLOSED_OUTPUT}
+        WHERE emp_id = ? AND stop_time IS NULL
+    """) + "SELECT COUNT(*) FROM @closed;", stop_time, stop_time, emp_id)
+    return cursor.fetchone()[0]
+
+
+def latest_open(cursor, emp_id, since):
+    """
+    (activity_type, activity_name, start_time) of the employee's latest open activity
+    started at or after `since` (the one the live board shows), or None.
+    """
+    cursor.execute("""
+        SELECT TOP 1 activity_type, activity_name, start_time
+        FROM activity
+        WHERE emp_id = ? AND stop_time IS NULL AND start_time >= ?
+        ORDER BY start_time DESC
+    """, emp_id, since)
+    row = cursor.fetchone()
+    return tuple(row) if row else None
+
+
+def _timestamp(value, now):
+    # ISO 8601 client time -> naive local server time, clamped to now + skew
+    moment = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    if moment > now + timedelta(seconds=ACTIVITY_CLOCK_SKEW):
+        moment = now
+    return moment.replace(microsecond=0)
+
+
+def parse_events(events, now):
+    """Validate a batch; returns the events as dicts with parsed timestamps."""
+    if not isinstance(events, list) or not events:
+        raise BatchError(0, "expected a non-empty list of events")
+    if len(events) > ACTIVITY_BATCH_MAX_EVENTS:
+        raise BatchError(ACTIVITY_BATCH_MAX_EVENTS, f"at most {ACTIVITY_BATCH_MAX_EVENTS} events per batch")
+
+    parsed = []
+    for index, event in enumerate(events):
+        if not isinstance(event, dict):
+            raise BatchError(index, "expected an object")
+        key = event.get('key')
+        if not isinstance(key, str) or not 0 < len(key) <= 64:
+            raise BatchError(index, "'key' must be a string of 1-64 characters")
+        try:
+            at = _timestamp(event.get('at'), now)
+        except (TypeError, ValueError):
+            raise BatchError(index, "'at' must be an ISO 8601 timestamp")
+
+        op = event.get('op')
+        if op == 'start':
+            if event.get('type') not in ACTIVITY_LABELS:
+                raise BatchError(index, "'type' must be one of " + ", ".join(ACTIVITY_LABELS))
+            label = event.get('label')
+            if not isinstance(label, str) or not 0 < len(label) <= 100:
+                raise BatchError(index, "'label' must be a string of 1-100 characters")
+            parsed.append({'key': key, 'op': op, 'at': at, 'type': event['type'], 'label': label})
+        elif op == 'stop':
+            activity_id, start_key = event.get('activity_id'), event.get('start_key')
+            if not isinstance(activity_id, int) and not isinstance(start_key, str):
+                raise BatchError(index, "a stop needs 'activity_id' or the 'start_key' of its start")
+            parsed.append({'key': key, 'op': op, 'at': at, 'activity_id': activity_id, 'start_key': start_key})
+        else:
+            raise BatchError(index, "'op' must be 'start' or 'stop'")
+    return parsed
+
+
+def apply_batch(cursor, emp_id, events):
+    """
+    Apply parsed events in order. Events whose key was applied before are skipped and
+    report their stored outcome. Returns (results, open_started) where open_started is
+    the latest activity started by this batch that is still open, or None.
+    """
+    # The batch's own keys plus the start keys its stops refer to (possibly synced earlier)
+    keys = list(dict.fromkeys([event['key'] for event in events] +
+                              [event['start_key'] for event in events if event.get('start_key')]))
+    # Lock the employee's key range so a concurrent retry of the same batch waits for this one
+    cursor.execute(f"""
+        SELECT idempotency_key, activity_id, outcome
+        FROM activity_event_keys WITH (UPDLOCK, HOLDLOCK)
+        WHERE emp_id = ? AND idempotency_key IN ({', '.join('?' * len(keys))})
+    """, emp_id, *keys)
+    seen = {key: (activity_id, outcome) for key, activity_id, outcome in cursor.fetchall()}
+    applied = {event['key'] for event in events} & set(seen)
+
+    results, new_keys = [], []
+    started = {}  # activity id -> start event, for starts of this batch still open
+    for event in events:
+        key = event['key']
+        if key in applied:
+            activity_id, outcome = seen[key]
+            results.append({'key': key, 'activity_id': activity_id, 'outcome': outcome, 'duplicate': True})
+            continue
+
+        if event['op'] == 'start':
+            activity_id = start(cursor, emp_id, event['type'], event['label'], event['at'])
+            started[activity_id] = event
+            outcome = 'started'
+        else:
+            activity_id = event['activity_id']
+            if activity_id is None:
+                activity_id = seen.get(event['start_key'], (None, None))[0]
+            if activity_id is None:
+                outcome = 'unknown_activity'
+            else:
+                outcome = 'stopped' if stop(cursor, emp_id, activity_id, event['at']) else 'not_open'
+                started.pop(activity_id, None)
+
+        seen[key] = (activity_id, outcome)
+        applied.add(key)
+        new_keys.append((emp_id, key, activity_id, outcome))
+        results.append({'key': key, 'activity_id': activity_id, 'outcome': outcome, 'duplicate': False})
+
+    if new_keys:
+        cursor.fast_executemany = True
+        cursor.executemany("""
+            INSERT INTO activity_event_keys (emp_id, idempotency_key, activity_id, outcome)
+            VALUES (?, ?, ?, ?)
+        """, new_keys)
+    cursor.execute("DELETE FROM activity_event_keys WHERE emp_id = ? AND created_at < ?",
+                   emp_id, datetime.now() - timedelta(days=EVENT_KEY_RETENTION_DAYS))
+
+    open_started = None
+    if started:
+        activity_id, event = max(started.items(), key=lambda item: item[1]['at'])
+        open_started = dict(event, activity_id=activity_id)
+    return results, open_started
@@ -1,23 +1,106 @@
 # Importing required modules from Flask and other libraries
 from flask import Flask, render_template, request, redirect, session, jsonify, url_for, send_file
-from flask_socketio import SocketIO, emit
+from werkzeug.utils import secure_filename
+from flask_socketio import SocketIO, emit, join_room
+import json
+import logging
+import os
+import zlib
 import pandas as pd
-import pyodbc  # Used for SQL Server database connection
-from datetime import datetime, timedelta, date  # To work with date and time
-from io import BytesIO
-from helpers  import get_user, get_tasks_for_process, store_login, store_logout, get_active_activity_counts,authenticate_user,set_user_session, get_active_session, stop_all_open_activities
-
+from datetime import datetime, timedelta  # To work with date and time
+from dashboard import (TEAM_LOG_MAX_PAGE_SIZE, TEAM_LOG_PAGE_SIZE, decode_page_cursor, load_dashboard,
+                       load_team_log, load_team_log_page, live_activity, resolve_date_range, team_log_filters)
+from report import (ALL_PROCESSES, STREAM_REPORT_DAYS, XLSX_MIMETYPE, get_login_range, get_task_names, iter_file,
+                    parse_report_range, read_report_frames, report_filename, stream_org_workbook, stream_workbook,
+                    write_workbook)
+from report_jobs import ReportJobQueue, report_key
+from occupancy import OCCUPANCY_BUCKET_MINUTES, OCCUPANCY_MAX_DAYS, load_occupancy, valid_bucket_minutes
+from export import EXPORT_QUERIES, FORMATS, WRITERS, open_export, parquet_available
+from report_engine import compute_team_report
+from rollup import rollup_cli
+from migrate import db_cli
+from archive import archive_cli
+from events import EventBatcher, emp_room, process_room
+from db import PoolTimeout, get_db_connection, init_app as init_db, pool as db_pool
+from db_executor import ExecutorBusy, executor as db_executor
+from presence import ACTIVITY_LABELS, registry as presence, ensure_registry_loaded, load_registry
+from audit import audit_log
+from lifecycle import record_login, record_logout
+import refdata
+import activities
+import instrumentation
+import event_bus
+from helpers  import get_user, get_tasks_for_process, authenticate_user,set_user_session, active_sessions, forget_active_session, stop_all_open_activities
+
+
+# Leveled, structured logging (LOG_LEVEL / LOG_FORMAT, see instrumentation.py)
+instrumentation.configure_logging()
+logger = logging.getLogger(__name__)
 
 # Initializing Flask app
 app = Flask(__name__)
 app.secret_key = "supersecretkey"  # Secret key to manage session security
-socketio = SocketIO(app, cors_allowed_origins="*")  # Enable real-time communication via SocketIO
+# Enable real-time communication via SocketIO. SOCKETIO_ASYNC_MODE picks threading, eventlet or
+# gevent (default: the first one installed); see serve.py for the production entry point.
+# With SOCKETIO_MESSAGE_QUEUE emits reach the clients of every worker (see event_bus.py).
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=os.environ.get('SOCKETIO_ASYNC_MODE') or None,
+                    client_manager=event_bus.client_manager())
+# Under eventlet/gevent the blocking pyodbc calls run on a bounded pool of OS threads
+db_executor.configure(socketio.async_mode)
+
+events = EventBatcher(socketio)  # Coalesces emits into per-room micro-batches
+report_jobs = ReportJobQueue()   # Background report generation + workbook cache
 
 pd.set_option('future.no_silent_downcasting', True)
 
-# Function to create a database connection using DSN
-def get_db_connection():
-    return pyodbc.connect('DSN=AdherenceTracker')
+# Pooled database connections, one per request (see db.py)
+init_db(app)
+
+# Request timing for /metrics
+instrumentation.init_app(app)
+instrumentation.register_stats('db_pool', db_pool.stats)
+instrumentation.register_stats('active_session_cache', active_sessions.stats)
+instrumentation.register_stats('refdata', refdata.stats)
+instrumentation.register_stats('audit', audit_log.stats)
+instrumentation.register_stats('db_executor', db_executor.stats)
+instrumentation.register_stats('event_bus', event_bus.stats)
+
+# Backpressure: a saturated DB executor or pool answers 503 instead of queueing without bound
+@app.errorhandler(ExecutorBusy)
+@app.errorhandler(PoolTimeout)
+def database_busy(e):
+    logger.warning("Database busy: %s", e, extra={'path': request.path})
+    response = jsonify({'status': 'error', 'message': 'Server busy, retry shortly'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
+# `flask rollup rebuild|check` maintenance commands
+app.cli.add_command(rollup_cli)
+# `flask db upgrade|status` schema migrations
+app.cli.add_command(db_cli)
+# `flask archive run|status` retention of old activity and logs rows
+app.cli.add_command(archive_cli)
+
+# Processes of the logged-in user as a list
+def session_processes():
+    processes = session.get('process') or session.get('user', {}).get('process') or []
+    return [processes] if isinstance(processes, str) else list(processes)
+
+# Rooms an associate's events are delivered to: their own view and their processes' managers
+def activity_rooms(emp_id):
+    return [emp_room(emp_id)] + [process_room(process) for process in session_processes()]
+
+# SocketIO clients join their own room, managers also the rooms of their processes
+@socketio.on('connect')
+def on_socket_connect():
+    user = session.get('user')
+    if not user:
+        return False
+    join_room(emp_room(user['emp_id']))
+    if user['role'] == 'manager':
+        for process in session_processes():
+            join_room(process_room(process))
 
 # Redirect the root URL to login page
 @app.route('/')
@@ -43,14 +126,20 @@ def register():
 
         conn.commit()  # Save changes
         conn.close()
+        refdata.invalidate_employee(data['emp_id'])  # Drop the cached directory entry
         return redirect('/login')  # Redirect to login after registration
     return render_template('register.html')  # Render registration page on GET request
 
+# Requests that never need the active session (static files, the tab-close beacon)
+SKIP_ACTIVE_SESSION_ENDPOINTS = {'static', 'stop_activity_on_exit'}
+
 @app.before_request
 def load_active_session():
+    if request.endpoint is None or request.endpoint in SKIP_ACTIVE_SESSION_ENDPOINTS:
+        return
     if 'user' in session and 'active_session' not in session:
         emp_id = session['user']['emp_id']
-        active_session = get_active_session(emp_id)
+        active_session = active_sessions.get(emp_id)
         if active_session:
             session['active_session'] = active_session
 
@@ -67,22 +156,10 @@ def login():
             session['name'] = user['name']
             session['role'] = user['role']
             session['process'] = user['process']
-            
-            print("@@@@@@@@@@@",user)
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM cred WHERE emp_id=? AND password=?", emp_id, password)
-            user = cursor.fetchone()
-            conn.close()
-            session['emp_id'] = emp_id
-
-            store_login(emp_id)  # Record login time
-            if user:
-                session['user'] = dict(emp_id=user.emp_id, role=user.role,process=user.process)
-                return redirect('/associate' if user.role == 'associate' else '/manager')
-            else:
-                error = "Incorrect password"
-                return render_template('login.html', error=error)
+
+            record_login(emp_id)  # Start or continue today's shift
+            session['user'] = dict(emp_id=user['emp_id'], role=user['role'], process=user['process'][0])
+            return redirect('/associate' if user['role'] == 'associate' else '/manager')
         else:
             error = "Incorrect password"
             return render_template('login.html', error=error)
@@ -99,7 +176,6 @@ def associate_dashboard():
         return redirect('/login')
 
     emp_id = session['user']['emp_id']
-    # print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!",session.get('process'))
 
     
     process = session['process']
@@ -107,7 +183,7 @@ def associate_dashboard():
     tasks = get_tasks_for_process(process)
 
     if 'active_session' not in session:
-        active_session = get_active_session(emp_id)
+        active_session = active_sessions.get(emp_id)
         if active_session:
             session['active_session'] = active_session
 
@@ -123,12 +199,12 @@ def associate_dashboard():
     conn.commit()
     conn.close()
 
-    # Send login event to frontend via SocketIO
-    socketio.emit('new_activity', {
+    # Send login event to the associate's managers via SocketIO
+    events.emit('new_activity', {
         'emp_id': emp_id,
         'type': 'login',
         'desc': f'Logged in at {login_time.strftime("%H:%M:%S")}'
-    }, namespace='/')
+    }, activity_rooms(emp_id))
 
     # Render the associate dashboard
     return render_template('associate.html', emp_id=emp_id,name=session['name'], tasks=tasks, login_time=login_time.strftime('%Y-%m-%d %H:%M:%S'),active_session=session.get('active_session'))
@@ -139,22 +215,15 @@ def activity():
     if 'user' not in session:
         return 'Unauthorized', 401
     data = request.get_json()  # Get JSON data from POST request
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    # Log the activity in the logs table
-    cursor.execute("""
-        INSERT INTO logs (emp_id, activity_type, description)
-        VALUES (?, ?, ?)""",
-        session['user']['emp_id'], data['type'], data['description'])
-    conn.commit()
-    conn.close()
+    # Log the activity in the logs table (queued when AUDIT_WRITE_BEHIND is on)
+    audit_log.record(session['user']['emp_id'], data['type'], data['description'])
 
-    # Broadcast the activity using SocketIO to all connected clients
-    socketio.emit('new_activity', {
+    # Send the activity to the associate's own view and their managers
+    events.emit('new_activity', {
         'emp_id': session['user']['emp_id'],
         'type': data['type'],
         'desc': data['description']
-    }, namespace='/', broadcast=True)
+    }, activity_rooms(session['user']['emp_id']))
     return '', 204  # Return empty response with 204 No Content
 
 # Route to handle user logout
@@ -164,16 +233,7 @@ def logout():
 
     # If user was logged in, log the logout activity
     if emp_id:
-        store_logout(emp_id)
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        # cursor.execute("""
-        #     INSERT INTO logs (emp_id, activity_type, description, timestamp)
-        #     VALUES (?, ?, ?, ?)
-        # """, emp_id, 'logout', 'User logged out', datetime.now())
-        
-        conn.commit()
-        conn.close()
+        record_logout(emp_id)
 
     if 'user' in session:
         stop_all_open_activities(session['user']['emp_id'])
@@ -186,130 +246,119 @@ def logout():
 
 ########################## Activity ###############################################
 
-# Route to start an activity (task, break, session)
+# Route to start an activity (task, break, session); returns its handle
 @app.route('/start', methods=['POST'])
 def start_activity():
     activity_type = request.form.get('type')
     activity_name = request.form.get('label')
-    session['activity_start_time'] = datetime.now().isoformat()
-    session['activity_type'] = activity_type
-    session['activity_name'] = activity_name
-
-    # Insert into AssociateActivity table
     emp_id = session['user']['emp_id']
-    start_time = datetime.now()
+    start_time = datetime.now().replace(microsecond=0)
 
-    # Prepare activity data for logging
-    activity_data = {
-        'emp_id': session['user']['emp_id'],
-        'activity_type': session.get('activity_type'),
-        'activity_name': session.get('activity_name'),
-        'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'),
-        'stop_time': None,
-        'total_duration': None
-    }
-    print("emp_id:", emp_id)
-    print("activity_name:", activity_name)
+    if activity_type not in ACTIVITY_LABELS:
+        return jsonify({'status': 'error', 'message': 'Invalid activity type'}), 400
 
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    # Map activity type to corresponding table
-    table_map = {
-        'break': 'breaks',
-        'task': 'task',
-        'session': 'session_time'
-    }
-
-    table = table_map.get(activity_data['activity_type'])  # Get table name
-    if not table:
-        return jsonify({'status': 'error', 'message': 'Invalid activity type'}), 400
-
-    # Insert activity log into respective table
-    try: 
-        cursor.execute(f"""
-        INSERT INTO {table} (emp_id, activity_name, start_time, stop_time, total_duration)
-        VALUES (?, ?, ?, ?, ?)""",
-        activity_data['emp_id'], activity_data['activity_name'], activity_data['start_time'],
-        activity_data['stop_time'], activity_data['total_duration'])
-
-        # try: 
-        # cursor.execute("""
-        #     INSERT INTO Current_Activity (emp_id, activity_type, activity_name, start_time)
-        #     VALUES (?, ?, ?, ?)
-        # """, emp_id, activity_type, activity_name, start_time)
-    except Exception as e:
-        print("Error inserting into AssociateActivity:", e)
+    # Insert the open activity row; its id is the handle /stop takes
+    try:
+        activity_id = activities.start(cursor, emp_id, activity_type, activity_name, start_time)
+        conn.commit()
+    except Exception:
+        logger.exception("Could not start activity", extra={'emp_id': emp_id, 'activity_type': activity_type})
+        conn.close()
+        return jsonify({'status': 'error', 'message': 'Could not start activity'}), 500
+    conn.close()
 
+    session['activity_id'] = activity_id
 
-    conn.commit()
-    conn.close()    
+    # Live board is served from memory (replaces the Current_Activity table)
+    forget_active_session(emp_id)
+    presence.start(emp_id, session.get('name'), session_processes(),
+                   activity_type, activity_name, start_time)
 
-    return jsonify({'status': 'success'})
+    return jsonify({'status': 'success', 'activity_id': activity_id})
 
-# Route to stop an activity and log it
+# Route to stop an activity by its handle (the id /start returned)
 @app.route('/stop', methods=['POST'])
 def stop_activity():
-    
-    if 'activity_start_time' not in session:
-        return 'No activity in session', 400
-
-    start_time = datetime.fromisoformat(session.pop('activity_start_time'))
-    stop_time = datetime.now()
-    delta = stop_time - start_time
-    duration = str(timedelta(seconds=int(delta.total_seconds())))
-
-    activity_data = {
-        'emp_id': session['user']['emp_id'],
-        'activity_type': session.pop('activity_type'),
-        'activity_name': session.pop('activity_name'),
-        'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'),
-        'stop_time': stop_time.strftime('%Y-%m-%d %H:%M:%S'),
-        'total_duration': duration
-    }
+    payload = request.get_json(silent=True) or request.form
+    activity_id = payload.get('activity_id') or session.get('activity_id')
+    try:
+        activity_id = int(activity_id)
+    except (TypeError, ValueError):
+        return jsonify({'status': 'error', 'message': 'No activity to stop'}), 400
 
+    emp_id = session['user']['emp_id']
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    table_map = {
-        'break': 'breaks',
-        'task': 'task',
-        'session': 'session_time'
-    }
+    # UPDATE the open row (no new INSERT here) and add it to the daily rollup
+    closed = activities.stop(cursor, emp_id, activity_id, datetime.now().replace(microsecond=0))
 
-    table = table_map.get(activity_data['activity_type'])
-    if not table:
-        return jsonify({'status': 'error', 'message': 'Invalid activity type'}), 400
+    conn.commit()
+    conn.close()
 
-    # UPDATE the existing row (no new INSERT here)
-    cursor.execute(f"""
-        UPDATE {table}
-        SET stop_time = ?, total_duration = ?
-        WHERE emp_id = ? AND activity_name = ? AND start_time = ?
-    """, activity_data['stop_time'], activity_data['total_duration'],
-         activity_data['emp_id'], activity_data['activity_name'], activity_data['start_time'])
-    
+    if session.get('activity_id') == activity_id:
+        session.pop('activity_id')
+    presence.stop(emp_id)
+    forget_active_session(emp_id)
 
+    return jsonify({'status': 'success', 'activity_id': activity_id, 'closed': closed})
 
-    # Also delete from Current_Activity table
-    cursor.execute("""
-        DELETE FROM Current_Activity
-        WHERE emp_id = ?
-    """, activity_data['emp_id'])
 
-    conn.commit()
+# Apply start/stop events the client queued while offline, in order and in one transaction.
+# Events carry an idempotency key, so a batch retried after a lost response is applied once.
+@app.route('/api/activities/batch', methods=['POST'])
+def activity_batch():
+    if 'user' not in session:
+        return jsonify({'status': 'error', 'message': 'Not logged in'}), 401
+    payload = request.get_json(silent=True) or {}
+    emp_id = session['user']['emp_id']
+    now = datetime.now().replace(microsecond=0)
+
+    try:
+        parsed = activities.parse_events(payload.get('events'), now)
+    except activities.BatchError as e:
+        return jsonify({'status': 'error', 'message': str(e), 'index': e.index}), 400
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        results, open_started = activities.apply_batch(cursor, emp_id, parsed)
+        stopped = any(not r['duplicate'] and r['outcome'] == 'stopped' for r in results)
+        # Unload beacons: nothing may stay open once the tab is gone
+        if payload.get('close_open'):
+            activities.close_open(cursor, emp_id, now)
+            open_started = None
+        # The stops may have closed an older activity than the one on the live board
+        still_open = None
+        if stopped and not open_started and not payload.get('close_open'):
+            still_open = activities.latest_open(cursor, emp_id, datetime.combine(now.date(), datetime.min.time()))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
     conn.close()
 
-    return jsonify({'status': 'success'})
+    forget_active_session(emp_id)
+    if open_started:
+        presence.start(emp_id, session.get('name'), session_processes(),
+                       open_started['type'], open_started['label'], open_started['at'])
+    elif still_open:
+        presence.start(emp_id, session.get('name'), session_processes(), *still_open)
+    elif stopped or payload.get('close_open'):
+        presence.stop(emp_id)
+
+    return jsonify({'status': 'success', 'results': results})
 
 
 @app.route('/stop-activity-on-exit', methods=['POST'])
 # @login_required
 def stop_activity_on_exit():
     if 'user' in session:
-        data = request.get_data(as_text=True)
-        app.logger.info(f"Tab closed event: {data}")
-        print("session['user']['emp_id']",session['user']['emp_id'])
+        logger.debug("Tab closed", extra={'emp_id': session['user']['emp_id']})
         stop_all_open_activities(session['user']['emp_id'])
     return '', 204
 
@@ -317,238 +366,46 @@ def stop_activity_on_exit():
 
 ######## Manager Portal #############################################################
 
+# Processes the logged-in manager may see, and the selected one (defaults to the first)
+def resolve_manager_process(selected_process):
+    manager_process = session.get('process', [])
+    if isinstance(manager_process, str):
+        manager_process = [manager_process]
+    if not selected_process and manager_process:
+        selected_process = manager_process[0]
+    return manager_process, selected_process
+
 # Route to load the manager dashboard
 @app.route('/manager')
 def manager_dashboard():
     if 'user' not in session or session['user']['role'] != 'manager':
         return redirect('/login')
 
-    manager_process = session.get('process', [])
-    print('manager_process',manager_process)
-    if isinstance(manager_process, str):
-        manager_process = [manager_process]
-
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
-    selected_process = request.args.get('process')
-
-    if not selected_process and manager_process:
-        selected_process = manager_process[0]
+    manager_process, selected_process = resolve_manager_process(request.args.get('process'))
 
     if selected_process not in manager_process:
         return "Unauthorized process selected", 403
 
-    # Setup default dates
-    today = date.today()
-    tomorrow = today + timedelta(days=1)
-
-    # Prepare date filters for logins table (uses log_date column)
-    login_date_filter = " AND l.log_date >= ? AND l.log_date < ?"
-    login_date_params = []
-    # Prepare datetime filters for other tables (task, breaks, session_time)
-    activity_date_filter = " AND {alias}.start_time >= ? AND {alias}.start_time < ?"
-    activity_date_params = []
-
-    if start_date and end_date:
-        try:
-            start_dt = datetime.strptime(start_date, "%Y-%m-%d")
-            end_dt = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
-            login_date_params = [start_dt.date(), end_dt.date()]
-            activity_date_params = [start_dt, end_dt]
-        except ValueError:
-            start_dt = end_dt = None
-            login_date_params = [today, tomorrow]
-            activity_date_params = [datetime.combine(today, datetime.min.time()),
-                                    datetime.combine(tomorrow, datetime.min.time())]
-    else:
-        login_date_params = [today, tomorrow]
-        activity_date_params = [datetime.combine(today, datetime.min.time()),
-                                datetime.combine(tomorrow, datetime.min.time())]
+    start_dt, end_dt = resolve_date_range(start_date, end_date)
 
     conn = get_db_connection()
     cursor = conn.cursor()
+    data = load_dashboard(cursor, selected_process, start_dt, end_dt)
+    conn.close()
 
-    selected_process_list = [selected_process]
-    placeholders = ','.join(['?'] * len(selected_process_list))
-    # ______________________________________________________________________________________-
-
-    # --- Fetch live tasks (duration) ---
-    # query_live_tasks = f"""
-    #     SELECT u.name, t.activity_name, t.start_time
-    #     FROM task t
-    #     JOIN cred u ON t.emp_id = u.emp_id
-    #     WHERE u.process IN ({placeholders}) AND t.stop_time IS NULL
-    # """
-    # cursor.execute(query_live_tasks, selected_process_list)
-    # task_associates = []
-    # for row in cursor.fetchall():
-    #     name, activity_name, start_time = row
-    #     if start_time:
-    #         # Format start_time as 'HH:MM:SS'
-    #         start_time_str = start_time.strftime('%H:%M:%S')
-    #     else:
-    #         start_time_str = "00:00:00"
-    #     task_associates.append({
-    #         'name': name,
-    #         'activity_name': activity_name,
-    #         'start_time': start_time_str  # renamed 'duration' to 'start_time'
-    #     })
-
-
-    # --- Fetch live tasks (start_time) ---
-    query_live_tasks = f"""
-        SELECT u.name, t.activity_name, CAST(t.start_time AS TIME) AS start_time
-        FROM task t
-        JOIN cred u ON t.emp_id = u.emp_id
-        WHERE u.process IN ({placeholders}) AND t.stop_time IS NULL AND CAST(t.start_time AS DATE) = CAST(GETDATE() AS DATE)
-    """
-    cursor.execute(query_live_tasks, selected_process_list)
-    task_associates = []
-    for row in cursor.fetchall():
-        name, activity_name, start_time = row
-        task_associates.append({
-            'name': name,
-            'activity_name': activity_name,
-            'start_time': str(start_time) if start_time else "00:00:00"  # renamed 'duration' to 'start_time'
-        })
-
-    # --- Fetch live breaks ---
-    query_live_breaks = f"""
-        SELECT u.name, b.activity_name, CAST(b.start_time AS TIME) AS start_time
-        FROM breaks b
-        JOIN cred u ON b.emp_id = u.emp_id
-        WHERE u.process IN ({placeholders}) AND b.stop_time IS NULL AND CAST(b.start_time AS DATE) = CAST(GETDATE() AS DATE)
-    """
-    cursor.execute(query_live_breaks, selected_process_list)
-    break_associates = []
-    for row in cursor.fetchall():
-        name, activity_name, start_time = row
-        # if start_time:
-        #     duration = datetime.now() - start_time
-        #     duration_str = str(duration).split('.')[0]
-        # else:
-        #     duration_str = "00:00:00"
-        break_associates.append({
-            'name': name,
-            'activity_name': activity_name,
-            # 'duration': duration_str
-            'start_time': str(start_time) if start_time else "00:00:00"  
-        })
-
-    # --- Fetch live sessions ---
-    query_live_sessions = f"""
-        SELECT u.name, s.activity_name, CAST(s.start_time AS TIME) AS start_time
-        FROM session_time s
-        JOIN cred u ON s.emp_id = u.emp_id
-        WHERE u.process IN ({placeholders}) AND s.stop_time IS NULL AND CAST(s.start_time AS DATE) = CAST(GETDATE() AS DATE)
-    """
-    cursor.execute(query_live_sessions, selected_process_list)
-    session_associates = []
-    for row in cursor.fetchall():
-        name, activity_name, start_time = row
-        # if start_time:
-        #     duration = datetime.now() - start_time
-        #     duration_str = str(duration).split('.')[0]
-        # else:
-        #     duration_str = "00:00:00"
-        session_associates.append({
-            'name': name,
-            'activity_name': activity_name,
-            # 'duration': duration_str
-            'start_time': str(start_time) if start_time else "00:00:00"
-        })
-
-
-    # -------------------- Live Activities Query --------------------
-    query_live = f"""
-        SELECT u.name, s.activity_type, s.activity_name, s.start_time
-        FROM cred u
-        JOIN Current_Activity s ON u.emp_id = s.emp_id
-        WHERE u.process IN ({placeholders})
-    """
-    cursor.execute(query_live, selected_process_list)
-    live_activities = [{
-        'name': row[0],
-        'activity_type': row[1],
-        'activity_name': row[2],
-        'start_time': row[3]
-    } for row in cursor.fetchall()]
-    print("######################################",[live_activities])
-
-    # -------------------- Logins Query --------------------
-    query_logins = f"""
-        SELECT c.name, l.login_time, l.logout_time, l.duration, l.log_date
-        FROM logins l
-        JOIN cred c ON l.emp_id = c.emp_id
-        WHERE c.process IN ({placeholders}) {login_date_filter}
-        ORDER BY l.log_date DESC, l.login_time DESC
-    """
-    cursor.execute(query_logins, selected_process_list + login_date_params)
-    login_rows_raw = cursor.fetchall()
-
-    login_rows = []
-    for row in login_rows_raw:
-        name, login_time, logout_time, duration, log_date = row
-        login_time_str = login_time.strftime("%H:%M:%S") if login_time else ''
-        logout_time_str = logout_time.strftime("%H:%M:%S") if logout_time else ''
-        login_rows.append((name, login_time_str, logout_time_str, duration, log_date))
-
-    # -------------------- Task Logs Query --------------------
-    query_task = f"""
-        SELECT u.name, t.activity_name, t.start_time, t.stop_time, t.total_duration
-        FROM task t
-        JOIN cred u ON t.emp_id = u.emp_id
-        WHERE u.process IN ({placeholders}) {activity_date_filter.format(alias='t')}
-    """
-    cursor.execute(query_task, selected_process_list + activity_date_params)
-    task_logs = [{
-        'name': row[0], 'activity': row[1], 'start': row[2],
-        'stop': row[3], 'duration': row[4], 'type': 'Task'
-    } for row in cursor.fetchall()]
-
-    # -------------------- Break Logs Query --------------------
-    query_break = f"""
-        SELECT u.name, b.activity_name, b.start_time, b.stop_time, b.total_duration
-        FROM breaks b
-        JOIN cred u ON b.emp_id = u.emp_id
-        WHERE u.process IN ({placeholders}) {activity_date_filter.format(alias='b')}
-    """
-    cursor.execute(query_break, selected_process_list + activity_date_params)
-    break_logs = [{
-        'name': row[0], 'activity': row[1], 'start': row[2],
-        'stop': row[3], 'duration': row[4], 'type': 'Break'
-    } for row in cursor.fetchall()]
-
-    # -------------------- Session Logs Query --------------------
-    query_session = f"""
-        SELECT u.name, s.activity_name, s.start_time, s.stop_time, s.total_duration
-        FROM session_time s
-        JOIN cred u ON s.emp_id = u.emp_id
-        WHERE u.process IN ({placeholders}) {activity_date_filter.format(alias='s')}
-    """
-    cursor.execute(query_session, selected_process_list + activity_date_params)
-    session_logs = [{
-        'name': row[0], 'activity': row[1], 'start': row[2],
-        'stop': row[3], 'duration': row[4], 'type': 'Session'
-    } for row in cursor.fetchall()]
-
-
-
-    # Combine and sort logs by start time descending
-    all_logs = task_logs + break_logs + session_logs
-    all_logs.sort(key=lambda x: x['start'], reverse=True)
-
-    # -------------------- Count Active Logs Using AssociateActivity Table --------------------
-    counts = get_active_activity_counts(cursor, selected_process_list)
-    task_active_count = counts['task']
-    break_active_count = counts['break']
-    session_active_count = counts['session']
+    # Live cards come from the in-memory presence registry, not SQL
+    ensure_registry_loaded()
+    data.live = [live_activity(entry) for entry in presence.live(selected_process)]
+
+    task_associates = data.live_of_type('Task')
+    break_associates = data.live_of_type('Break')
+    session_associates = data.live_of_type('Session')
 
-    conn.close()
     return render_template(
         'manager.html',
-        login_logout_data=login_rows,
-        all_logs=all_logs,
+        login_logout_data=data.logins,
         task_count=len(task_associates),
         break_count=len(break_associates),
         session_count=len(session_associates),
@@ -559,8 +416,134 @@ def manager_dashboard():
         selected_process=selected_process,
         start_date=start_date,
         end_date=end_date,
+        associates=data.associates,
+        task_names=get_tasks_for_process(selected_process),
+        activity_types=ACTIVITY_LABELS,
     )
 
+################# Polling APIs ######################################################
+
+# Compact JSON with an ETag so pollers can send If-None-Match and get a bodyless 304
+def compact_json(payload, etag):
+    response = app.response_class(json.dumps(payload, separators=(',', ':'), default=str),
+                                  mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def not_modified(etag):
+    response = app.response_class(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def manager_api_process():
+    if 'user' not in session or session['user']['role'] != 'manager':
+        return None, (jsonify({'status': 'error', 'message': 'Unauthorized'}), 401)
+    manager_process, process = resolve_manager_process(request.args.get('process'))
+    if process not in manager_process:
+        return None, (jsonify({'status': 'error', 'message': 'Unauthorized process selected'}), 403)
+    return process, None
+
+# Live board delta: rows = [emp_id, name, activity_type, activity_name, start_time]
+@app.route('/api/live_activities')
+def api_live_activities():
+    process, error = manager_api_process()
+    if error:
+        return error
+
+    ensure_registry_loaded()
+    if request.if_none_match.contains(presence.token(process)):
+        return not_modified(presence.token(process))
+
+    token, entries, removed, full = presence.changes_since(process, request.args.get('since'))
+    rows = [[e.emp_id, e.name, e.activity_type, e.activity_name, e.start_time.isoformat()] for e in entries]
+    return compact_json({'v': token, 'full': full, 'rows': rows, 'removed': removed}, token)
+
+# Team activity log, rows = [type, id, name, activity_name, start_time, stop_time, duration].
+# Filters: emp_id, type ('task' | 'break' | 'session'), activity (exact name).
+#   - Pages, newest first: `after` is the `next` cursor of the previous page (none = first page).
+#   - Changes: `since` is the poll `cursor` of an earlier response; returns the rows started or
+#     stopped since then. A range that ends before today never changes.
+@app.route('/api/team_log')
+def api_team_log():
+    process, error = manager_api_process()
+    if error:
+        return error
+
+    start_dt, end_dt = resolve_date_range(request.args.get('start_date'), request.args.get('end_date'))
+    is_live = end_dt > datetime.now()
+    try:
+        filters = team_log_filters(request.args.get('emp_id'), request.args.get('type'),
+                                   request.args.get('activity'))
+        after = request.args.get('after')
+        after = decode_page_cursor(after) if after else None
+        limit = min(max(int(request.args.get('limit', TEAM_LOG_PAGE_SIZE)), 1), TEAM_LOG_MAX_PAGE_SIZE)
+        since = request.args.get('since')
+        changed_since = datetime.fromtimestamp(int(since)) - timedelta(seconds=2) if since else None
+    except (ValueError, OverflowError, OSError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    # Cursor = server time of this read; the next poll re-reads a small overlap window
+    # and the client de-duplicates rows by (type, id)
+    polled_at = datetime.now().replace(microsecond=0)
+    fmt = lambda value: value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+    rows = lambda logs: [[log.type, log.id, log.name, log.activity, fmt(log.start), fmt(log.stop),
+                          str(log.duration) if log.duration else None] for log in logs]
+
+    if changed_since is not None:
+        range_key = f"{start_dt:%Y%m%d}-{end_dt:%Y%m%d}"
+        if is_live:
+            ensure_registry_loaded()
+            # Filters are part of the version: the same token may answer different filters
+            filter_key = format(zlib.crc32(repr(filters[1]).encode()), 'x')
+            etag = f"{presence.token(process)}|{range_key}|{filter_key}"
+        else:
+            etag = f"closed|{range_key}"
+        if request.if_none_match.contains(etag):
+            return not_modified(etag)
+        logs = []
+        if is_live:
+            conn = get_db_connection()
+            logs = load_team_log(conn.cursor(), process, start_dt, end_dt, changed_since, filters)
+            conn.close()
+        return compact_json({'v': etag, 'cursor': int(polled_at.timestamp()), 'live': is_live,
+                             'rows': rows(logs)}, etag)
+
+    conn = get_db_connection()
+    logs, next_page = load_team_log_page(conn.cursor(), process, start_dt, end_dt, after, limit, filters)
+    conn.close()
+    return jsonify({'cursor': int(polled_at.timestamp()), 'live': is_live,
+                    'rows': rows(logs), 'next': next_page})
+
+# Intraday heatmap: associates on task/break/session/logged in and occupancy % per bucket
+# of `bucket` minutes (must divide a day) over at most OCCUPANCY_MAX_DAYS days
+@app.route('/api/occupancy')
+def api_occupancy():
+    process, error = manager_api_process()
+    if error:
+        return error
+
+    start_dt, end_dt = resolve_date_range(request.args.get('start_date'), request.args.get('end_date'))
+    try:
+        bucket_minutes = int(request.args.get('bucket', OCCUPANCY_BUCKET_MINUTES))
+    except ValueError:
+        bucket_minutes = 0
+    if not valid_bucket_minutes(bucket_minutes):
+        return jsonify({'status': 'error', 'message': 'bucket must be minutes that divide a day'}), 400
+    if end_dt <= start_dt:
+        return jsonify({'status': 'error', 'message': 'end_date must not be before start_date'}), 400
+    if end_dt - start_dt > timedelta(days=OCCUPANCY_MAX_DAYS):
+        return jsonify({'status': 'error',
+                        'message': f"The heatmap covers at most {OCCUPANCY_MAX_DAYS} days"}), 400
+
+    conn = get_db_connection()
+    try:
+        heatmap = load_occupancy(conn.cursor(), process, start_dt, end_dt, bucket_minutes)
+    finally:
+        conn.close()
+    return jsonify(heatmap)
+
 ################# Excel Report #######################################################3
 
 
@@ -568,174 +551,196 @@ def manager_dashboard():
 @app.route('/download-report', methods=['GET'])
 def download_team_report():
     selected_process = request.args.get('process')
-    print("###############################",selected_process)
+    logger.debug("Team report requested", extra={'process_name': selected_process})
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
 
-    login_date_filter = ""
-    task_date_filter = ""
-    break_date_filter = ""
-    session_date_filter = ""
-
-    params = []
-    task_params = [selected_process]
-    break_params = []
-    session_params = []
-
-    # Prepare date filters
-    if start_date and end_date:
-        try:
-            start_dt = datetime.strptime(start_date, "%Y-%m-%d")
-            end_dt = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
-
-            login_date_filter = " AND l.log_date >= ? AND l.log_date < ?"
-            task_date_filter = " AND t.start_time >= ? AND t.start_time < ?"
-            break_date_filter = " WHERE start_time >= ? AND start_time < ?"
-            session_date_filter = " WHERE start_time >= ? AND start_time < ?"
-
-            params += [selected_process, start_dt, end_dt]
-            task_params += [start_dt, end_dt]
-            break_params += [start_dt, end_dt]
-            session_params += [start_dt, end_dt]
-        except ValueError:
-            pass
-    else:
-        if selected_process:
-            params.append(selected_process)
+    # All processes: one sheet per process the manager manages plus a summary
+    processes = []
+    if selected_process == ALL_PROCESSES:
+        if session.get('user', {}).get('role') != 'manager':
+            return 'Unauthorized', 401
+        processes, _ = resolve_manager_process(None)
+        if not processes:
+            return 'Unauthorized process selected', 403
+
+    start_dt, end_dt = parse_report_range(start_date, end_date)
+    filename = report_filename(selected_process, start_date)
+
+    # Same report already built by a background job
+    cached_path = report_jobs.cache.get(report_key(selected_process, start_dt, end_dt, processes))
+    if cached_path:
+        return send_file(cached_path, as_attachment=True, download_name=filename, mimetype=XLSX_MIMETYPE)
 
     conn = get_db_connection()
-    cursor = conn.cursor()
 
-    # Login Data
-    login_query = f"""
-        SELECT u.name, u.emp_id, u.process, l.login_time, l.logout_time, l.duration, l.log_date
-        FROM cred u
-        JOIN logins l ON u.emp_id = l.emp_id
-        WHERE u.process = ? {login_date_filter}
-    """
-    login_df = pd.read_sql(login_query, conn, params=params)
-    # print("login_df.shape",login_df.shape)
-    # # print("login_df_TNW1632",login_df[login_df['emp_id'] == 'TNW1632']," ")
-    # print("login_df_emp_id",login_df['emp_id'].tolist())
-
-    print("login_df.shape", login_df.shape)
-    print("login_df EMP IDs:", login_df['emp_id'].unique())
-    print("Does TNW1632 exist:", 'TNW1632' in login_df['emp_id'].values)
-
-    if login_df.empty:
+    # Long ranges (or ?stream=1) are read in chunks and streamed with bounded memory
+    if start_dt is None:
+        first_day, last_day = get_login_range(conn, selected_process, processes)
+        if first_day is None:
+            return "No login data found", 404
+        range_start = datetime.combine(first_day, datetime.min.time())
+        range_end = datetime.combine(last_day, datetime.min.time()) + timedelta(days=1)
+    else:
+        range_start, range_end = start_dt, end_dt
+    streaming = request.args.get('stream') == '1' or (range_end - range_start).days > STREAM_REPORT_DAYS
+
+    if selected_process == ALL_PROCESSES or streaming:
+        if selected_process == ALL_PROCESSES:
+            output, row_count = stream_org_workbook(conn, range_start, range_end, processes)
+        else:
+            output, row_count = stream_workbook(conn, selected_process, range_start, range_end)
+        conn.close()
+        if row_count == 0:
+            output.close()
+            return "No login data found", 404
+        return app.response_class(iter_file(output), mimetype=XLSX_MIMETYPE, headers={
+            'Content-Disposition': f'attachment; filename="{filename}"'})
+
+    frames = read_report_frames(conn, selected_process, start_dt, end_dt)
+    task_names = get_task_names(conn, selected_process)
+    conn.close()
+
+    if frames[0].empty:
         return "No login data found", 404
 
-    # Task Data
-    task_query = f"""
-        SELECT t.emp_id, t.activity_name, CAST(t.start_time AS DATE) AS date,
-            SUM(DATEDIFF(SECOND, 0, TRY_CAST(t.total_duration AS TIME))) AS duration
-        FROM task t
-        JOIN Process_Tasks pt ON t.activity_name = pt.TaskName
-        WHERE pt.ProcessName = ? {task_date_filter}
-        GROUP BY t.emp_id, t.activity_name, CAST(t.start_time AS DATE)
-    """
-    task_df = pd.read_sql(task_query, conn, params=task_params)
-    task_cursor = conn.cursor()
-    task_cursor.execute("SELECT TaskName FROM Process_Tasks WHERE ProcessName = ?", (selected_process,))
-    task_names = [row[0] for row in task_cursor.fetchall()]
-    task_pivot = task_df.pivot_table(index=["emp_id", "date"], columns="activity_name", values="duration", aggfunc="sum").fillna(0).reset_index()
-
-    # Break Data
-    break_query = f"""
-        SELECT emp_id, activity_name, CAST(start_time AS DATE) AS date,
-            SUM(DATEDIFF(SECOND, 0, TRY_CAST(total_duration AS TIME))) AS duration
-        FROM breaks
-        {break_date_filter}
-        GROUP BY emp_id, activity_name, CAST(start_time AS DATE)
-    """
-    break_df = pd.read_sql(break_query, conn, params=break_params)
-    break_pivot = break_df.pivot_table(index=["emp_id", "date"], columns="activity_name", values="duration", aggfunc="sum").fillna(0).reset_index()
-
-    # Session Data
-    session_query = f"""
-        SELECT emp_id, activity_name, CAST(start_time AS DATE) AS date,
-            SUM(DATEDIFF(SECOND, 0, TRY_CAST(total_duration AS TIME))) AS duration
-        FROM session_time
-        {session_date_filter}
-        GROUP BY emp_id, activity_name, CAST(start_time AS DATE)
-    """
-    session_df = pd.read_sql(session_query, conn, params=session_params)
-    session_pivot = session_df.pivot_table(index=["emp_id", "date"], columns="activity_name", values="duration", aggfunc="sum").fillna(0).reset_index()
-    print("###########################",session_df)
-
-    # Merge all data
-    login_df.rename(columns={'log_date': 'date'}, inplace=True)
-    df = login_df.merge(task_pivot, on=["emp_id", "date"], how="left")
-    df = df.merge(break_pivot, on=["emp_id", "date"], how="left")
-    df = df.merge(session_pivot, on=["emp_id", "date"], how="left")
-    df.fillna(0, inplace=True)
-
-    # Rename known session activities
-    rename_map = {
-        "Internal Meeting": "Internal Meeting",
-        "External Meeting": "External Meeting",
-        "Training Session": "Training",
-        "Waiting for work": "Waiting For Work",
-        "New Hire Training": "New Hire Training",
-        "On-Job-Training": "On-Job-Training",
-        "Downtime": "Downtime",
-        "Team Huddle": "Team Huddle"
-    }
-    df.rename(columns=rename_map, inplace=True)
-
-    for task in task_names:
-        if task not in df.columns:
-            df[task] = 0
-
-    break_cols = ["Break 1", "Lunch Break", "Break 2", "RR"]
-    for col in break_cols:
-        if col not in df.columns:
-            df[col] = 0
-
-    session_cols = list(rename_map.values())
-    for col in session_cols:
-        if col not in df.columns:
-            df[col] = 0
-
-    df[break_cols + session_cols] = df[break_cols + session_cols].apply(pd.to_numeric, errors='coerce').fillna(0)
-    df['Break Total Time'] = df[break_cols].sum(axis=1)
-    df['Session & Downtime'] = df[session_cols].sum(axis=1)
-    df['Occupancy'] = df[session_cols + task_names].sum(axis=1)
-    df['Utilization'] = df[task_names].sum(axis=1)
-
-    # print("df.shape",df.shape)
-    # print("df_TNW1632",df[df['emp_id'] == 'TNW1632'])
-
-    final_cols = ["date", "name", "emp_id", "login_time", "logout_time", "process", "duration"] + \
-                 task_names + break_cols + session_cols + \
-                 ["Break Total Time", "Session & Downtime", "Occupancy", "Utilization"]
-
-    def format_seconds(seconds):
-        seconds = int(seconds)
-        hours = seconds // 3600
-        minutes = (seconds % 3600) // 60
-        secs = seconds % 60
-        return f"{hours:02}:{minutes:02}:{secs:02}"
-
-    time_columns = ["Break Total Time", "Session & Downtime", "Occupancy", "Utilization"] + task_names + break_cols + session_cols
-    for col in time_columns:
-        if col in df.columns:
-            df[col] = df[col].apply(lambda x: format_seconds(x) if x > 0 else "0")
-
-    df_final = df[final_cols]
-
-
-
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df_final.to_excel(writer, index=False, sheet_name="Team Report")
-    output.seek(0)
-
-    report_date = start_date or datetime.today().strftime('%Y-%m-%d')
-    filename = f"Team_Report_{selected_process or 'All'}_{report_date}.xlsx"
-    return send_file(output, as_attachment=True, download_name=filename,
-                     mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-
-# Run the app with SocketIO support
+    df_final = compute_team_report(*frames, task_names)
+    output = write_workbook(df_final, task_names)
+    return send_file(output, as_attachment=True, download_name=filename, mimetype=XLSX_MIMETYPE)
+
+################# Exports ###########################################################
+
+# Raw rows of a process (or one associate of it) for BI pipelines, streamed from the cursor.
+#   format: csv (default) | ndjson | parquet (needs pyarrow)
+#   data: activity (default) | logins; start_date / end_date as on the dashboard (default today)
+#   type / activity filter activity rows like the team log
+@app.route('/download/team_log')
+def download_team_log():
+    return export_response(request.args.get('emp_id'))
+
+@app.route('/download/associate_log/<emp_id>')
+def download_associate_log(emp_id):
+    return export_response(emp_id)
+
+def export_response(emp_id):
+    process, error = manager_api_process()
+    if error:
+        return error
+    fmt = request.args.get('format', 'csv')
+    dataset = request.args.get('data', 'activity')
+    if fmt not in FORMATS or dataset not in EXPORT_QUERIES:
+        return jsonify({'status': 'error', 'message': 'Unknown format or data'}), 400
+    if fmt == 'parquet' and not parquet_available():
+        return jsonify({'status': 'error', 'message': 'Parquet export needs pyarrow'}), 501
+
+    start_dt, end_dt = resolve_date_range(request.args.get('start_date'), request.args.get('end_date'))
+    try:
+        conn, cursor = open_export(dataset, process, start_dt, end_dt, emp_id,
+                                   request.args.get('type'), request.args.get('activity'))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    mimetype, extension = FORMATS[fmt]
+    last_day = end_dt - timedelta(days=1)
+    filename = secure_filename(f"{dataset}_{emp_id or process}_{start_dt:%Y-%m-%d}_{last_day:%Y-%m-%d}.{extension}")
+    response = app.response_class(WRITERS[fmt](conn, cursor), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"'})
+    response.call_on_close(conn.close)  # also when the stream never started
+    return response
+
+################# Background Report Jobs ############################################
+
+# A job's workbook may be read by whoever may see every process in it; the all-processes
+# report only by a manager of all of them
+def may_access_report_job(job):
+    if 'user' not in session:
+        return False
+    if job.process == ALL_PROCESSES and session['user']['role'] != 'manager':
+        return False
+    return set(job.processes) <= set(session_processes())
+
+def report_job_payload(job):
+    payload = job.to_dict()
+    payload['status_url'] = url_for('report_job_status', job_id=job.id)
+    if job.status == 'done':
+        payload['download_url'] = url_for('report_job_download', job_id=job.id)
+    return payload
+
+# Queue a team report; answers immediately with the job (already done when cached)
+@app.route('/reports', methods=['POST'])
+def submit_report_job():
+    if 'user' not in session or session['user']['role'] != 'manager':
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+    manager_process, selected_process = resolve_manager_process(request.values.get('process'))
+    # ALL_PROCESSES covers the processes of this manager only
+    if selected_process not in manager_process and not (selected_process == ALL_PROCESSES and manager_process):
+        return jsonify({'status': 'error', 'message': 'Unauthorized process selected'}), 403
+
+    start_date = request.values.get('start_date')
+    start_dt, end_dt = parse_report_range(start_date, request.values.get('end_date'))
+    job = report_jobs.submit(selected_process, start_dt, end_dt, report_filename(selected_process, start_date),
+                             processes=manager_process)
+    return jsonify(report_job_payload(job)), 202
+
+@app.route('/reports/<job_id>')
+def report_job_status(job_id):
+    job = report_jobs.get(job_id)
+    if job is None or not may_access_report_job(job):
+        return jsonify({'status': 'error', 'message': 'Unknown report job'}), 404
+    return jsonify(report_job_payload(job))
+
+@app.route('/reports/<job_id>/download')
+def report_job_download(job_id):
+    job = report_jobs.get(job_id)
+    if job is None or not may_access_report_job(job):
+        return "Unknown report job", 404
+    if job.status != 'done':
+        return "Report is not ready yet", 409
+    if not os.path.exists(job.path):
+        return "Report expired, please request it again", 410
+    return send_file(job.path, as_attachment=True, download_name=job.filename, mimetype=XLSX_MIMETYPE)
+
+################# Diagnostics #######################################################
+
+# Connection pool statistics (wait time, in-use count, checkout failures)
+@app.route('/api/db_pool_stats')
+def db_pool_stats():
+    return jsonify(db_pool.stats())
+
+@app.route('/api/active_session_stats')
+def active_session_stats():
+    return jsonify(active_sessions.stats())
+
+@app.route('/api/refdata_stats')
+def refdata_stats():
+    return jsonify(refdata.stats())
+
+@app.route('/api/audit_stats')
+def audit_stats():
+    return jsonify(audit_log.stats())
+
+@app.route('/api/db_executor_stats')
+def db_executor_stats():
+    return jsonify(db_executor.stats())
+
+@app.route('/api/event_bus_stats')
+def event_bus_stats():
+    return jsonify(event_bus.stats())
+
+# Request and query latency, rows and the stats above in the Prometheus text format
+@app.route('/metrics')
+def metrics():
+    return app.response_class(instrumentation.render(), mimetype='text/plain; version=0.0.4')
+
+def startup():
+    # Rebuild the live board from the open activity rows
+    with app.app_context():
+        load_registry()
+        # Optionally preload the employee directory and task catalog
+        if refdata.REFDATA_WARMUP:
+            refdata.warm_up()
+
+# Run the app with SocketIO support (development server; see serve.py for production)
 if __name__ == '__main__':
+    startup()
     socketio.run(app, host='0.0.0.0', port=5000, debug=True)
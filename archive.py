@@ -0,0 +1,216 @@
+"""
+Retention for the append-only history: closed `activity` rows and `logs` rows older
+than the horizon move into monthly archive tables (activity_archive_YYYYMM,
+logs_archive_YYYYMM), page compressed and with a CHECK constraint on their month.
+
+    flask --app app archive run               # e.g. nightly from cron
+    flask --app app archive run --max-batches 100
+    flask --app app archive status
+
+The horizon is the first day of the month ARCHIVE_AFTER_DAYS before today; only whole
+months before it are archived. Each batch moves ARCHIVE_BATCH_ROWS rows in one
+transaction (DELETE ... OUTPUT into a table variable, then INSERT into the month table),
+so a run can stop at any point and the next one continues where it left off.
+
+Reading: activity_history and logs_history are views over the live table and all
+archive tables; thanks to the CHECK constraints a query on the view only touches the
+months its date range overlaps. activity_source() picks the view for ranges that start
+before the horizon and the live table otherwise. activity_daily_rollup is never
+archived, so the team reports read the same totals before and after archiving.
+"""
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+
+from db import get_db_connection
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '180'))
+ARCHIVE_BATCH_ROWS = int(os.environ.get('ARCHIVE_BATCH_ROWS', '5000'))
+
+
+class Source:
+    def __init__(self, name, view, time_column, columns, column_types, where='', indexes=()):
+        self.name = name
+        self.view = view
+        self.time_column = time_column
+        self.columns = columns
+        self.column_types = column_types
+        self.where = where        # extra condition on the rows that may move
+        self.indexes = indexes    # (name suffix, column list) of the month tables
+
+    def table(self, month):
+        return f"{self.name}_archive_{month:%Y%m}"
+
+
+SOURCES = [
+    Source('activity', 'activity_history', 'start_time',
+           ['id', 'emp_id', 'activity_type', 'activity_name', 'start_time', 'stop_time', 'total_duration'],
+           ['BIGINT NOT NULL', 'VARCHAR(20) NOT NULL', 'VARCHAR(10) NOT NULL', 'NVARCHAR(100) NOT NULL',
+            'DATETIME NOT NULL', 'DATETIME NULL', 'TIME(0) NULL'],
+           where="AND stop_time IS NOT NULL",  # open activities stay, /stop may still close them
+           indexes=[('emp_start', 'emp_id, start_time')]),
+    Source('logs', 'logs_history', 'timestamp',
+           ['id', 'emp_id', 'activity_type', 'description', 'timestamp'],
+           ['INT NOT NULL', 'VARCHAR(20) NOT NULL', 'NVARCHAR(50) NOT NULL', 'NVARCHAR(MAX) NULL',
+            'DATETIME NOT NULL'],
+           indexes=[('emp_type_time', 'emp_id, activity_type, timestamp')]),
+]
+
+
+def archive_cutoff(today=None):
+    """Rows before this datetime may live in the archive."""
+    horizon = (today or date.today()) - timedelta(days=ARCHIVE_AFTER_DAYS)
+    return datetime(horizon.year, horizon.month, 1)
+
+
+def activity_source(start_dt):
+    """Table or view to read activity rows starting at `start_dt` (None = all history) from."""
+    return 'activity_history' if start_dt is None or start_dt < archive_cutoff() else 'activity'
+
+
+def _next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _months_to_archive(cursor, source, cutoff):
+    cursor.execute(f"SELECT MIN({source.time_column}) FROM {source.name} "
+                   f"WHERE {source.time_column} < ? {source.where}", cutoff)
+    first = cursor.fetchone()[0]
+    months = []
+    if first is not None:
+        month = date(first.year, first.month, 1)
+        while month < cutoff.date():
+            months.append(month)
+            month = _next_month(month)
+    return months
+
+
+def _archive_tables(cursor, source):
+    cursor.execute("SELECT month FROM archive_months WHERE source = ? ORDER BY month", source.name)
+    return [source.table(row[0]) for row in cursor.fetchall()]
+
+
+def rebuild_view(cursor, source):
+    """activity_history / logs_history over the live table and every archive table."""
+    columns = ', '.join(source.columns)
+    selects = [f"SELECT {columns} FROM {table}" for table in [source.name] + _archive_tables(cursor, source)]
+    cursor.execute(f"CREATE OR ALTER VIEW {source.view} AS\n" + "\nUNION ALL\n".join(selects))
+
+
+def ensure_month_table(cursor, source, month):
+    """Create the archive table of `month` (and register it) unless it exists."""
+    table = source.table(month)
+    cursor.execute("SELECT 1 FROM archive_months WHERE source = ? AND month = ?", source.name, month)
+    if cursor.fetchone() is not None:
+        return False
+    column_defs = ', '.join(f"{name} {sql_type}" for name, sql_type in zip(source.columns, source.column_types))
+    # Literal bounds: the CHECK must be constant for the views to skip other months
+    cursor.execute(f"""
+        IF OBJECT_ID(N'dbo.{table}', N'U') IS NULL
+        CREATE TABLE {table} (
+            {column_defs},
+            CONSTRAINT PK_{table} PRIMARY KEY CLUSTERED ({source.time_column}, id),
+            CONSTRAINT CK_{table}_month CHECK ({source.time_column} >= '{month:%Y%m%d}'
+                                                AND {source.time_column} < '{_next_month(month):%Y%m%d}')
+        ) WITH (DATA_COMPRESSION = PAGE)
+    """)
+    for suffix, index_columns in source.indexes:
+        cursor.execute(f"CREATE INDEX IX_{table}_{suffix} ON {table} ({index_columns}) "
+                       f"WITH (DATA_COMPRESSION = PAGE)")
+    cursor.execute("INSERT INTO archive_months (source, month, table_name) VALUES (?, ?, ?)",
+                   source.name, month, table)
+    rebuild_view(cursor, source)
+    return True
+
+
+def move_batch(cursor, source, month, batch_rows=ARCHIVE_BATCH_ROWS):
+    """Move up to `batch_rows` rows of `month` into its archive table; returns the number moved."""
+    columns = ', '.join(source.columns)
+    declared = ', '.join(f"{name} {sql_type}" for name, sql_type in zip(source.columns, source.column_types))
+    cursor.execute(f"""
+        SET NOCOUNT ON;
+        DECLARE @moved TABLE ({declared});
+        DECLARE @count INT;
+        DELETE TOP (?) FROM {source.name}
+        OUTPUT {', '.join(f'deleted.{name}' for name in source.columns)} INTO @moved
+        WHERE {source.time_column} >= ? AND {source.time_column} < ? {source.where};
+        INSERT INTO {source.table(month)} ({columns}) SELECT {columns} FROM @moved;
+        SELECT @count = COUNT(*) FROM @moved;
+        UPDATE archive_months SET rows_archived = rows_archived + @count, updated_at = GETDATE()
+        WHERE source = ? AND month = ?;
+        SELECT @count;
+    """, batch_rows, month, _next_month(month), source.name, month)
+    return cursor.fetchone()[0]
+
+
+def run(conn, cutoff=None, batch_rows=ARCHIVE_BATCH_ROWS, max_batches=None, echo=print):
+    """
+    Archive every source up to `cutoff` (default archive_cutoff()), oldest month first,
+    committing after each batch. Stops early after `max_batches`. Returns the rows moved.
+    """
+    cutoff = cutoff or archive_cutoff()
+    cursor = conn.cursor()
+    moved = batches = 0
+    for source in SOURCES:
+        for month in _months_to_archive(cursor, source, cutoff):
+            if ensure_month_table(cursor, source, month):
+                conn.commit()
+                echo(f"created {source.table(month)}")
+            month_rows = 0
+            while max_batches is None or batches < max_batches:
+                rows = move_batch(cursor, source, month, batch_rows)
+                conn.commit()
+                batches += 1
+                month_rows += rows
+                if rows < batch_rows:
+                    break
+            moved += month_rows
+            if month_rows:
+                echo(f"{source.table(month)}: {month_rows} rows")
+            if max_batches is not None and batches >= max_batches:
+                echo(f"stopped after {batches} batches, run again to continue")
+                return moved
+    return moved
+
+
+@click.group('archive')
+def archive_cli():
+    """Move old activity and logs rows into monthly archive tables."""
+
+
+@archive_cli.command('run')
+@click.option('--batch-rows', default=ARCHIVE_BATCH_ROWS, show_default=True, help="Rows moved per transaction")
+@click.option('--max-batches', type=int, help="Stop after this many batches (resume with the next run)")
+@with_appcontext
+def run_command(batch_rows, max_batches):
+    """Archive the closed rows older than the horizon."""
+    cutoff = archive_cutoff()
+    click.echo(f"archiving rows before {cutoff:%Y-%m-%d}")
+    conn = get_db_connection()
+    try:
+        moved = run(conn, cutoff, batch_rows, max_batches, echo=click.echo)
+    except Exception as e:
+        conn.rollback()
+        click.echo(f"Archiving failed: {e}", err=True)
+        sys.exit(1)
+    finally:
+        conn.close()
+    click.echo(f"{moved} rows archived")
+
+
+@archive_cli.command('status')
+@with_appcontext
+def status_command():
+    """List the archive tables and their row counts."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT source, month, table_name, rows_archived, updated_at FROM archive_months "
+                   "ORDER BY source, month")
+    rows = cursor.fetchall()
+    conn.close()
+    for source, month, table, count, updated_at in rows:
+        click.echo(f"{source:<9} {month:%Y-%m} {table}: {count} rows (last batch {updated_at:%Y-%m-%d %H:%M})")
+    click.echo(f"horizon: {archive_cutoff():%Y-%m-%d}")
@@ -0,0 +1,219 @@
+"""
+Audit events for the `logs` table.
+
+By default every event is INSERTed synchronously, like before. With
+AUDIT_WRITE_BEHIND=1 events are appended to a local spool file and an in-memory
+queue instead, and a background thread writes them to `logs` in bulk
+(fast_executemany) once AUDIT_FLUSH_ROWS are queued or every AUDIT_FLUSH_INTERVAL
+seconds, and once more on shutdown.
+
+Durability: an event is in the spool file before record() returns. Each process
+spools to `<AUDIT_SPOOL_PATH>.<pid>.spool`; on flush that file is renamed to a
+batch file, which is deleted only after its rows are committed. Batch files left
+over by a failed flush are retried by the next flush, and spool/batch files of a
+crashed process are adopted once they have not been touched for STALE_AFTER
+seconds. Delivery is at-least-once - a crash between the commit and the delete
+replays that batch.
+"""
+import atexit
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from db import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND = os.environ.get('AUDIT_WRITE_BEHIND', '0').lower() in ('1', 'true', 'yes')
+FLUSH_ROWS = int(os.environ.get('AUDIT_FLUSH_ROWS', '500'))          # flush once this many events are queued
+FLUSH_INTERVAL = float(os.environ.get('AUDIT_FLUSH_INTERVAL', '2'))  # ... or after this many seconds
+SPOOL_PATH = os.environ.get('AUDIT_SPOOL_PATH') or os.path.join(tempfile.gettempdir(), 'adherence_audit.spool')
+SPOOL_FSYNC = os.environ.get('AUDIT_SPOOL_FSYNC', '0').lower() in ('1', 'true', 'yes')
+# Spool files of other processes untouched this long are assumed orphaned and replayed here
+STALE_AFTER = max(60.0, 10 * FLUSH_INTERVAL)
+
+INSERT_LOG = "INSERT INTO logs (emp_id, activity_type, description, timestamp) VALUES (?, ?, ?, ?)"
+
+
+def _encode(event):
+    emp_id, activity_type, description, timestamp = event
+    return json.dumps([emp_id, activity_type, description, timestamp.isoformat()]) + "\n"
+
+
+def _decode(line):
+    emp_id, activity_type, description, timestamp = json.loads(line)
+    return emp_id, activity_type, description, datetime.fromisoformat(timestamp)
+
+
+class AuditLog:
+    def __init__(self, write_behind=WRITE_BEHIND, flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL,
+                 spool_path=SPOOL_PATH, fsync=SPOOL_FSYNC, stale_after=STALE_AFTER):
+        self.write_behind = write_behind
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.spool_base = spool_path
+        self.fsync = fsync
+        self.stale_after = stale_after
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one flush at a time
+        self._wake = threading.Event()
+        self._pending = []
+        self._spool = None
+        self._spool_path = None
+        self._segment = 0
+        self._thread = None
+        self._closed = False
+
+        # Statistics
+        self._flushed_rows = 0
+        self._flushes = 0
+        self._flush_failures = 0
+        self._flush_total = 0.0
+        self._flush_max = 0.0
+        self._last_flush = None
+
+    def record(self, emp_id, activity_type, description, timestamp=None, cursor=None):
+        """
+        Record one audit event. Synchronous mode inserts it on `cursor` (the caller
+        commits) or on its own connection; write-behind mode only queues it.
+        """
+        event = (emp_id, activity_type, description, timestamp or datetime.now())
+        if not self.write_behind:
+            if cursor is not None:
+                cursor.execute(INSERT_LOG, event)
+                return
+            conn = get_db_connection()
+            conn.cursor().execute(INSERT_LOG, event)
+            conn.commit()
+            conn.close()
+            return
+
+        with self._lock:
+            if self._spool is None:
+                self._start()
+            self._spool.write(_encode(event))
+            self._spool.flush()
+            if self.fsync:
+                os.fsync(self._spool.fileno())
+            self._pending.append(event)
+            full = len(self._pending) >= self.flush_rows
+        if full:
+            self._wake.set()
+
+    def _start(self):
+        # Called with the lock held on the first write-behind event. The pid is taken
+        # here, not in __init__, so forked workers each get their own spool file.
+        os.makedirs(os.path.dirname(os.path.abspath(self.spool_base)), exist_ok=True)
+        self._spool_path = f"{self.spool_base}.{os.getpid()}.spool"
+        if os.path.exists(self._spool_path):
+            # Left over by an earlier process with the same pid
+            os.replace(self._spool_path, self._batch_path())
+        self._spool = open(self._spool_path, 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._run, name='audit-flush', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _batch_path(self):
+        self._segment += 1
+        return f"{self.spool_base}.{os.getpid()}.{time.time_ns()}-{self._segment}.batch"
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Audit log flush failed")
+
+    def _batches(self):
+        """Own batch files, after adopting the orphaned spool and batch files of other processes."""
+        own = f"{self.spool_base}.{os.getpid()}."
+        base = glob.escape(self.spool_base)
+        now = time.time()
+        for path in glob.glob(f"{base}.*.spool") + glob.glob(f"{base}.*.batch"):
+            if path.startswith(own):
+                continue
+            try:
+                if now - os.path.getmtime(path) > self.stale_after and os.path.getsize(path):
+                    os.replace(path, self._batch_path())
+            except OSError:
+                pass  # adopted by another process meanwhile
+        return sorted(glob.glob(f"{glob.escape(own)}*.batch"))
+
+    def flush(self):
+        """Write every queued event and every left-over batch file to `logs`."""
+        if self._spool is None:
+            return
+        with self._flush_lock:
+            with self._lock:
+                if self._pending:
+                    # Rotate the spool file, which holds exactly the queued events
+                    self._spool.close()
+                    os.replace(self._spool_path, self._batch_path())
+                    self._spool = open(self._spool_path, 'a', encoding='utf-8')
+                    self._pending = []
+
+            for path in self._batches():
+                with open(path, encoding='utf-8') as f:
+                    events = [_decode(line) for line in f if line.strip()]
+                if events:
+                    self._write(events)
+                os.remove(path)
+
+    def _write(self, events):
+        started = time.perf_counter()
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.fast_executemany = True
+            cursor.executemany(INSERT_LOG, events)
+            conn.commit()
+        except Exception:
+            self._flush_failures += 1
+            raise
+        finally:
+            conn.close()
+        elapsed = time.perf_counter() - started
+        self._flushes += 1
+        self._flushed_rows += len(events)
+        self._flush_total += elapsed
+        self._flush_max = max(self._flush_max, elapsed)
+        self._last_flush = elapsed
+
+    def close(self):
+        """Stop the flush thread and write what is left (registered with atexit)."""
+        if self._thread is None or self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=self.flush_interval + 5)
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Audit log flush on shutdown failed, events stay in the spool")
+
+    def stats(self):
+        with self._lock:
+            depth = len(self._pending)
+        spooled = glob.glob(f"{glob.escape(self._spool_path[:-len('spool')])}*.batch") if self._spool_path else []
+        return {
+            'write_behind': self.write_behind,
+            'queue_depth': depth,
+            'spooled_batches': len(spooled),
+            'flushed_rows': self._flushed_rows,
+            'flushes': self._flushes,
+            'flush_failures': self._flush_failures,
+            'flush_time_last': self._last_flush,
+            'flush_time_max': self._flush_max,
+            'flush_time_avg': self._flush_total / self._flushes if self._flushes else 0.0,
+        }
+
+
+audit_log = AuditLog()
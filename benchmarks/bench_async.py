@@ -0,0 +1,226 @@
+"""
+How many concurrent SocketIO clients and in-flight requests one worker handles, per
+server mode. For every mode in `--modes` a `serve.py` worker is started on `--port`:
+
+    threading         Werkzeug threads, one per connection (the old default)
+    eventlet:inline   eventlet with pyodbc called on the hub thread (DB_OFFLOAD=0)
+    eventlet          eventlet with pyodbc on the bounded DB executor
+    gevent            gevent with pyodbc on the bounded DB executor
+
+Then, for each step of `--clients`, that many SocketIO clients are connected and held
+while `--slow-requests` wide report downloads and `--report-jobs` queued reports
+(POST /reports, polled until done, then downloaded) run; meanwhile a light request
+(/api/live_activities) is sampled every 100 ms. Prints one JSON document with the
+clients connected, connect latency, light request p50/p95/max and the report outcomes
+(200 / 503 backpressure / failed, job done / failed) per mode and step.
+
+Needs the asyncio client extras and the server modes under test:
+
+    pip install "python-socketio[asyncio_client]" eventlet gevent gevent-websocket
+    python -m benchmarks.bench_async --modes threading eventlet:inline eventlet --clients 100 500 1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+
+import aiohttp
+import socketio
+
+from db import pool
+from benchmarks.seed import seed, cleanup
+
+PROCESS = 'Bench Async'
+PREFIX = 'BA'
+MANAGER = PREFIX + 'M'
+
+
+def start_server(mode, port):
+    async_mode, _, variant = mode.partition(':')
+    env = dict(os.environ, SOCKETIO_ASYNC_MODE=async_mode, PORT=str(port), HOST='127.0.0.1',
+               DB_OFFLOAD='0' if variant == 'inline' else '1', LOG_LEVEL='ERROR')
+    return subprocess.Popen([sys.executable, 'serve.py'], env=env)
+
+
+async def wait_ready(http, base, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with http.get(f"{base}/login") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"server at {base} did not start")
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[max(int(len(values) * pct / 100 + 0.5) - 1, 0)] if values else None
+
+
+async def connect_clients(base, cookie, count):
+    clients, latencies, failures = [], [], 0
+
+    async def one():
+        nonlocal failures
+        client = socketio.AsyncClient(reconnection=False)
+        started = time.perf_counter()
+        try:
+            await client.connect(base, headers={'Cookie': cookie}, transports=['websocket'], wait_timeout=30)
+            latencies.append((time.perf_counter() - started) * 1000)
+            clients.append(client)
+        except Exception:
+            failures += 1
+
+    # Connect in waves so the client side is not the bottleneck
+    for offset in range(0, count, 100):
+        await asyncio.gather(*(one() for _ in range(min(100, count - offset))))
+    return clients, latencies, failures
+
+
+async def sample_light(http, base, stop, samples):
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            async with http.get(f"{base}/api/live_activities", params={'process': PROCESS}) as response:
+                await response.read()
+            samples.append((time.perf_counter() - started) * 1000)
+        except aiohttp.ClientError:
+            samples.append(None)
+        await asyncio.sleep(0.1)
+
+
+async def slow_request(http, base, days):
+    today = date.today()
+    params = {'process': PROCESS, 'start_date': (today - timedelta(days=days - 1)).isoformat(),
+              'end_date': today.isoformat(), 'stream': '1'}
+    try:
+        async with http.get(f"{base}/download-report", params=params,
+                            timeout=aiohttp.ClientTimeout(total=600)) as response:
+            await response.read()
+            return response.status
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return 'failed'
+
+
+async def report_job(http, base, days):
+    today = date.today()
+    data = {'process': PROCESS, 'start_date': (today - timedelta(days=days - 1)).isoformat(),
+            'end_date': today.isoformat()}
+    deadline = time.monotonic() + 600
+    try:
+        async with http.post(f"{base}/reports", data=data) as response:
+            job = await response.json()
+        while job.get('status') not in ('done', 'failed') and time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+            async with http.get(f"{base}{job['status_url']}") as response:
+                job = await response.json()
+        if job.get('status') != 'done':
+            return job.get('status', 'failed')
+        async with http.get(f"{base}{job['download_url']}") as response:
+            await response.read()
+            return 'done' if response.status == 200 else response.status
+    except (aiohttp.ClientError, asyncio.TimeoutError, KeyError):
+        return 'failed'
+
+
+async def run_mode(mode, args):
+    base = f"http://127.0.0.1:{args.port}"
+    server = start_server(mode, args.port)
+    steps = []
+    try:
+        async with aiohttp.ClientSession(cookie_jar=aiohttp.CookieJar(unsafe=True)) as http:
+            await wait_ready(http, base)
+            async with http.post(f"{base}/login", data={'employee_id': MANAGER, 'password': 'bench'},
+                                 allow_redirects=False) as response:
+                assert response.status == 302, response.status
+            cookie = '; '.join(f"{c.key}={c.value}" for c in http.cookie_jar)
+
+            held = []
+            for target in args.clients:
+                clients, connect_ms, failures = await connect_clients(base, cookie, target - len(held))
+                held += clients
+
+                stop, light = asyncio.Event(), []
+                sampler = asyncio.create_task(sample_light(http, base, stop, light))
+                started = time.perf_counter()
+                # Distinct ranges so the jobs are not answered from the workbook cache
+                outcomes = await asyncio.gather(*(slow_request(http, base, args.days)
+                                                  for _ in range(args.slow_requests)),
+                                                *(report_job(http, base, args.days + i)
+                                                  for i in range(len(held), len(held) + args.report_jobs)))
+                statuses, jobs = outcomes[:args.slow_requests], outcomes[args.slow_requests:]
+                elapsed = time.perf_counter() - started
+                stop.set()
+                await sampler
+
+                ok_light = [ms for ms in light if ms is not None]
+                steps.append({
+                    'clients_target': target,
+                    'clients_connected': sum(1 for c in held if c.connected),
+                    'connect_failures': failures,
+                    'connect_p95_ms': round(percentile(connect_ms, 95), 1) if connect_ms else None,
+                    'light_p50_ms': round(statistics.median(ok_light), 1) if ok_light else None,
+                    'light_p95_ms': round(percentile(ok_light, 95), 1) if ok_light else None,
+                    'light_max_ms': round(max(ok_light), 1) if ok_light else None,
+                    'light_failures': len(light) - len(ok_light),
+                    'reports': {str(status): statuses.count(status) for status in set(statuses)},
+                    'report_jobs': {str(status): jobs.count(status) for status in set(jobs)},
+                    'reports_elapsed_s': round(elapsed, 2),
+                })
+                print(f"{mode:<16} {target:>6} clients: {steps[-1]}", file=sys.stderr)
+
+            for client in held:
+                if client.connected:
+                    await client.disconnect()
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', default=['threading', 'eventlet:inline', 'eventlet'])
+    parser.add_argument('--clients', type=int, nargs='+', default=[100, 250, 500, 1000])
+    parser.add_argument('--slow-requests', type=int, default=8, help="report downloads in flight per step")
+    parser.add_argument('--report-jobs', type=int, default=4, help="queued report jobs in flight per step")
+    parser.add_argument('--associates', type=int, default=200)
+    parser.add_argument('--days', type=int, default=60, help="seeded history and report range")
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--output', help="write the JSON result here (default: stdout)")
+    args = parser.parse_args()
+
+    conn = pool.acquire()
+    try:
+        cleanup(conn, PROCESS, prefix=PREFIX)
+        seed(conn, PROCESS, args.associates, args.days, prefix=PREFIX)
+        conn.cursor().execute(
+            "INSERT INTO cred (emp_id, name, password, role, email, process) VALUES (?, ?, ?, ?, ?, ?)",
+            MANAGER, 'Bench manager', 'bench', 'manager', f"{MANAGER}@bench.local", PROCESS)
+        conn.commit()
+
+        result = {'params': vars(args), 'modes': {}}
+        for mode in args.modes:
+            result['modes'][mode] = asyncio.run(run_mode(mode, args))
+    finally:
+        cleanup(conn, PROCESS, prefix=PREFIX)
+        pool.release(conn)
+
+    document = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(document + '\n')
+    else:
+        print(document)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Manager dashboard page-load latency against team size and date-range width.
+
+Seeds a throwaway process into the database behind ADHERENCE_DSN, then times
+the old nine-query sequence against the new loaders (login summary plus the
+first team log page the page fetches) and the full /manager route. Run from the
+repository root:
+
+    python -m benchmarks.bench_dashboard --associates 50 300 --days 1 7 30
+"""
+import argparse
+import statistics
+import time
+from datetime import timedelta
+
+from app import app
+from dashboard import load_dashboard, load_team_log_page, resolve_date_range
+from db import pool
+from benchmarks.seed import seed, cleanup
+
+PROCESS = 'Bench Dashboard'
+
+LEGACY_QUERIES = [
+    ("SELECT u.name, t.activity_name, CAST(t.start_time AS TIME) FROM {table} t JOIN cred u ON t.emp_id = u.emp_id "
+     "WHERE u.process = ? AND t.stop_time IS NULL AND CAST(t.start_time AS DATE) = CAST(GETDATE() AS DATE)", 'live'),
+    ("SELECT u.name, s.activity_type, s.activity_name, s.start_time FROM cred u "
+     "JOIN Current_Activity s ON u.emp_id = s.emp_id WHERE u.process = ?", 'process'),
+    ("SELECT c.name, l.login_time, l.logout_time, l.duration, l.log_date FROM logins l JOIN cred c ON l.emp_id = c.emp_id "
+     "WHERE c.process = ? AND l.log_date >= ? AND l.log_date < ? ORDER BY l.log_date DESC, l.login_time DESC", 'logins'),
+    ("SELECT u.name, t.activity_name, t.start_time, t.stop_time, t.total_duration FROM {table} t "
+     "JOIN cred u ON t.emp_id = u.emp_id WHERE u.process = ? AND t.start_time >= ? AND t.start_time < ?", 'range'),
+    ("SELECT aa.activity_type, COUNT(*) FROM Current_Activity aa JOIN cred u ON aa.emp_id = u.emp_id "
+     "WHERE u.process IN (?) GROUP BY aa.activity_type", 'process'),
+]
+
+
+def legacy_load(cursor, process, start_dt, end_dt):
+    # The query sequence manager_dashboard() used to run, one statement at a time
+    rows = []
+    for sql, kind in LEGACY_QUERIES:
+        tables = ['task', 'breaks', 'session_time'] if '{table}' in sql else [None]
+        for table in tables:
+            statement = sql.format(table=table)
+            if kind == 'logins':
+                cursor.execute(statement, process, start_dt.date(), end_dt.date())
+            elif kind == 'range':
+                cursor.execute(statement, process, start_dt, end_dt)
+            else:
+                cursor.execute(statement, process)
+            rows.extend(cursor.fetchall())
+    rows.sort(key=lambda r: str(r[2]), reverse=True)
+    return rows
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--associates', type=int, nargs='+', default=[50, 150, 300])
+    parser.add_argument('--days', type=int, nargs='+', default=[1, 7, 30])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user'] = {'emp_id': 'BENCHMGR', 'role': 'manager', 'process': PROCESS}
+        sess['process'] = [PROCESS]
+
+    print(f"{'associates':>10} {'days':>5} {'legacy ms':>10} {'batched ms':>11} {'/manager ms':>12}")
+    for associates in args.associates:
+        for days in args.days:
+            conn = pool.acquire()
+            try:
+                cleanup(conn, PROCESS)
+                seed(conn, PROCESS, associates, days)
+                start_dt, end_dt = resolve_date_range(None, None)
+                start_dt -= timedelta(days=days - 1)
+                cursor = conn.cursor()
+                legacy = timed(lambda: legacy_load(cursor, PROCESS, start_dt, end_dt), args.repeat)
+                batched = timed(lambda: (load_dashboard(cursor, PROCESS, start_dt, end_dt),
+                                         load_team_log_page(cursor, PROCESS, start_dt, end_dt)), args.repeat)
+                query = {'process': PROCESS, 'start_date': start_dt.strftime('%Y-%m-%d'),
+                         'end_date': (end_dt - timedelta(days=1)).strftime('%Y-%m-%d')}
+                page = timed(lambda: client.get('/manager', query_string=query), args.repeat)
+                print(f"{associates:>10} {days:>5} {legacy:>10.1f} {batched:>11.1f} {page:>12.1f}")
+            finally:
+                cleanup(conn, PROCESS)
+                pool.release(conn)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""
+How SocketIO event delivery scales from 1 to N workers behind the message queue
+(event_bus.py). For every count in `--workers`, that many `serve.py` workers are started
+on consecutive ports from `--port`, all on one queue (by default a Unix socket broker
+started here; `--queue redis://...` to measure another backend).
+
+`--managers` SocketIO clients, logged in as one manager, are spread round-robin over the
+workers; `--senders` associates post /activity round-robin to the workers at `--rate`
+events per second for `--duration` seconds. Every event must reach every manager, most
+of them through another worker. Prints one JSON document with, per worker count: events
+sent, deliveries expected/received, delivery throughput and the send -> receive latency
+p50/p95/p99/max (this includes SOCKETIO_BATCH_WINDOW, pass `--batch-window 0` to see the
+queue alone).
+
+    pip install "python-socketio[asyncio_client]" eventlet
+    python -m benchmarks.bench_event_bus --workers 1 2 4 --managers 60 --rate 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+import socketio
+
+from db import pool
+from benchmarks.seed import seed, cleanup, emp_ids
+
+PROCESS = 'Bench Event Bus'
+PREFIX = 'BE'
+MANAGER = PREFIX + 'M'
+
+
+def start_broker(path):
+    broker = subprocess.Popen([sys.executable, 'event_bus.py', path])
+    deadline = time.monotonic() + 10
+    while not os.path.exists(path):
+        if time.monotonic() > deadline or broker.poll() is not None:
+            raise RuntimeError("event bus broker did not start")
+        time.sleep(0.1)
+    return broker
+
+
+def start_worker(port, args, queue):
+    env = dict(os.environ, SOCKETIO_ASYNC_MODE=args.async_mode, PORT=str(port), HOST='127.0.0.1',
+               SOCKETIO_MESSAGE_QUEUE=queue, LOG_LEVEL='ERROR')
+    if args.batch_window is not None:
+        env['SOCKETIO_BATCH_WINDOW'] = str(args.batch_window)
+    return subprocess.Popen([sys.executable, 'serve.py'], env=env)
+
+
+async def wait_ready(http, base, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with http.get(f"{base}/login") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"server at {base} did not start")
+
+
+async def login(base, emp_id):
+    """A client session logged in as `emp_id`; the cookie is valid on every worker."""
+    http = aiohttp.ClientSession(cookie_jar=aiohttp.CookieJar(unsafe=True))
+    async with http.post(f"{base}/login", data={'employee_id': emp_id, 'password': 'bench'},
+                         allow_redirects=False) as response:
+        assert response.status == 302, (emp_id, response.status)
+    return http
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[max(int(len(values) * pct / 100 + 0.5) - 1, 0)] if values else None
+
+
+async def run_workers(count, args):
+    bases = [f"http://127.0.0.1:{args.port + i}" for i in range(count)]
+    broker, socket_dir = None, None
+    queue = args.queue
+    if not queue:
+        socket_dir = tempfile.TemporaryDirectory()
+        path = os.path.join(socket_dir.name, 'bus.sock')
+        broker = start_broker(path)
+        queue = f"unix://{path}"
+    workers = [start_worker(args.port + i, args, queue) for i in range(count)]
+    sessions, managers = [], []
+    try:
+        async with aiohttp.ClientSession() as http:
+            for base in bases:
+                await wait_ready(http, base)
+
+        manager_http = await login(bases[0], MANAGER)
+        sessions.append(manager_http)
+        cookie = '; '.join(f"{c.key}={c.value}" for c in manager_http.cookie_jar)
+
+        latencies, received = [], [0]
+
+        def on_events(payloads):
+            now = time.time()
+            for payload in payloads if isinstance(payloads, list) else [payloads]:
+                desc = payload.get('desc', '')
+                if desc.startswith('bench '):
+                    latencies.append((now - float(desc.split()[2])) * 1000)
+                    received[0] += 1
+
+        for i in range(args.managers):
+            client = socketio.AsyncClient(reconnection=False)
+            client.on('new_activity', on_events)
+            client.on('new_activity_batch', on_events)
+            await client.connect(bases[i % count], headers={'Cookie': cookie}, transports=['websocket'])
+            managers.append(client)
+
+        senders = []
+        for i, emp_id in enumerate(emp_ids(PREFIX, args.senders)):
+            sessions.append(await login(bases[i % count], emp_id))
+            senders.append((sessions[-1], bases[i % count]))
+        await asyncio.sleep(1)  # let every worker's subscriber settle
+
+        sent, failed = [0], [0]
+
+        async def send(seq):
+            http, base = senders[seq % len(senders)]
+            payload = {'type': 'bench', 'description': f"bench {seq} {time.time():.6f}"}
+            try:
+                async with http.post(f"{base}/activity", json=payload) as response:
+                    if response.status == 204:
+                        sent[0] += 1
+                    else:
+                        failed[0] += 1
+            except aiohttp.ClientError:
+                failed[0] += 1
+
+        total = int(args.rate * args.duration)
+        started = time.time()
+        tasks = []
+        for seq in range(total):
+            delay = started + seq / args.rate - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(seq)))
+        await asyncio.gather(*tasks)
+        await asyncio.sleep(args.drain)
+        elapsed = time.time() - started
+
+        expected = sent[0] * args.managers
+        return {
+            'workers': count,
+            'events_sent': sent[0],
+            'events_failed': failed[0],
+            'deliveries_expected': expected,
+            'deliveries_received': received[0],
+            'delivery_ratio': round(received[0] / expected, 4) if expected else None,
+            'deliveries_per_s': round(received[0] / elapsed, 1),
+            'latency_p50_ms': round(percentile(latencies, 50), 1) if latencies else None,
+            'latency_p95_ms': round(percentile(latencies, 95), 1) if latencies else None,
+            'latency_p99_ms': round(percentile(latencies, 99), 1) if latencies else None,
+            'latency_max_ms': round(max(latencies), 1) if latencies else None,
+        }
+    finally:
+        for client in managers:
+            if client.connected:
+                await client.disconnect()
+        for http in sessions:
+            await http.close()
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.wait(timeout=30)
+        if broker is not None:
+            broker.terminate()
+            broker.wait(timeout=10)
+            socket_dir.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--managers', type=int, default=40, help="SocketIO clients, spread over the workers")
+    parser.add_argument('--senders', type=int, default=20, help="associates posting /activity")
+    parser.add_argument('--rate', type=float, default=100, help="events per second, all senders")
+    parser.add_argument('--duration', type=float, default=20, help="seconds of sending per worker count")
+    parser.add_argument('--drain', type=float, default=3, help="seconds to wait for late deliveries")
+    parser.add_argument('--queue', help="message queue URL (default: a Unix socket broker started here)")
+    parser.add_argument('--async-mode', default='eventlet')
+    parser.add_argument('--batch-window', type=float, help="SOCKETIO_BATCH_WINDOW of the workers")
+    parser.add_argument('--port', type=int, default=5060, help="port of the first worker")
+    parser.add_argument('--output', help="write the JSON result here (default: stdout)")
+    args = parser.parse_args()
+
+    conn = pool.acquire()
+    try:
+        cleanup(conn, PROCESS, prefix=PREFIX)
+        seed(conn, PROCESS, args.senders, 1, prefix=PREFIX, live=False)
+        conn.cursor().execute(
+            "INSERT INTO cred (emp_id, name, password, role, email, process) VALUES (?, ?, ?, ?, ?, ?)",
+            MANAGER, 'Bench manager', 'bench', 'manager', f"{MANAGER}@bench.local", PROCESS)
+        conn.commit()
+
+        result = {'params': vars(args), 'runs': []}
+        for count in args.workers:
+            result['runs'].append(asyncio.run(run_workers(count, args)))
+            print(f"{count} workers: {result['runs'][-1]}", file=sys.stderr)
+    finally:
+        cleanup(conn, PROCESS, prefix=PREFIX)
+        pool.release(conn)
+
+    document = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(document + '\n')
+    else:
+        print(document)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Login throughput during a simulated shift start: `--associates` employees all log in
+within a few seconds, `--concurrency` at a time.
+
+Compares the previous store_login (INSERT into logs, check logins, MIN(timestamp)
+over the day's logs rows, INSERT) with lifecycle.record_login, then drives the whole
+POST /login route. Seeds a throwaway process into the database behind ADHERENCE_DSN:
+
+    python -m benchmarks.bench_login_load --associates 500 --concurrency 25
+"""
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from app import app
+from db import pool
+from lifecycle import record_login
+from benchmarks.seed import seed, cleanup
+
+PROCESS = 'Bench Login Load'
+PREFIX = 'BL'
+
+
+def legacy_store_login(emp_id):
+    # The sequence store_login used to run
+    today = date.today()
+    conn = pool.acquire()
+    try:
+        cursor = conn.cursor()
+        login_time = datetime.now()
+        cursor.execute("INSERT INTO logs (emp_id, activity_type, description, timestamp) VALUES (?, ?, ?, ?)",
+                       emp_id, 'login', 'User logged in', login_time)
+        cursor.execute("SELECT * FROM logins WHERE emp_id = ? AND log_date = ?", emp_id, today)
+        if not cursor.fetchone():
+            cursor.execute("""
+                SELECT MIN(timestamp) FROM logs
+                WHERE emp_id = ? AND activity_type = 'login' AND timestamp >= ? AND timestamp < ?
+            """, emp_id, today, today + timedelta(days=1))
+            first = cursor.fetchone()[0]
+            cursor.execute("INSERT INTO logins (emp_id, login_time, log_date) VALUES (?, ?, ?)",
+                           emp_id, first.time(), today)
+        conn.commit()
+    finally:
+        pool.release(conn)
+
+
+_clients = threading.local()
+
+
+def route_login(emp_id):
+    if not hasattr(_clients, 'client'):
+        _clients.client = app.test_client()
+    response = _clients.client.post('/login', data={'employee_id': emp_id, 'password': 'bench'})
+    assert response.status_code == 302, response.status_code
+
+
+def seed_logs(conn, emp_ids, days):
+    # A login and a logout audit row per associate and earlier day
+    today = datetime.combine(date.today(), datetime.min.time())
+    rows = []
+    for offset in range(1, days + 1):
+        day = today - timedelta(days=offset)
+        for emp_id in emp_ids:
+            rows.append((emp_id, 'login', 'User logged in', day + timedelta(hours=9)))
+            rows.append((emp_id, 'logout', 'User logged out', day + timedelta(hours=18)))
+    cursor = conn.cursor()
+    cursor.fast_executemany = True
+    cursor.executemany("INSERT INTO logs (emp_id, activity_type, description, timestamp) VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+
+
+def run(login, emp_ids, concurrency):
+    latencies = []
+
+    def one(emp_id):
+        started = time.perf_counter()
+        login(emp_id)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, emp_ids))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'logins_per_s': len(emp_ids) / elapsed,
+        'p50_ms': statistics.median(latencies),
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1],
+        'max_ms': latencies[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--associates', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=25)
+    parser.add_argument('--history-days', type=int, default=30,
+                        help="days of earlier logins/logs rows per associate (what MIN(timestamp) scans past)")
+    args = parser.parse_args()
+
+    conn = pool.acquire()
+    try:
+        cleanup(conn, PROCESS, prefix=PREFIX)
+        emp_ids = seed(conn, PROCESS, args.associates, args.history_days, activities_per_day=1,
+                       prefix=PREFIX, live=False)
+        seed_logs(conn, emp_ids, args.history_days)
+        # The seeded history includes today; start the shift from a clean day
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM logins WHERE emp_id LIKE ? AND log_date = ?", PREFIX + '%', date.today())
+        conn.commit()
+
+        print(f"{args.associates} associates, concurrency {args.concurrency}")
+        print(f"{'path':<14} {'logins/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        for name, login in (('store_login', legacy_store_login), ('record_login', record_login),
+                            ('POST /login', route_login)):
+            result = run(login, emp_ids, args.concurrency)
+            print(f"{name:<14} {result['logins_per_s']:>9.1f} {result['p50_ms']:>8.1f} "
+                  f"{result['p95_ms']:>8.1f} {result['max_ms']:>8.1f}")
+            cursor.execute("DELETE FROM logins WHERE emp_id LIKE ? AND log_date = ?", PREFIX + '%', date.today())
+            cursor.execute("DELETE FROM logs WHERE emp_id LIKE ? AND timestamp >= ?", PREFIX + '%', date.today())
+            conn.commit()
+    finally:
+        cleanup(conn, PROCESS, prefix=PREFIX)
+        pool.release(conn)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Micro-benchmark of the occupancy heatmap computation on synthetic intervals.
+
+Compares a per-interval Python loop over the buckets each interval touches with the
+vectorized occupancy.compute_occupancy, for a month of activity (no database needed):
+
+    python -m benchmarks.bench_occupancy --associates 100 500 --days 31 --bucket 15
+"""
+import argparse
+import time as clock
+
+import numpy as np
+
+from occupancy import SERIES, compute_occupancy
+
+
+def make_intervals(associates, days, per_day=30, seed=7):
+    """
+    9-hour shifts and `per_day` back-to-back activities per associate and day; one
+    associate's activities never overlap, not even across midnight.
+    """
+    rng = np.random.default_rng(seed)
+    emp_ids = np.array([f"E{i:05d}" for i in range(associates)], dtype=object)
+    shift_starts = (np.arange(days)[None, :] * 86400 + rng.integers(6, 10, (associates, days)) * 3600).ravel()
+    shift_emps = np.repeat(emp_ids, days)
+
+    lengths = rng.integers(60, 9 * 3600 // per_day * 2, (associates * days, per_day))
+    starts = np.repeat(shift_starts, per_day) + (np.cumsum(lengths, axis=1) - lengths).ravel()
+    stops = starts + lengths.ravel()
+    emps = np.repeat(shift_emps, per_day)
+    kinds = rng.choice(np.array(['task', 'break', 'session']), size=len(starts), p=[0.7, 0.1, 0.2])
+
+    intervals = {kind: (emps[kinds == kind], starts[kinds == kind], stops[kinds == kind])
+                 for kind in ('task', 'break', 'session')}
+    intervals['logged_in'] = (shift_emps, shift_starts, shift_starts + 9 * 3600)
+    return intervals
+
+
+def loop_occupancy(intervals, span, width):
+    # Covered seconds per bucket, one interval and one bucket at a time (no merging)
+    buckets = -(-span // width)
+    seconds = {}
+    for series in SERIES:
+        covered = [0] * buckets
+        for start, stop in zip(*intervals[series][1:]):
+            start, stop = max(int(start), 0), min(int(stop), span)
+            for bucket in range(start // width, (stop - 1) // width + 1 if stop > start else 0):
+                covered[bucket] += min(stop, (bucket + 1) * width) - max(start, bucket * width)
+        seconds[series] = covered
+    return seconds
+
+
+def timed(fn):
+    started = clock.perf_counter()
+    result = fn()
+    return result, clock.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--associates', type=int, nargs='+', default=[100, 500])
+    parser.add_argument('--days', type=int, default=31)
+    parser.add_argument('--bucket', type=int, default=15, help="bucket width in minutes (must divide a day)")
+    parser.add_argument('--loop-max-intervals', type=int, default=200_000,
+                        help="skip the (slow) loop implementation above this many intervals")
+    args = parser.parse_args()
+
+    span, width = args.days * 86400, args.bucket * 60
+    print(f"{'associates':>10} {'intervals':>10} {'loop s':>10} {'numpy s':>10} {'speedup':>8}")
+    for associates in args.associates:
+        intervals = make_intervals(associates, args.days)
+        count = sum(len(starts) for _, starts, _ in intervals.values())
+        engine, engine_s = timed(lambda: compute_occupancy(intervals, span, width))
+        if count <= args.loop_max_intervals:
+            loop, loop_s = timed(lambda: loop_occupancy(intervals, span, width))
+            # Generated intervals of one associate never overlap, so no merging is needed to agree
+            assert np.allclose(np.round(np.array(loop['task']) / width, 2), engine['concurrency']['task'])
+            print(f"{associates:>10} {count:>10} {loop_s:>10.3f} {engine_s:>10.3f} {loop_s / engine_s:>7.1f}x")
+        else:
+            print(f"{associates:>10} {count:>10} {'-':>10} {engine_s:>10.3f} {'-':>8}")
+
+
+if __name__ == '__main__':
+    main()
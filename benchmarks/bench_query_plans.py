@@ -0,0 +1,109 @@
+"""
+Query plans and latency of the old CAST(... AS DATE) predicates against the half-open
+`>= day AND < next_day` ranges, on a seeded dataset with the migration indexes applied
+(`flask --app app db upgrade`). For each query pair prints the plan operators and
+indexes used, the estimated cost and the median latency:
+
+    python -m benchmarks.bench_query_plans --associates 300 --days 30
+"""
+import argparse
+import statistics
+import time
+import xml.etree.ElementTree as ET
+from datetime import date, timedelta
+
+from db import pool
+from benchmarks.seed import seed, cleanup
+
+PROCESS = 'Bench Query Plans'
+SHOWPLAN_NS = {'p': 'http://schemas.microsoft.com/sqlserver/2004/07/showplan'}
+
+# name -> (legacy sql, range sql); every query takes (emp_id | process, day, next_day)
+QUERIES = {
+    'active session': (
+        "SELECT TOP 1 id, start_time FROM task "
+        "WHERE emp_id = ? AND CAST(start_time AS DATE) = CAST(GETDATE() AS DATE) AND stop_time IS NULL",
+        "SELECT TOP 1 id, start_time FROM task "
+        "WHERE emp_id = ? AND start_time >= ? AND start_time < ? AND stop_time IS NULL",
+    ),
+    "employee's day": (
+        "SELECT activity_name, start_time, stop_time, total_duration FROM task "
+        "WHERE emp_id = ? AND CAST(start_time AS DATE) = CAST(GETDATE() AS DATE)",
+        "SELECT activity_name, start_time, stop_time, total_duration FROM task "
+        "WHERE emp_id = ? AND start_time >= ? AND start_time < ?",
+    ),
+    'live board': (
+        "SELECT u.name, t.activity_name, t.start_time FROM task t JOIN cred u ON t.emp_id = u.emp_id "
+        "WHERE u.process = ? AND t.stop_time IS NULL AND CAST(t.start_time AS DATE) = CAST(GETDATE() AS DATE)",
+        "SELECT u.name, t.activity_name, t.start_time FROM task t JOIN cred u ON t.emp_id = u.emp_id "
+        "WHERE u.process = ? AND t.stop_time IS NULL AND t.start_time >= ? AND t.start_time < ?",
+    ),
+}
+
+
+def params_for(sql, key, day):
+    return [key, day, day + timedelta(days=1)][:sql.count('?')]
+
+
+def plan(cursor, sql, params):
+    """(operators with their index, estimated subtree cost) of the statement's estimated plan."""
+    cursor.execute("SET SHOWPLAN_XML ON")
+    try:
+        cursor.execute(sql, params)
+        root = ET.fromstring(cursor.fetchone()[0])
+    finally:
+        cursor.execute("SET SHOWPLAN_XML OFF")
+
+    operators = []
+    for relop in root.iter(f"{{{SHOWPLAN_NS['p']}}}RelOp"):
+        index = relop.find('.//p:Object', SHOWPLAN_NS)
+        name = index.get('Index') if index is not None else None
+        label = relop.get('PhysicalOp') + (f" {name}" if name else '')
+        if label not in operators:
+            operators.append(label)
+    statement = root.find('.//p:StmtSimple', SHOWPLAN_NS)
+    return operators, float(statement.get('StatementSubTreeCost'))
+
+
+def latency(cursor, sql, params, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--associates', type=int, default=300)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    conn = pool.acquire()
+    try:
+        cleanup(conn, PROCESS)
+        emp_ids = seed(conn, PROCESS, args.associates, args.days)
+        cursor = conn.cursor()
+        cursor.execute("UPDATE STATISTICS activity")
+        today = date.today()
+
+        print(f"{args.associates} associates, {args.days} days seeded\n")
+        for name, (legacy_sql, range_sql) in QUERIES.items():
+            key = PROCESS if 'process' in legacy_sql else emp_ids[len(emp_ids) // 2]
+            print(name)
+            for label, sql in (('CAST', legacy_sql), ('range', range_sql)):
+                params = params_for(sql, key, today)
+                operators, cost = plan(cursor, sql, params)
+                ms = latency(cursor, sql, params, args.repeat)
+                print(f"  {label:<6} {ms:>8.2f} ms  cost {cost:>8.4f}  {', '.join(operators)}")
+            print()
+    finally:
+        cleanup(conn, PROCESS)
+        pool.release(conn)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,376 @@
+"""
+Load and latency benchmark of the main routes, meant to be compared across commits.
+
+Seeds `--processes` throwaway processes of `--associates` associates (plus one manager
+each) with `--days` days of history into the database behind ADHERENCE_DSN. Then every
+associate, `--concurrency` at a time, opens a SocketIO connection, POSTs /login and runs
+`--cycles` x (POST /start, POST /stop), while each manager loads GET /manager and
+GET /download-report `--manager-rounds` times. Writes one JSON document with the
+p50/p95/p99 latency, throughput, errors and DB statements per route:
+
+    docker compose -f benchmarks/docker-compose.yml up -d
+    python -m benchmarks.bench_suite --create-database --migrate --output before.json
+    python -m benchmarks.bench_suite --output after.json --baseline before.json
+
+Requests go through the Flask test client in this process, or with `--target URL` over
+HTTP to a running server (DB statement counts are then unknown; SocketIO needs the
+python-socketio client transports). The database stand-in is a local SQL Server
+container rather than SQLite: the application's queries are T-SQL (MERGE, OUTPUT,
+TOP, locking hints) that SQLite cannot run.
+"""
+import argparse
+import http.cookiejar
+import json
+import math
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import pyodbc
+
+import migrate
+from db import DSN, pool
+from benchmarks.seed import ACTIVITY_TYPES, seed, cleanup
+
+PROCESS = 'Bench Suite {}'
+PREFIX = 'BS{:02d}'
+
+
+class QueryCounter:
+    """Counts the statements each thread executes on connections the pool opens."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def count(self):
+        return getattr(self._local, 'count', 0)
+
+    def reset(self):
+        self._local.count = 0
+
+    def add(self):
+        self._local.count = self.count + 1
+
+    def install(self, pool):
+        connect = pool._connect
+        pool._connect = lambda: _CountingConnection(connect(), self)
+
+
+class _CountingConnection:
+    def __init__(self, raw, counter):
+        self._raw = raw
+        self._counter = counter
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self):
+        return _CountingCursor(self._raw.cursor(), self._counter)
+
+
+class _CountingCursor:
+    def __init__(self, raw, counter):
+        object.__setattr__(self, '_raw', raw)
+        object.__setattr__(self, '_counter', counter)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._raw, name, value)  # e.g. fast_executemany
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def execute(self, *args):
+        self._counter.add()
+        return self._raw.execute(*args)
+
+    def executemany(self, *args):
+        self._counter.add()
+        return self._raw.executemany(*args)
+
+
+class Recorder:
+    """Latency, DB statements and failures of every request, by route."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}  # route -> [(ms, statements, ok), ...]
+
+    def add(self, route, ms, statements, ok):
+        with self._lock:
+            self.samples.setdefault(route, []).append((ms, statements, ok))
+
+    def summary(self, elapsed):
+        routes = {}
+        for route, samples in sorted(self.samples.items()):
+            latencies = sorted(ms for ms, _, _ in samples)
+            statements = [count for _, count, _ in samples if count is not None]
+            routes[route] = {
+                'count': len(samples),
+                'errors': sum(1 for _, _, ok in samples if not ok),
+                'p50_ms': round(percentile(latencies, 50), 2),
+                'p95_ms': round(percentile(latencies, 95), 2),
+                'p99_ms': round(percentile(latencies, 99), 2),
+                'max_ms': round(latencies[-1], 2),
+                'throughput_rps': round(len(samples) / elapsed, 2),
+                'queries_per_request': round(sum(statements) / len(statements), 2) if statements else None,
+                'queries_total': sum(statements) if statements else None,
+            }
+        return routes
+
+
+def percentile(values, pct):
+    # Nearest rank of sorted values
+    return values[max(math.ceil(pct / 100 * len(values)) - 1, 0)]
+
+
+class TestClientDriver:
+    """One virtual user on the Flask test client (cookies are kept per user)."""
+
+    def __init__(self, counter):
+        from app import app, socketio
+        self.app, self.socketio, self.counter = app, socketio, counter
+        self.client = app.test_client()
+        self.socket = None
+
+    def request(self, method, path, data=None, query=None):
+        self.counter.reset()
+        response = self.client.open(path, method=method, data=data, query_string=query)
+        response.get_data()  # drain streamed bodies (reports)
+        response.close()
+        return response.status_code, self.counter.count
+
+    def connect_socket(self):
+        self.counter.reset()
+        self.socket = self.socketio.test_client(self.app, flask_test_client=self.client)
+        return self.socket.is_connected(), self.counter.count
+
+    def received(self):
+        return len(self.socket.get_received()) if self.socket and self.socket.is_connected() else 0
+
+    def close(self):
+        if self.socket and self.socket.is_connected():
+            self.socket.disconnect()
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args):
+        return None  # report the 302 itself, like the test client
+
+
+class HttpDriver:
+    """One virtual user against a running server; cookies are kept per user."""
+
+    def __init__(self, target):
+        self.target = target.rstrip('/')
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect)
+        self.socket = None
+        self.events = 0
+
+    def request(self, method, path, data=None, query=None):
+        url = self.target + path + ('?' + urllib.parse.urlencode(query) if query else '')
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(urllib.request.Request(url, data=body, method=method)) as response:
+                response.read()
+                return response.status, None
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+    def connect_socket(self):
+        try:
+            import socketio
+            self.socket = socketio.Client(reconnection=False)
+            self.socket.on('*', lambda *args: setattr(self, 'events', self.events + 1))
+            cookie = '; '.join(f"{c.name}={c.value}" for c in self.cookies)
+            self.socket.connect(self.target, headers={'Cookie': cookie}, wait_timeout=10)
+            return True, None
+        except Exception:
+            return False, None
+
+    def received(self):
+        return self.events
+
+    def close(self):
+        if self.socket is not None and self.socket.connected:
+            self.socket.disconnect()
+
+
+def timed(recorder, route, call, ok=lambda result: True):
+    started = time.perf_counter()
+    try:
+        result, statements = call()
+        success = ok(result)
+    except Exception:
+        statements, success = None, False
+    recorder.add(route, (time.perf_counter() - started) * 1000, statements, success)
+
+
+def associate_run(driver, recorder, emp_id, cycles, think):
+    timed(recorder, 'POST /login', lambda: driver.request('POST', '/login', {'employee_id': emp_id, 'password': 'bench'}),
+          lambda status: status == 302)
+    timed(recorder, 'SocketIO connect', driver.connect_socket, bool)
+    for cycle in range(cycles):
+        activity_type, names = ACTIVITY_TYPES[cycle % len(ACTIVITY_TYPES)]
+        timed(recorder, 'POST /start', lambda: driver.request('POST', '/start', {'type': activity_type, 'label': names[0]}),
+              lambda status: status == 200)
+        time.sleep(think)
+        timed(recorder, 'POST /stop', lambda: driver.request('POST', '/stop'), lambda status: status == 200)
+    driver.close()
+
+
+def manager_run(driver, recorder, emp_id, process, rounds, report_days, think):
+    timed(recorder, 'POST /login', lambda: driver.request('POST', '/login', {'employee_id': emp_id, 'password': 'bench'}),
+          lambda status: status == 302)
+    timed(recorder, 'SocketIO connect', driver.connect_socket, bool)
+    today = date.today()
+    report_range = {'process': process, 'start_date': (today - timedelta(days=report_days - 1)).isoformat(),
+                    'end_date': today.isoformat()}
+    for _ in range(rounds):
+        timed(recorder, 'GET /manager', lambda: driver.request('GET', '/manager', query={'process': process}),
+              lambda status: status == 200)
+        timed(recorder, 'GET /download-report', lambda: driver.request('GET', '/download-report', query=report_range),
+              lambda status: status == 200)
+        time.sleep(think)
+    received = driver.received()
+    driver.close()
+    return received
+
+
+def create_database(dsn):
+    """Create the DSN's DATABASE if it does not exist (connects to master for that)."""
+    match = re.search(r'DATABASE=(\w+)', dsn, re.IGNORECASE)
+    if not match:
+        raise SystemExit("--create-database needs DATABASE=<name> in ADHERENCE_DSN")
+    conn = pyodbc.connect(dsn.replace(match.group(0), 'DATABASE=master'), autocommit=True)
+    conn.cursor().execute(f"IF DB_ID('{match.group(1)}') IS NULL CREATE DATABASE [{match.group(1)}]")
+    conn.close()
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def compare(baseline, result):
+    """Per route p95 / throughput of `result` against a previous run, on stderr."""
+    print(f"{'route':<22} {'p95 ms before':>14} {'after':>9} {'change':>8} {'rps before':>11} {'after':>9}", file=sys.stderr)
+    for route, now in result['routes'].items():
+        before = baseline['routes'].get(route)
+        if before is None:
+            continue
+        change = (now['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0.0
+        print(f"{route:<22} {before['p95_ms']:>14.1f} {now['p95_ms']:>9.1f} {change:>+7.1f}% "
+              f"{before['throughput_rps']:>11.1f} {now['throughput_rps']:>9.1f}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=2)
+    parser.add_argument('--associates', type=int, default=100, help="associates per process")
+    parser.add_argument('--days', type=int, default=30, help="days of seeded history")
+    parser.add_argument('--concurrency', type=int, default=20, help="virtual users running at once")
+    parser.add_argument('--cycles', type=int, default=3, help="start/stop pairs per associate")
+    parser.add_argument('--manager-rounds', type=int, default=5, help="/manager + /download-report per manager")
+    parser.add_argument('--report-days', type=int, default=7, help="date range of the downloaded report")
+    parser.add_argument('--think-ms', type=float, default=0, help="pause between a user's requests")
+    parser.add_argument('--target', help="base URL of a running server (default: Flask test client)")
+    parser.add_argument('--create-database', action='store_true', help="create the DSN's DATABASE first")
+    parser.add_argument('--migrate', action='store_true', help="apply the schema migrations first")
+    parser.add_argument('--keep', action='store_true', help="leave the seeded rows in place")
+    parser.add_argument('--output', help="write the JSON result here (default: stdout)")
+    parser.add_argument('--baseline', help="JSON result of an earlier run to compare against")
+    args = parser.parse_args()
+    think = args.think_ms / 1000
+
+    if args.create_database:
+        create_database(DSN)
+    counter = QueryCounter()
+    counter.install(pool)
+    if args.migrate:
+        conn = pool.acquire()
+        try:
+            migrate.upgrade(conn, echo=lambda line: print(line, file=sys.stderr))
+        finally:
+            pool.release(conn)
+
+    processes = [(PROCESS.format(p), PREFIX.format(p)) for p in range(args.processes)]
+    conn = pool.acquire()
+    try:
+        for process, prefix in processes:
+            cleanup(conn, process, prefix=prefix)
+        associates = []
+        for process, prefix in processes:
+            ids = seed(conn, process, args.associates, args.days, prefix=prefix, live=False)
+            associates += [(emp_id, process) for emp_id in ids]
+            conn.cursor().execute(
+                "INSERT INTO cred (emp_id, name, password, role, email, process) VALUES (?, ?, ?, ?, ?, ?)",
+                prefix + 'M', f"Bench manager {prefix}", 'bench', 'manager', f"{prefix}M@bench.local", process)
+        conn.commit()
+        # Sessions start from a clean day
+        for _, prefix in processes:
+            conn.cursor().execute("DELETE FROM logins WHERE emp_id LIKE ? AND log_date = ?", prefix + '%', date.today())
+        conn.commit()
+
+        new_driver = (lambda: HttpDriver(args.target)) if args.target else (lambda: TestClientDriver(counter))
+        recorder = Recorder()
+        print(f"{len(associates)} associates, {len(processes)} managers, concurrency {args.concurrency}",
+              file=sys.stderr)
+
+        started_at = datetime.now()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            managers = [executor.submit(manager_run, new_driver(), recorder, prefix + 'M', process,
+                                        args.manager_rounds, args.report_days, think)
+                        for process, prefix in processes]
+            runs = [executor.submit(associate_run, new_driver(), recorder, emp_id, args.cycles, think)
+                    for emp_id, _ in associates]
+            for run in runs:
+                run.result()
+            events_received = sum(manager.result() for manager in managers)
+        elapsed = time.perf_counter() - started
+    finally:
+        if not args.keep:
+            for process, prefix in processes:
+                cleanup(conn, process, prefix=prefix)
+        pool.release(conn)
+
+    commit, dirty = git_revision()
+    result = {
+        'meta': {'commit': commit, 'dirty': dirty, 'started_at': started_at.isoformat(timespec='seconds'),
+                 'driver': 'http' if args.target else 'test_client', 'params': vars(args)},
+        'elapsed_s': round(elapsed, 3),
+        'requests_per_s': round(sum(len(s) for s in recorder.samples.values()) / elapsed, 2),
+        'routes': recorder.summary(elapsed),
+        'socketio_events_received_by_managers': events_received,
+        'db_pool': pool.stats(),
+    }
+    document = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(document + '\n')
+    else:
+        print(document)
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(json.load(f), result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Synthetic data for the benchmarks. Every seeded employee id starts with a prefix
+so the rows can be removed again with cleanup().
+"""
+import random
+from datetime import date, datetime, time, timedelta
+
+TASKS = ['Inbound Call Handling', 'Outbound Call Handling', 'Email Support', 'Chat Support']
+BREAKS = ['Break 1', 'Lunch Break', 'Break 2', 'RR']
+SESSIONS = ['Team Huddle', 'Training Session', 'Downtime', 'Internal Meeting']
+ACTIVITY_TYPES = [('task', TASKS), ('break', BREAKS), ('session', SESSIONS)]
+
+
+def emp_ids(prefix, associates):
+    return [f"{prefix}{i:05d}" for i in range(associates)]
+
+
+def _duration(start, stop):
+    seconds = int((stop - start).total_seconds())
+    return f"{seconds // 3600:02}:{seconds % 3600 // 60:02}:{seconds % 60:02}"
+
+
+def seed(conn, process, associates, days, activities_per_day=12, prefix='BN', live=True, seed_value=7):
+    """
+    Seed `associates` employees of `process` with `days` days of history ending today.
+    Each day gets one logins row and `activities_per_day` back-to-back activities.
+    With live=True every employee also has one open activity today.
+    """
+    rng = random.Random(seed_value)
+    cursor = conn.cursor()
+    cursor.fast_executemany = True
+    ids = emp_ids(prefix, associates)
+
+    cursor.executemany(
+        "INSERT INTO cred (emp_id, name, password, role, email, process) VALUES (?, ?, ?, ?, ?, ?)",
+        [(emp_id, f"Bench {emp_id}", 'bench', 'associate', f"{emp_id}@bench.local", process) for emp_id in ids])
+    cursor.executemany(
+        "INSERT INTO Process_Tasks (ProcessName, TaskName) VALUES (?, ?)",
+        [(process, task) for task in TASKS])
+
+    today = date.today()
+    logins = []
+    activities = []
+    for day_offset in range(days):
+        day = today - timedelta(days=day_offset)
+        for emp_id in ids:
+            clock = datetime.combine(day, time(9)) + timedelta(minutes=rng.randint(0, 30))
+            login = clock
+            for _ in range(activities_per_day):
+                activity_type, names = rng.choices(ACTIVITY_TYPES, weights=[6, 2, 2])[0]
+                stop = clock + timedelta(minutes=rng.randint(5, 45))
+                activities.append((emp_id, activity_type, rng.choice(names), clock, stop, _duration(clock, stop)))
+                clock = stop
+            logins.append((emp_id, login.time(), clock.time(), day, _duration(login, clock)))
+
+    cursor.executemany(
+        "INSERT INTO logins (emp_id, login_time, logout_time, log_date, duration) VALUES (?, ?, ?, ?, ?)",
+        logins)
+    if activities:
+        cursor.executemany(
+            "INSERT INTO activity (emp_id, activity_type, activity_name, start_time, stop_time, total_duration) "
+            "VALUES (?, ?, ?, ?, ?, ?)", activities)
+
+    if live:
+        now = datetime.now().replace(microsecond=0)
+        for emp_id in ids:
+            activity_type, names = rng.choice(ACTIVITY_TYPES)
+            cursor.execute(
+                "INSERT INTO activity (emp_id, activity_type, activity_name, start_time) VALUES (?, ?, ?, ?)",
+                emp_id, activity_type, rng.choice(names), now - timedelta(minutes=rng.randint(1, 60)))
+
+    conn.commit()
+    return ids
+
+
+def cleanup(conn, process, prefix='BN'):
+    cursor = conn.cursor()
+    pattern = prefix + '%'
+    for table in ['activity', 'activity_daily_rollup', 'logins', 'logs', 'cred']:
+        cursor.execute(f"DELETE FROM {table} WHERE emp_id LIKE ?", pattern)
+    cursor.execute("DELETE FROM Process_Tasks WHERE ProcessName = ?", process)
+    conn.commit()
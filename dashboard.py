@@ -0,0 +1,191 @@
+import os
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from typing import List, NamedTuple, Optional, Tuple
+
+from archive import activity_source
+from instrumentation import query_name
+from presence import ACTIVITY_LABELS
+
+# Team log rows per page (/api/team_log), and the most a client may ask for
+TEAM_LOG_PAGE_SIZE = int(os.environ.get('TEAM_LOG_PAGE_SIZE', '100'))
+TEAM_LOG_MAX_PAGE_SIZE = int(os.environ.get('TEAM_LOG_MAX_PAGE_SIZE', '500'))
+
+
+class LiveActivity(NamedTuple):
+    name: str
+    activity_type: str        # 'Task', 'Break' or 'Session'
+    activity_name: str
+    start_time: str           # HH:MM:SS
+
+
+class LoginRow(NamedTuple):
+    name: str
+    login_time: str
+    logout_time: str
+    duration: Optional[time]
+    log_date: Optional[date]
+
+
+class ActivityLog(NamedTuple):
+    name: str
+    activity: str
+    start: Optional[datetime]
+    stop: Optional[datetime]
+    duration: Optional[time]
+    type: str
+    id: int
+
+
+@dataclass
+class DashboardData:
+    live: List[LiveActivity] = field(default_factory=list)
+    logins: List[LoginRow] = field(default_factory=list)
+    associates: List[Tuple[str, str]] = field(default_factory=list)  # (emp_id, name)
+
+    def live_of_type(self, activity_type):
+        return [row for row in self.live if row.activity_type == activity_type]
+
+
+def resolve_date_range(start_date, end_date):
+    """
+    Turn the optional 'YYYY-MM-DD' filter strings into a half-open [start, end) datetime range.
+    Falls back to today when the dates are missing or invalid.
+    """
+    if start_date and end_date:
+        try:
+            start_dt = datetime.strptime(start_date, "%Y-%m-%d")
+            end_dt = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+            return start_dt, end_dt
+        except ValueError:
+            pass
+    today = datetime.combine(date.today(), datetime.min.time())
+    return today, today + timedelta(days=1)
+
+
+DASHBOARD_LOGINS_QUERY = """
+SELECT c.name, l.login_time, l.logout_time, l.duration, l.log_date
+FROM logins l
+JOIN cred c ON l.emp_id = c.emp_id
+WHERE c.process = ? AND l.log_date >= ? AND l.log_date < ?
+ORDER BY l.log_date DESC, l.login_time DESC
+"""
+
+PROCESS_ASSOCIATES_QUERY = """
+SELECT emp_id, name FROM cred WHERE process = ? ORDER BY name, emp_id
+"""
+
+# Activity rows of one process, newest first (ties broken by id).
+# {filters} narrows to an associate / activity type / activity name, {where} to a
+# keyset page or to the rows started or stopped since a poll cursor.
+TEAM_LOG_QUERY = """
+SELECT {top} u.name, a.activity_name, a.start_time, a.stop_time, a.total_duration, a.activity_type, a.id
+FROM {source} a
+JOIN cred u ON a.emp_id = u.emp_id
+WHERE u.process = ? AND a.start_time >= ? AND a.start_time < ? {filters} {where}
+ORDER BY a.start_time DESC, a.id DESC
+"""
+
+
+def live_activity(entry):
+    """Convert a presence registry entry into the row shape the live cards render."""
+    return LiveActivity(entry.name, entry.activity_type, entry.activity_name,
+                        entry.start_time.strftime('%H:%M:%S'))
+
+
+def load_dashboard(cursor, process, start_dt, end_dt):
+    """
+    Load the login summary the manager dashboard renders. Live cards come from the
+    presence registry and the activity log is fetched by the page through /api/team_log.
+    """
+    with query_name('manager.logins'):
+        cursor.execute(DASHBOARD_LOGINS_QUERY, process, start_dt.date(), end_dt.date())
+
+    data = DashboardData()
+    data.logins = [
+        LoginRow(name,
+                 login_time.strftime("%H:%M:%S") if login_time else '',
+                 logout_time.strftime("%H:%M:%S") if logout_time else '',
+                 duration, log_date)
+        for name, login_time, logout_time, duration, log_date in cursor.fetchall()
+    ]
+
+    # Associate filter of the team log
+    with query_name('manager.associates'):
+        cursor.execute(PROCESS_ASSOCIATES_QUERY, process)
+    data.associates = [(emp_id, name) for emp_id, name in cursor.fetchall()]
+    return data
+
+
+def team_log_filters(emp_id=None, activity_type=None, activity_name=None):
+    """SQL and parameters narrowing the team log; empty values do not filter."""
+    clauses, params = [], []
+    if emp_id:
+        clauses.append("AND a.emp_id = ?")
+        params.append(emp_id)
+    if activity_type:
+        if activity_type not in ACTIVITY_LABELS:
+            raise ValueError(f"unknown activity type {activity_type!r}")
+        clauses.append("AND a.activity_type = ?")
+        params.append(activity_type)
+    if activity_name:
+        clauses.append("AND a.activity_name = ?")
+        params.append(activity_name)
+    return ' '.join(clauses), params
+
+
+def encode_page_cursor(log):
+    """Opaque cursor of the page after `log`: its start time and id."""
+    return f"{log.start.isoformat()}_{log.id}"
+
+
+def decode_page_cursor(value):
+    """(start_time, id) of a cursor from encode_page_cursor; raises ValueError when malformed."""
+    start, _, activity_id = value.rpartition('_')
+    return datetime.fromisoformat(start), int(activity_id)
+
+
+def _team_log_rows(cursor):
+    return [ActivityLog(name, activity, start, stop, duration, ACTIVITY_LABELS[activity_type], activity_id)
+            for name, activity, start, stop, duration, activity_type, activity_id in cursor.fetchall()]
+
+
+def load_team_log(cursor, process, start_dt, end_dt, changed_since, filters=('', [])):
+    """
+    Activity log rows of `process` started in [start_dt, end_dt) and started or stopped
+    at or after `changed_since`, newest first. `filters` comes from team_log_filters().
+    """
+    filter_sql, filter_params = filters
+    with query_name('manager.team_log_changes'):
+        cursor.execute(TEAM_LOG_QUERY.format(top='', source=activity_source(start_dt), filters=filter_sql,
+                                             where="AND (a.start_time >= ? OR a.stop_time >= ?)"),
+                       [process, start_dt, end_dt, *filter_params, changed_since, changed_since])
+    return _team_log_rows(cursor)
+
+
+def load_team_log_page(cursor, process, start_dt, end_dt, after=None, limit=TEAM_LOG_PAGE_SIZE,
+                       filters=('', [])):
+    """
+    One page of the activity log of `process` started in [start_dt, end_dt), newest first,
+    continuing after the (start_time, id) cursor `after`. Sorted and cut in the database,
+    so the cost of a page does not grow with the date range.
+    Returns (rows, cursor of the next page or None).
+    """
+    filter_sql, filter_params = filters
+    where, params = '', []
+    if after is not None:
+        # CAST: compare as DATETIME, a DATETIME2 parameter would not match the stored value exactly
+        where = ("AND (a.start_time < CAST(? AS DATETIME) "
+                 "OR (a.start_time = CAST(? AS DATETIME) AND a.id < ?))")
+        params = [after[0], after[0], after[1]]
+
+    # One extra row tells whether another page follows
+    with query_name('manager.team_log_page'):
+        cursor.execute(TEAM_LOG_QUERY.format(top='TOP (?)', source=activity_source(start_dt), filters=filter_sql,
+                                             where=where),
+                       [limit + 1, process, start_dt, end_dt, *filter_params, *params])
+    logs = _team_log_rows(cursor)
+    if len(logs) > limit:
+        logs = logs[:limit]
+        return logs, encode_page_cursor(logs[-1])
+    return logs, None
@@ -0,0 +1,239 @@
+import os
+import threading
+import time
+from collections import deque
+
+import pyodbc
+from flask import g, has_app_context
+
+from db_executor import ExecutorBusy, executor, offload_cursor
+from instrumentation import instrument_cursor
+
+# Connection settings (override through environment variables)
+DSN = os.environ.get('ADHERENCE_DSN', 'DSN=AdherenceTracker')
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '20'))            # max open connections per worker
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '10'))     # seconds to wait for a free connection
+POOL_MAX_IDLE = float(os.environ.get('DB_POOL_MAX_IDLE', '300'))  # close connections idle longer than this
+POOL_PING_AFTER = float(os.environ.get('DB_POOL_PING_AFTER', '30'))  # health check connections idle longer than this
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the pool timeout."""
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of pyodbc connections.
+
+    Idle connections are reused most-recently-used first, connections that sat idle
+    longer than `max_idle` are closed, and a connection idle longer than `ping_after`
+    is health checked with `SELECT 1` before it is handed out.
+    """
+
+    def __init__(self, connect, max_size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 max_idle=POOL_MAX_IDLE, ping_after=POOL_PING_AFTER):
+        self._connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+
+        self._idle = deque()  # (raw connection, last used monotonic time)
+        self._cond = threading.Condition()
+        self._size = 0        # open connections, idle + in use
+        self._in_use = 0
+
+        # Statistics
+        self._checkouts = 0
+        self._checkout_failures = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._evicted_idle = 0
+        self._health_check_failures = 0
+
+    def _evict_idle(self, now):
+        # Oldest idle connections sit at the left end of the deque
+        stale = []
+        while self._idle and now - self._idle[0][1] > self.max_idle:
+            stale.append(self._idle.popleft()[0])
+            self._size -= 1
+            self._evicted_idle += 1
+        return stale
+
+    @staticmethod
+    def _close_quietly(raw):
+        try:
+            raw.close()
+        except pyodbc.Error:
+            pass
+
+    @staticmethod
+    def _ping(raw):
+        cursor = raw.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+        cursor.close()
+
+    @classmethod
+    def _is_healthy(cls, raw):
+        try:
+            executor.run(cls._ping, raw)
+            return True
+        except (pyodbc.Error, ExecutorBusy):
+            return False
+
+    def acquire(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        raw, last_used = None, None
+
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                stale = self._evict_idle(now)
+                if self._idle:
+                    raw, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._checkout_failures += 1
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                self._cond.wait(remaining)
+            self._in_use += 1
+
+        for conn in stale:
+            self._close_quietly(conn)
+
+        # Connect / health check outside the lock so other threads are not blocked
+        try:
+            if raw is not None and time.monotonic() - last_used > self.ping_after:
+                if not self._is_healthy(raw):
+                    self._close_quietly(raw)
+                    raw = None
+                    with self._cond:
+                        self._health_check_failures += 1
+            if raw is None:
+                raw = executor.run(self._connect)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._checkout_failures += 1
+                self._cond.notify()
+            raise
+
+        waited = time.monotonic() - started
+        with self._cond:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return raw
+
+    def release(self, raw):
+        # Never hand out a connection with an open transaction
+        broken = False
+        try:
+            executor.run(raw.rollback)
+        except (pyodbc.Error, ExecutorBusy):
+            broken = True
+
+        with self._cond:
+            self._in_use -= 1
+            if broken:
+                self._size -= 1
+            else:
+                self._idle.append((raw, time.monotonic()))
+            self._cond.notify()
+
+        if broken:
+            self._close_quietly(raw)
+
+    def close_all(self):
+        with self._cond:
+            idle = [raw for raw, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+        for raw in idle:
+            self._close_quietly(raw)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'checkouts': self._checkouts,
+                'checkout_failures': self._checkout_failures,
+                'wait_time_total': round(self._wait_total, 6),
+                'wait_time_max': round(self._wait_max, 6),
+                'wait_time_avg': round(self._wait_total / self._checkouts, 6) if self._checkouts else 0.0,
+                'evicted_idle': self._evicted_idle,
+                'health_check_failures': self._health_check_failures,
+            }
+
+
+class PooledConnection:
+    """
+    Wraps a pooled pyodbc connection. Calling close() returns it to the pool,
+    except for the per-request connection, which is returned at app context teardown.
+    """
+
+    def __init__(self, pool, raw, request_bound=False):
+        self._pool = pool
+        self._raw = raw
+        self._request_bound = request_bound
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self):
+        # Timed and counted per query name (see instrumentation.py), blocking calls
+        # on the DB executor under eventlet/gevent (see db_executor.py)
+        return instrument_cursor(offload_cursor(self._raw.cursor()))
+
+    def commit(self):
+        executor.run(self._raw.commit)
+
+    def rollback(self):
+        executor.run(self._raw.rollback)
+
+    def close(self):
+        if not self._request_bound:
+            self.release()
+
+    def release(self):
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool.release(raw)
+
+
+pool = ConnectionPool(lambda: pyodbc.connect(DSN))
+
+
+def get_db_connection():
+    # Inside a request (or CLI app context) every caller shares one connection stored on `g`
+    if has_app_context():
+        conn = g.get('_db_conn')
+        if conn is None:
+            conn = g._db_conn = PooledConnection(pool, pool.acquire(), request_bound=True)
+        return conn
+    return PooledConnection(pool, pool.acquire())
+
+
+def get_streaming_connection():
+    """A connection owned by the caller, for responses that outlive the request; close() returns it."""
+    return PooledConnection(pool, pool.acquire())
+
+
+def release_request_connection(exc=None):
+    conn = g.pop('_db_conn', None)
+    if conn is not None:
+        conn.release()
+
+
+def init_app(app):
+    app.teardown_appcontext(release_request_connection)
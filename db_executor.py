@@ -0,0 +1,136 @@
+"""
+Bounded executor for the blocking pyodbc calls.
+
+Under eventlet or gevent every greenlet of a worker shares one OS thread, and pyodbc
+(a C extension) blocks that thread for the whole statement: one slow report query
+stalls every websocket of the worker. In those modes the connect/execute/fetch/commit
+calls of db.py run on the hub's pool of real OS threads (eventlet.tpool, gevent's
+threadpool) instead, DB_EXECUTOR_WORKERS at a time.
+
+Backpressure: at most DB_EXECUTOR_MAX_PENDING calls are running or queued. Further
+callers wait (without blocking the hub) up to DB_EXECUTOR_TIMEOUT seconds and then get
+ExecutorBusy, which the app answers with 503 + Retry-After.
+
+In threading mode (or with DB_OFFLOAD=0) calls run inline on the calling thread.
+"""
+import os
+import threading
+
+DB_OFFLOAD = os.environ.get('DB_OFFLOAD', '1').lower() in ('1', 'true', 'yes')
+# One worker thread per pooled connection by default
+DB_EXECUTOR_WORKERS = int(os.environ.get('DB_EXECUTOR_WORKERS', os.environ.get('DB_POOL_SIZE', '20')))
+DB_EXECUTOR_MAX_PENDING = int(os.environ.get('DB_EXECUTOR_MAX_PENDING', str(4 * DB_EXECUTOR_WORKERS)))
+DB_EXECUTOR_TIMEOUT = float(os.environ.get('DB_EXECUTOR_TIMEOUT', '5'))
+
+
+class ExecutorBusy(Exception):
+    """Raised when no executor slot freed up within the timeout."""
+
+
+class DBExecutor:
+    def __init__(self, workers=DB_EXECUTOR_WORKERS, max_pending=DB_EXECUTOR_MAX_PENDING,
+                 timeout=DB_EXECUTOR_TIMEOUT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.mode = 'inline'
+        self._dispatch = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._calls = 0
+        self._rejected = 0
+        self._pending_max = 0
+
+    def configure(self, async_mode, offload=DB_OFFLOAD):
+        """Pick the dispatch for the SocketIO async mode ('threading', 'eventlet', 'gevent', ...)."""
+        if not offload or async_mode not in ('eventlet', 'gevent', 'gevent_uwsgi'):
+            self.mode, self._dispatch, self._slots = 'inline', None, None
+            return
+        if async_mode == 'eventlet':
+            from eventlet import tpool
+            from eventlet.semaphore import Semaphore
+            tpool.set_num_threads(self.workers)
+            self._dispatch = tpool.execute
+        else:
+            import gevent
+            from gevent.lock import Semaphore
+            threadpool = gevent.get_hub().threadpool
+            threadpool.maxsize = self.workers
+            self._dispatch = lambda fn, *args: threadpool.apply(fn, args)
+        self._slots = Semaphore(self.max_pending)
+        self.mode = async_mode
+
+    def run(self, fn, *args):
+        """fn(*args) on a worker thread when offloading, inline otherwise."""
+        if self._dispatch is None:
+            return fn(*args)
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._rejected += 1
+            raise ExecutorBusy(f"Database executor saturated ({self.max_pending} calls pending)")
+        with self._lock:
+            self._pending += 1
+            self._calls += 1
+            self._pending_max = max(self._pending_max, self._pending)
+        try:
+            return self._dispatch(fn, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {'mode': self.mode, 'workers': self.workers, 'max_pending': self.max_pending,
+                    'pending': self._pending, 'pending_max': self._pending_max,
+                    'calls': self._calls, 'rejected': self._rejected}
+
+
+class OffloadedCursor:
+    """pyodbc cursor proxy running the blocking calls through the executor."""
+
+    def __init__(self, raw, executor):
+        object.__setattr__(self, '_raw', raw)
+        object.__setattr__(self, '_executor', executor)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._raw, name, value)  # e.g. fast_executemany
+
+    def execute(self, *args):
+        self._executor.run(self._raw.execute, *args)
+        return self
+
+    def executemany(self, *args):
+        self._executor.run(self._raw.executemany, *args)
+        return self
+
+    def fetchone(self):
+        return self._executor.run(self._raw.fetchone)
+
+    def fetchall(self):
+        return self._executor.run(self._raw.fetchall)
+
+    def fetchmany(self, *args):
+        return self._executor.run(self._raw.fetchmany, *args)
+
+    def nextset(self):
+        return self._executor.run(self._raw.nextset)
+
+    def __iter__(self):
+        # Row by row would be one hop per row; fetch in batches instead
+        while True:
+            rows = self.fetchmany(500)
+            if not rows:
+                return
+            yield from rows
+
+
+executor = DBExecutor()
+
+
+def offload_cursor(raw):
+    return OffloadedCursor(raw, executor) if executor.mode != 'inline' else raw
@@ -0,0 +1,327 @@
+"""
+Message queue between the workers of a multi-worker deployment.
+
+A plain `socketio.run` process only reaches the clients connected to itself. With
+SOCKETIO_MESSAGE_QUEUE set, every emit is published on a queue and re-emitted by every
+worker to its own clients, so a manager connected to worker B sees the activity an
+associate posted to worker A. Backends, by URL:
+
+    memory://                  in-process, for tests (several SocketIO servers in one process)
+    unix:///run/adherence.sock a fan-out broker on a Unix socket, one host:
+                               `python event_bus.py /run/adherence.sock`
+    redis://host:6379/0        python-socketio's RedisManager (pip install redis)
+    kafka://host:9092          KafkaManager (pip install kafka-python)
+    zmq+tcp://host:5555        ZmqManager (pip install pyzmq)
+    amqp://guest@host//        KombuManager (pip install kombu), any other URL
+
+The per-worker state of the app rides on the same queue: publish(kind, *args) runs the
+handlers registered with subscribe(kind, ...) on every other worker (presence board,
+active session cache, employee directory). Without a queue publish() is a no-op.
+"""
+import logging
+import os
+import pickle
+import queue
+import selectors
+import socket
+import struct
+import sys
+import threading
+from urllib.parse import urlparse
+
+import socketio
+
+MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE', '')
+CHANNEL = os.environ.get('SOCKETIO_CHANNEL', 'adherence')
+
+# Sync messages travel as emits to a room no client joins: the pubsub listener of
+# python-socketio drops any other method
+SYNC_EVENT = '_adherence_sync'
+SYNC_ROOM = '_adherence_sync'
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}    # kind -> [handler, ...]
+_manager = None   # the client manager of this worker, when there is a queue
+_stats_lock = threading.Lock()
+_stats = {'published': 0, 'received': 0, 'handler_errors': 0}
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def subscribe(kind, handler):
+    """Run handler(*args) whenever another worker publishes `kind`."""
+    _handlers.setdefault(kind, []).append(handler)
+
+
+def publish(kind, *args):
+    """Hand `kind` and its (picklable, JSON-compatible) args to the other workers."""
+    if _manager is None:
+        return
+    _manager.publish_sync(kind, args)
+    _count('published')
+
+
+def _dispatch(kind, args):
+    _count('received')
+    for handler in _handlers.get(kind, ()):
+        try:
+            handler(*args)
+        except Exception:
+            _count('handler_errors')
+            logger.exception("sync handler for %s failed", kind)
+
+
+def stats():
+    with _stats_lock:
+        values = dict(_stats)
+    values['backend'] = _manager.name if _manager is not None else 'none'
+    return values
+
+
+class SyncMixin:
+    """Carries publish() messages next to the Socket.IO ones."""
+
+    def publish_sync(self, kind, args):
+        self._publish({'method': 'emit', 'event': SYNC_EVENT, 'data': [kind, list(args)],
+                       'namespace': '/', 'room': SYNC_ROOM, 'skip_sid': None, 'callback': None,
+                       'binary': False, 'host_id': self.host_id})
+
+    def _handle_emit(self, message):
+        if message.get('event') == SYNC_EVENT:
+            kind, args = message['data']
+            _dispatch(kind, args)
+            return
+        super()._handle_emit(message)
+
+
+########################## Backends ##############################################
+
+class InProcessManager(socketio.PubSubManager):
+    """Queue shared by the servers of one process, per channel."""
+    name = 'memory'
+
+    _channels = {}  # channel -> [queue.Queue, ...], one per subscribed server
+    _channels_lock = threading.Lock()
+
+    def __init__(self, url='memory://', channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self._queue = queue.Queue()
+        if not write_only:
+            with self._channels_lock:
+                self._channels.setdefault(channel, []).append(self._queue)
+
+    def _publish(self, data):
+        with self._channels_lock:
+            queues = list(self._channels.get(self.channel, ()))
+        for subscriber in queues:
+            subscriber.put(data)
+
+    def _listen(self):
+        while True:
+            yield self._queue.get()
+
+
+_HEADER = struct.Struct('!I')
+PUBLISHER, SUBSCRIBER = b'P', b'S'
+
+
+def _frame(payload):
+    return _HEADER.pack(len(payload)) + payload
+
+
+def _read_exactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise EOFError("broker closed the connection")
+        data += chunk
+    return bytes(data)
+
+
+class UnixSocketManager(socketio.PubSubManager):
+    """
+    Client of the fan-out broker (run_broker) listening on a Unix socket. Each frame
+    is a pickled (channel, message); the broker sends it to every subscriber.
+    """
+    name = 'unix'
+
+    def __init__(self, url, channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.path = urlparse(url).path
+        self._send_lock = threading.Lock()
+        self._sock = None
+
+    def _connect(self, role):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+            sock.sendall(role)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _publish(self, data):
+        frame = _frame(pickle.dumps((self.channel, data)))
+        with self._send_lock:
+            # One reconnect per message; a broker that is down loses the message, like Redis
+            for _ in range(2):
+                try:
+                    if self._sock is None:
+                        self._sock = self._connect(PUBLISHER)
+                    self._sock.sendall(frame)
+                    return
+                except OSError:
+                    if self._sock is not None:
+                        self._sock.close()
+                        self._sock = None
+        logger.error("event bus at %s unreachable, message dropped", self.path)
+
+    def _listen(self):
+        delay = 1
+        while True:
+            try:
+                sock = self._connect(SUBSCRIBER)
+            except OSError:
+                logger.error("event bus at %s unreachable, retrying in %s s", self.path, delay)
+                self.server.sleep(delay)
+                delay = min(delay * 2, 60)
+                continue
+            delay = 1
+            try:
+                while True:
+                    size, = _HEADER.unpack(_read_exactly(sock, _HEADER.size))
+                    channel, message = pickle.loads(_read_exactly(sock, size))
+                    if channel == self.channel:
+                        yield message
+            except (OSError, EOFError):
+                logger.error("lost the event bus at %s, reconnecting", self.path)
+            finally:
+                sock.close()
+
+
+def client_manager(url=MESSAGE_QUEUE, channel=CHANNEL):
+    """The SocketIO client manager for `url`, or None for a single worker."""
+    global _manager
+    if not url:
+        return None
+    scheme = url.split('://', 1)[0]
+    if scheme == 'memory':
+        base = InProcessManager
+    elif scheme == 'unix':
+        base = UnixSocketManager
+    elif scheme in ('redis', 'rediss'):
+        base = socketio.RedisManager
+    elif scheme == 'kafka':
+        base = socketio.KafkaManager
+    elif scheme.startswith('zmq'):
+        base = socketio.ZmqManager
+    else:
+        base = socketio.KombuManager
+    manager_class = type(f"Sync{base.__name__}", (SyncMixin, base), {})
+    _manager = manager_class(url, channel=channel)
+    return _manager
+
+
+########################## Broker ################################################
+
+# A subscriber further behind than this is disconnected (it reconnects and misses events)
+BROKER_MAX_BUFFER = 16 * 1024 * 1024
+
+
+class _Peer:
+    __slots__ = ('role', 'inbox', 'outbox')
+
+    def __init__(self):
+        self.role = None
+        self.inbox = bytearray()
+        self.outbox = bytearray()
+
+
+def run_broker(path):
+    """Fan every frame received on the Unix socket `path` out to all subscribers."""
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    os.chmod(path, 0o660)  # frames are pickles: only the app's user (and group) may connect
+    server.listen(128)
+    server.setblocking(False)
+    selector = selectors.DefaultSelector()
+    selector.register(server, selectors.EVENT_READ)
+    peers = {}
+
+    def drop(sock):
+        selector.unregister(sock)
+        peers.pop(sock)
+        sock.close()
+
+    def deliver(frame):
+        for sock, peer in list(peers.items()):
+            if peer.role != SUBSCRIBER:
+                continue
+            if len(peer.outbox) + len(frame) > BROKER_MAX_BUFFER:
+                logger.warning("event bus subscriber too slow, disconnected")
+                drop(sock)
+                continue
+            if not peer.outbox:
+                selector.modify(sock, selectors.EVENT_READ | selectors.EVENT_WRITE)
+            peer.outbox += frame
+
+    logger.warning("event bus listening on %s", path)
+    while True:
+        for key, mask in selector.select():
+            sock = key.fileobj
+            if sock is server:
+                conn, _ = server.accept()
+                conn.setblocking(False)
+                selector.register(conn, selectors.EVENT_READ)
+                peers[conn] = _Peer()
+                continue
+            peer = peers.get(sock)
+            if peer is None:
+                continue  # dropped earlier in this round
+            if mask & selectors.EVENT_READ:
+                try:
+                    data = sock.recv(65536)
+                except OSError:
+                    data = b''
+                if not data:
+                    drop(sock)
+                    continue
+                peer.inbox += data
+                if peer.role is None:
+                    peer.role, peer.inbox = bytes(peer.inbox[:1]), peer.inbox[1:]
+                while len(peer.inbox) >= _HEADER.size:
+                    size, = _HEADER.unpack_from(peer.inbox)
+                    if len(peer.inbox) < _HEADER.size + size:
+                        break
+                    frame = bytes(peer.inbox[:_HEADER.size + size])
+                    del peer.inbox[:_HEADER.size + size]
+                    deliver(frame)
+            if mask & selectors.EVENT_WRITE and sock in peers:
+                try:
+                    sent = sock.send(peer.outbox)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    drop(sock)
+                    continue
+                del peer.outbox[:sent]
+                if not peer.outbox:
+                    selector.modify(sock, selectors.EVENT_READ)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) != 2:
+        sys.exit("usage: python event_bus.py /path/to/bus.sock")
+    try:
+        run_broker(sys.argv[1])
+    except KeyboardInterrupt:
+        pass
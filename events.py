@@ -0,0 +1,56 @@
+import os
+import threading
+
+# Events emitted within this many seconds of each other go out as one frame per room
+BATCH_WINDOW = float(os.environ.get('SOCKETIO_BATCH_WINDOW', '0.25'))
+
+
+def process_room(process):
+    return f"process:{process}"
+
+
+def emp_room(emp_id):
+    return f"emp:{emp_id}"
+
+
+class EventBatcher:
+    """
+    Coalesces SocketIO emits into micro-batches. Events queued for a room during
+    one window are sent as a single '<event>_batch' frame carrying a list of payloads.
+    A window of 0 sends every event immediately.
+    """
+
+    def __init__(self, socketio, window=BATCH_WINDOW, namespace='/'):
+        self.socketio = socketio
+        self.window = window
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._pending = {}   # (event, room) -> [payload, ...]
+        self._scheduled = False
+
+    def emit(self, event, data, rooms):
+        if isinstance(rooms, str):
+            rooms = [rooms]
+        if self.window <= 0:
+            for room in rooms:
+                self.socketio.emit(event, data, to=room, namespace=self.namespace)
+            return
+
+        with self._lock:
+            for room in rooms:
+                self._pending.setdefault((event, room), []).append(data)
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self.socketio.start_background_task(self._flush_later)
+
+    def _flush_later(self):
+        self.socketio.sleep(self.window)
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._scheduled = False
+        for (event, room), payloads in pending.items():
+            self.socketio.emit(f"{event}_batch", payloads, to=room, namespace=self.namespace)
@@ -0,0 +1,200 @@
+"""
+Bulk exports of the raw activity and login rows, for BI pipelines.
+
+Rows are streamed straight from the cursor, EXPORT_BATCH_ROWS at a time, as CSV,
+NDJSON (one JSON object per line) or Parquet (EXPORT_ROW_GROUP_ROWS rows per row
+group, needs pyarrow). Memory stays bounded by one batch or row group however many
+rows the range holds. The query runs before the response starts, so errors still
+get a proper status; the connection is owned by the stream and returned to the pool
+when it ends.
+"""
+import csv
+import io
+import json
+import os
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from archive import activity_source
+from dashboard import team_log_filters
+from db import get_streaming_connection
+from instrumentation import query_name
+
+EXPORT_BATCH_ROWS = int(os.environ.get('EXPORT_BATCH_ROWS', '5000'))
+EXPORT_ROW_GROUP_ROWS = int(os.environ.get('EXPORT_ROW_GROUP_ROWS', '100000'))
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+# {source}: the live activity table or, for ranges reaching past the archive horizon,
+# activity_history (archive.py); {filters} from dashboard.team_log_filters
+EXPORT_QUERIES = {
+    'activity': """
+        SELECT a.id, a.emp_id, u.name, u.process, a.activity_type, a.activity_name,
+               a.start_time, a.stop_time, a.total_duration
+        FROM {source} a
+        JOIN cred u ON a.emp_id = u.emp_id
+        WHERE u.process = ? AND a.start_time >= ? AND a.start_time < ? {filters}
+        ORDER BY a.start_time, a.id
+    """,
+    'logins': """
+        SELECT l.emp_id, u.name, u.process, l.log_date, l.login_time, l.logout_time, l.duration
+        FROM logins l
+        JOIN cred u ON l.emp_id = u.emp_id
+        WHERE u.process = ? AND l.log_date >= ? AND l.log_date < ? {filters}
+        ORDER BY l.log_date, l.emp_id
+    """,
+}
+
+
+def parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def open_export(dataset, process, start_dt, end_dt, emp_id=None, activity_type=None, activity_name=None):
+    """
+    Run the export query of `dataset` ('activity' or 'logins') on a streaming connection;
+    logins only filter by employee. Returns (connection, cursor), the row generators close
+    the connection. Raises ValueError for an unknown activity type.
+    """
+    if dataset == 'logins':
+        filters = ("AND l.emp_id = ?", [emp_id]) if emp_id else ('', [])
+        bounds = [start_dt.date(), end_dt.date()]
+    else:
+        filters = team_log_filters(emp_id, activity_type, activity_name)
+        bounds = [start_dt, end_dt]
+    conn = get_streaming_connection()
+    try:
+        cursor = conn.cursor()
+        with query_name(f'export.{dataset}'):
+            sql = EXPORT_QUERIES[dataset].format(source=activity_source(start_dt), filters=filters[0])
+            cursor.execute(sql, process, *bounds, *filters[1])
+    except Exception:
+        conn.close()
+        raise
+    return conn, cursor
+
+
+def _batches(conn, cursor):
+    try:
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_ROWS)
+            if not rows:
+                return
+            yield rows
+    finally:
+        conn.close()
+
+
+def _columns(cursor):
+    return [column[0] for column in cursor.description]
+
+
+def iter_csv(conn, cursor):
+    columns = _columns(cursor)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode('utf-8')
+    for rows in _batches(conn, cursor):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _json_value(value):
+    # Dates and times as ISO 8601, decimals as exact strings
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return str(value)
+
+
+def iter_ndjson(conn, cursor):
+    columns = _columns(cursor)
+    encode = json.JSONEncoder(separators=(',', ':'), default=_json_value).encode
+    for rows in _batches(conn, cursor):
+        yield ''.join(encode(dict(zip(columns, row))) + '\n' for row in rows).encode('utf-8')
+
+
+def _arrow_type(pa, column):
+    # pyodbc description: (name, python type, display size, internal size, precision, scale, nullable)
+    python_type, precision, scale = column[1], column[4], column[5]
+    if python_type is bool:
+        return pa.bool_()
+    if python_type is int:
+        return pa.int64()
+    if python_type is float:
+        return pa.float64()
+    if python_type is Decimal:
+        return pa.decimal128(precision, scale)
+    if python_type is datetime:
+        return pa.timestamp('us')
+    if python_type is date:
+        return pa.date32()
+    if python_type is time:
+        return pa.time64('us')
+    if python_type in (bytes, bytearray):
+        return pa.binary()
+    return pa.string()
+
+
+class _Chunks(io.RawIOBase):
+    """Write-only sink collecting what the Parquet writer emits until it is drained."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data, self._chunks = b''.join(self._chunks), []
+        return data
+
+
+def iter_parquet(conn, cursor):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(column[0], _arrow_type(pa, column)) for column in cursor.description])
+    sink = _Chunks()
+    writer = pq.ParquetWriter(sink, schema)
+    pending = []
+
+    def row_group():
+        table = pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(zip(*pending), schema)], schema=schema)
+        writer.write_table(table)
+        pending.clear()
+        return sink.drain()
+
+    try:
+        for rows in _batches(conn, cursor):
+            pending.extend(tuple(row) for row in rows)
+            if len(pending) >= EXPORT_ROW_GROUP_ROWS:
+                yield row_group()
+        if pending:
+            yield row_group()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+WRITERS = {'csv': iter_csv, 'ndjson': iter_ndjson, 'parquet': iter_parquet}
@@ -0,0 +1,296 @@
+"""
+Request and SQL instrumentation, exposed in the Prometheus text format at GET /metrics,
+and the logging setup.
+
+  - Every Flask request is timed by method, route rule and status.
+  - Every statement run on a cursor of db.get_db_connection() is timed and its fetched
+    rows counted, by logical query name. The name defaults to the calling function
+    (`module.function`); a function running several statements names them with
+    `with query_name('report.break_totals'): ...`. Statements slower than SLOW_QUERY_MS
+    are logged as warnings.
+  - The stats() of the pool and caches are exported as gauges (register_stats()).
+
+Logging is leveled (LOG_LEVEL, WARNING by default so debug/info calls cost a level
+check only) and structured: LOG_FORMAT=json writes one JSON object per line, the
+default text format appends the `extra` fields as key=value pairs.
+"""
+import bisect
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, request
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1').lower() in ('1', 'true', 'yes')
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '500'))
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'WARNING').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+logger = logging.getLogger(__name__)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self._lock = threading.Lock()
+        self._values = {}  # label values -> count
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines += [f"{self.name}{_labels(self.labelnames, labels)} {value}" for labels, value in values]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._values = {}  # label values -> [per bucket counts (+Inf last), sum, count]
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = sorted((labels, (list(counts), total, count))
+                            for labels, (counts, total, count) in self._values.items())
+        for labels, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram('adherence_http_request_duration_seconds', 'Flask request latency',
+                            ('method', 'route', 'status'))
+QUERY_SECONDS = Histogram('adherence_db_query_duration_seconds', 'SQL statement latency', ('query',))
+QUERY_ROWS = Counter('adherence_db_query_rows_total', 'Rows fetched', ('query',))
+QUERY_ERRORS = Counter('adherence_db_query_errors_total', 'Failed SQL statements', ('query',))
+SLOW_QUERIES = Counter('adherence_db_slow_queries_total', f'SQL statements slower than {SLOW_QUERY_MS:g} ms',
+                       ('query',))
+METRICS = [REQUEST_SECONDS, QUERY_SECONDS, QUERY_ROWS, QUERY_ERRORS, SLOW_QUERIES]
+
+_stats = {}  # gauge prefix -> function returning a (nested) dict of numbers
+
+
+def register_stats(prefix, stats):
+    """Export the numeric values of `stats()` as gauges adherence_<prefix>_<key>."""
+    _stats[prefix] = stats
+
+
+def _flatten(prefix, values):
+    for key, value in values.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            yield from _flatten(name, value)
+        elif isinstance(value, (int, float)):
+            yield name, float(value)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    for prefix, stats in _stats.items():
+        try:
+            values = stats()
+        except Exception:
+            logger.exception("stats of %s failed", prefix)
+            continue
+        for name, value in _flatten(f"adherence_{prefix}", values):
+            lines += [f"# TYPE {name} gauge", f"{name} {value:g}"]
+    return '\n'.join(lines) + '\n'
+
+
+########################## Queries ###############################################
+
+_query_name = contextvars.ContextVar('query_name', default=None)
+
+
+@contextmanager
+def query_name(name):
+    """Label the statements run inside the block."""
+    token = _query_name.set(name)
+    try:
+        yield
+    finally:
+        _query_name.reset(token)
+
+
+def _caller(frame):
+    module = frame.f_globals.get('__name__', '?')
+    code = frame.f_code
+    function = getattr(code, 'co_qualname', code.co_name).replace('.<locals>', '')
+    return f"{'app' if module == '__main__' else module}.{function}"
+
+
+class InstrumentedCursor:
+    """pyodbc cursor proxy timing execute/executemany and counting fetched rows."""
+
+    def __init__(self, raw):
+        object.__setattr__(self, '_raw', raw)
+        object.__setattr__(self, '_name', None)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._raw, name, value)  # e.g. fast_executemany
+
+    def _run(self, method, args, frame):
+        name = _query_name.get() or _caller(frame)
+        object.__setattr__(self, '_name', name)
+        started = time.perf_counter()
+        try:
+            method(*args)
+        except Exception:
+            QUERY_ERRORS.inc((name,))
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            QUERY_SECONDS.observe((name,), elapsed)
+            if elapsed * 1000 >= SLOW_QUERY_MS:
+                SLOW_QUERIES.inc((name,))
+                logger.warning("slow query %s: %.1f ms", name, elapsed * 1000,
+                               extra={'query': name, 'duration_ms': round(elapsed * 1000, 1)})
+        return self
+
+    def execute(self, *args):
+        return self._run(self._raw.execute, args, sys._getframe(1))
+
+    def executemany(self, *args):
+        return self._run(self._raw.executemany, args, sys._getframe(1))
+
+    def _rows(self, count):
+        if count:
+            QUERY_ROWS.inc((self._name,), count)
+
+    def fetchone(self):
+        row = self._raw.fetchone()
+        self._rows(0 if row is None else 1)
+        return row
+
+    def fetchall(self):
+        rows = self._raw.fetchall()
+        self._rows(len(rows))
+        return rows
+
+    def fetchmany(self, *args):
+        rows = self._raw.fetchmany(*args)
+        self._rows(len(rows))
+        return rows
+
+    def __iter__(self):
+        for row in self._raw:
+            self._rows(1)
+            yield row
+
+
+def instrument_cursor(raw):
+    return InstrumentedCursor(raw) if METRICS_ENABLED else raw
+
+
+########################## Requests ##############################################
+
+def _start_timer():
+    g._request_started = time.perf_counter()
+
+
+def _observe_request(status):
+    started = g.pop('_request_started', None)
+    if started is None:
+        return
+    rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    REQUEST_SECONDS.observe((request.method, rule, str(status)), time.perf_counter() - started)
+
+
+def init_app(app):
+    if not METRICS_ENABLED:
+        return
+    app.before_request(_start_timer)
+
+    @app.after_request
+    def observe(response):
+        _observe_request(response.status_code)
+        return response
+
+    @app.teardown_request
+    def observe_failure(exc):
+        # Unhandled exceptions skip after_request
+        if exc is not None:
+            _observe_request(500)
+
+
+########################## Logging ###############################################
+
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def _extra(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {'time': self.formatTime(record), 'level': record.levelname, 'logger': record.name,
+                 'message': record.getMessage(), **_extra(record)}
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class KeyValueFormatter(logging.Formatter):
+    def format(self, record):
+        line = f"{self.formatTime(record)} {record.levelname} {record.name}: {record.getMessage()}"
+        fields = ' '.join(f"{key}={value}" for key, value in _extra(record).items())
+        if fields:
+            line += ' ' + fields
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if fmt == 'json' else KeyValueFormatter())
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
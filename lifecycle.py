@@ -0,0 +1,98 @@
+"""
+Login / logout lifecycle: one `logins` row per employee shift with the first login
+and the last logout.
+
+Each event is one connection, one transaction: the audit event (see audit.py) plus
+a single batch that finds the employee's current shift row under an update lock and
+inserts or updates it. The shift start is the logins row itself, so nothing is
+derived from the `logs` table any more.
+
+Shifts may cross midnight: a row keeps the log_date of the day the shift started,
+and a login continues it when
+
+  - the row is from today, or
+  - it is from yesterday, started less than SHIFT_MAX_HOURS ago and is still logged
+    in or was logged out less than SHIFT_GAP_HOURS ago.
+
+Otherwise the login starts a new row for today. A logout updates the latest row
+started within the last 24 hours; the duration is computed across midnight.
+"""
+import os
+from datetime import datetime
+
+from audit import audit_log
+from db import get_db_connection
+
+SHIFT_MAX_HOURS = float(os.environ.get('SHIFT_MAX_HOURS', '14'))
+SHIFT_GAP_HOURS = float(os.environ.get('SHIFT_GAP_HOURS', '4'))
+
+# Latest logins row of @emp_id from yesterday or today, locked until commit
+_CURRENT_SHIFT = """
+SET NOCOUNT ON;
+DECLARE @emp_id VARCHAR(20) = ?, @now DATETIME = ?;
+DECLARE @today DATE = CONVERT(DATE, @now);
+DECLARE @id INT, @log_date DATE, @started DATETIME, @stopped DATETIME;
+
+SELECT TOP 1
+    @id = id,
+    @log_date = log_date,
+    @started = CAST(log_date AS DATETIME) + CAST(login_time AS DATETIME),
+    @stopped = CAST(log_date AS DATETIME) + CAST(logout_time AS DATETIME)
+               + CASE WHEN logout_time < login_time THEN 1 ELSE 0 END
+FROM logins WITH (UPDLOCK, HOLDLOCK)
+WHERE emp_id = @emp_id AND log_date >= DATEADD(DAY, -1, @today) AND log_date <= @today
+ORDER BY log_date DESC, login_time DESC;
+"""
+
+LOGIN_BATCH = _CURRENT_SHIFT + """
+DECLARE @max_minutes INT = ?, @gap_minutes INT = ?;
+
+IF @id IS NULL OR NOT (
+       @log_date = @today
+       OR (DATEDIFF(MINUTE, @started, @now) < @max_minutes
+           AND (@stopped IS NULL OR DATEDIFF(MINUTE, @stopped, @now) < @gap_minutes)))
+BEGIN
+    INSERT INTO logins (emp_id, login_time, log_date) VALUES (@emp_id, CAST(@now AS TIME), @today);
+    SET @id = SCOPE_IDENTITY();
+END
+
+SELECT @id;
+"""
+
+LOGOUT_BATCH = _CURRENT_SHIFT + """
+IF @id IS NOT NULL AND @started <= @now AND DATEDIFF(SECOND, @started, @now) < 86400
+    UPDATE logins
+    SET logout_time = CAST(@now AS TIME),
+        duration = CAST(DATEADD(SECOND, DATEDIFF(SECOND, @started, @now), 0) AS TIME(0))
+    WHERE id = @id;
+ELSE
+    SET @id = NULL;
+
+SELECT @id;
+"""
+
+
+def _record(batch, params, emp_id, activity_type, description, now):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        audit_log.record(emp_id, activity_type, description, now, cursor=cursor)
+        cursor.execute(batch, params)
+        row = cursor.fetchone()
+        conn.commit()
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+
+def record_login(emp_id, now=None):
+    """Start or continue the employee's shift; returns its logins id."""
+    now = (now or datetime.now()).replace(microsecond=0)
+    params = [emp_id, now, int(SHIFT_MAX_HOURS * 60), int(SHIFT_GAP_HOURS * 60)]
+    return _record(LOGIN_BATCH, params, emp_id, 'login', 'User logged in', now)
+
+
+def record_logout(emp_id, now=None):
+    """Set the last logout and duration of the employee's shift; returns its logins id or None."""
+    now = (now or datetime.now()).replace(microsecond=0)
+    return _record(LOGOUT_BATCH, [emp_id, now], emp_id, 'logout', 'User logged out', now)
@@ -0,0 +1,116 @@
+"""
+Versioned schema migrations.
+
+Migrations are the numbered `migrations/NNNN_name.sql` files, applied in order, each
+in its own transaction. Statements are split into batches on lines containing only
+`GO`, like in SSMS. Applied versions are recorded in the schema_version table:
+
+    flask --app app db upgrade            # apply everything pending
+    flask --app app db upgrade --to 2     # stop after version 2
+    flask --app app db status
+"""
+import os
+import re
+import sys
+
+import click
+from flask.cli import with_appcontext
+
+from db import get_db_connection
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+_FILENAME = re.compile(r'^(\d+)_(\w+)\.sql$')
+_GO = re.compile(r'^\s*GO\s*;?\s*$', re.IGNORECASE | re.MULTILINE)
+
+_CREATE_VERSION_TABLE = """
+IF OBJECT_ID(N'dbo.schema_version', N'U') IS NULL
+CREATE TABLE schema_version (
+    version INT NOT NULL CONSTRAINT PK_schema_version PRIMARY KEY,
+    name NVARCHAR(200) NOT NULL,
+    applied_at DATETIME NOT NULL DEFAULT GETDATE()
+)
+"""
+
+
+def available(directory=MIGRATIONS_DIR):
+    """[(version, name, path), ...] of the migration files, by version."""
+    migrations = []
+    for filename in os.listdir(directory):
+        match = _FILENAME.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    migrations.sort()
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+def applied(cursor):
+    cursor.execute(_CREATE_VERSION_TABLE)
+    cursor.execute("SELECT version FROM schema_version")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def batches(sql):
+    return [batch.strip() for batch in _GO.split(sql) if batch.strip()]
+
+
+def upgrade(conn, target=None, directory=MIGRATIONS_DIR, echo=print):
+    """Apply the pending migrations up to `target` (all if None); returns the versions applied."""
+    cursor = conn.cursor()
+    done = applied(cursor)
+    conn.commit()
+
+    applied_now = []
+    for version, name, path in available(directory):
+        if version in done or (target is not None and version > target):
+            continue
+        with open(path, encoding='utf-8') as f:
+            sql = f.read()
+        try:
+            for batch in batches(sql):
+                cursor.execute(batch)
+            cursor.execute("INSERT INTO schema_version (version, name) VALUES (?, ?)", version, name)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            echo(f"{version:04d} {name}: failed")
+            raise
+        echo(f"{version:04d} {name}: applied")
+        applied_now.append(version)
+    return applied_now
+
+
+@click.group('db')
+def db_cli():
+    """Database schema migrations."""
+
+
+@db_cli.command('upgrade')
+@click.option('--to', 'target', type=int, default=None, help="Stop after this version")
+@with_appcontext
+def upgrade_command(target):
+    """Apply pending migrations."""
+    conn = get_db_connection()
+    try:
+        versions = upgrade(conn, target, echo=click.echo)
+    except Exception as e:
+        click.echo(f"Migration failed: {e}", err=True)
+        sys.exit(1)
+    finally:
+        conn.close()
+    click.echo(f"{len(versions)} migrations applied")
+
+
+@db_cli.command('status')
+@with_appcontext
+def status_command():
+    """List migrations and whether they are applied."""
+    conn = get_db_connection()
+    done = applied(conn.cursor())
+    conn.commit()
+    conn.close()
+    for version, name, _ in available():
+        click.echo(f"{version:04d} {name}: {'applied' if version in done else 'pending'}")
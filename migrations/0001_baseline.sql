@@ -0,0 +1,76 @@
+-- Tables as originally created from AdherenceTableQuery.txt. Every table is created only
+-- if it is missing, so databases set up by hand before migrations existed can be
+-- upgraded from here.
+
+IF OBJECT_ID(N'dbo.cred', N'U') IS NULL
+CREATE TABLE cred (
+    emp_id VARCHAR(20),
+    name NVARCHAR(100) NOT NULL,
+    password NVARCHAR(255) NOT NULL,
+    role NVARCHAR(50) NOT NULL,
+    email NVARCHAR(100) NOT NULL,
+    process NVARCHAR(100) NOT NULL
+);
+
+IF OBJECT_ID(N'dbo.Current_Activity', N'U') IS NULL
+CREATE TABLE Current_Activity (
+    emp_id VARCHAR(20) NOT NULL,
+    activity_type NVARCHAR(50) NOT NULL,
+    activity_name NVARCHAR(100) NOT NULL,
+    start_time DATETIME NOT NULL
+);
+
+IF OBJECT_ID(N'dbo.logs', N'U') IS NULL
+CREATE TABLE logs (
+    id INT IDENTITY(1,1),
+    emp_id VARCHAR(20) NOT NULL,
+    activity_type NVARCHAR(50) NOT NULL,
+    description NVARCHAR(MAX),
+    timestamp DATETIME NULL
+);
+
+IF OBJECT_ID(N'dbo.task', N'U') IS NULL
+CREATE TABLE task (
+    id INT IDENTITY(1,1),
+    emp_id VARCHAR(20) NOT NULL,
+    activity_name NVARCHAR(100) NOT NULL,
+    start_time DATETIME NOT NULL,
+    stop_time DATETIME NULL,
+    total_duration TIME(0) NULL
+);
+
+IF OBJECT_ID(N'dbo.breaks', N'U') IS NULL
+CREATE TABLE breaks (
+    id INT IDENTITY(1,1),
+    emp_id VARCHAR(20) NOT NULL,
+    activity_name NVARCHAR(100) NOT NULL,
+    start_time DATETIME NOT NULL,
+    stop_time DATETIME NULL,
+    total_duration TIME(0) NULL
+);
+
+IF OBJECT_ID(N'dbo.session_time', N'U') IS NULL
+CREATE TABLE session_time (
+    id INT IDENTITY(1,1),
+    emp_id VARCHAR(20) NOT NULL,
+    activity_name NVARCHAR(100) NOT NULL,
+    start_time DATETIME NOT NULL,
+    stop_time DATETIME NULL,
+    total_duration TIME(0) NULL
+);
+
+IF OBJECT_ID(N'dbo.Process_Tasks', N'U') IS NULL
+CREATE TABLE Process_Tasks (
+    ProcessName NVARCHAR(100) NOT NULL,
+    TaskName NVARCHAR(100) NOT NULL
+);
+
+IF OBJECT_ID(N'dbo.logins', N'U') IS NULL
+CREATE TABLE logins (
+    id INT IDENTITY(1,1),
+    emp_id VARCHAR(20),
+    login_time TIME NOT NULL,
+    logout_time TIME NULL,
+    log_date DATE NULL,
+    duration TIME(0) NULL
+);
@@ -0,0 +1,13 @@
+-- Per employee / day / activity totals, maintained by /stop and stop_all_open_activities
+-- (backfill with: flask --app app rollup rebuild --start YYYY-MM-DD --end YYYY-MM-DD)
+
+IF OBJECT_ID(N'dbo.activity_daily_rollup', N'U') IS NULL
+CREATE TABLE activity_daily_rollup (
+    emp_id VARCHAR(20) NOT NULL,
+    log_date DATE NOT NULL,
+    activity_type NVARCHAR(20) NOT NULL,
+    activity_name NVARCHAR(100) NOT NULL,
+    total_seconds INT NOT NULL,
+    activity_count INT NOT NULL,
+    CONSTRAINT PK_activity_daily_rollup PRIMARY KEY (log_date, emp_id, activity_type, activity_name)
+);
@@ -0,0 +1,40 @@
+-- Primary keys and the indexes behind the hot queries.
+-- Fails on existing duplicates (same emp_id + process in cred, same task twice in
+-- Process_Tasks) or NULL emp_id / log_date rows; clean those up first.
+
+-- Key columns must be NOT NULL
+ALTER TABLE cred ALTER COLUMN emp_id VARCHAR(20) NOT NULL;
+ALTER TABLE logins ALTER COLUMN emp_id VARCHAR(20) NOT NULL;
+ALTER TABLE logins ALTER COLUMN log_date DATE NOT NULL;
+GO
+
+-- One row per employee and process; login looks up by emp_id
+ALTER TABLE cred ADD CONSTRAINT PK_cred PRIMARY KEY CLUSTERED (emp_id, process);
+-- Team pages and reports: employees of a process
+CREATE INDEX IX_cred_process_emp ON cred (process, emp_id) INCLUDE (name, role);
+
+ALTER TABLE Process_Tasks ADD CONSTRAINT PK_Process_Tasks PRIMARY KEY CLUSTERED (ProcessName, TaskName);
+
+-- Append-only tables are clustered on their identity
+ALTER TABLE logs ADD CONSTRAINT PK_logs PRIMARY KEY CLUSTERED (id);
+-- First login / last logout of a day
+CREATE INDEX IX_logs_emp_type_time ON logs (emp_id, activity_type, timestamp);
+
+ALTER TABLE logins ADD CONSTRAINT PK_logins PRIMARY KEY CLUSTERED (id);
+-- Today's login row of an employee; report ranges per employee
+CREATE INDEX IX_logins_emp_date ON logins (emp_id, log_date) INCLUDE (login_time, logout_time, duration);
+
+ALTER TABLE task ADD CONSTRAINT PK_task PRIMARY KEY CLUSTERED (id);
+ALTER TABLE breaks ADD CONSTRAINT PK_breaks PRIMARY KEY CLUSTERED (id);
+ALTER TABLE session_time ADD CONSTRAINT PK_session_time PRIMARY KEY CLUSTERED (id);
+
+-- Per employee time ranges: team log, /stop (emp_id, activity_name, start_time), reports
+CREATE INDEX IX_task_emp_start ON task (emp_id, start_time) INCLUDE (activity_name, stop_time, total_duration);
+CREATE INDEX IX_breaks_emp_start ON breaks (emp_id, start_time) INCLUDE (activity_name, stop_time, total_duration);
+CREATE INDEX IX_session_time_emp_start ON session_time (emp_id, start_time) INCLUDE (activity_name, stop_time, total_duration);
+
+-- Open activities only (a handful of rows): active session lookup, stop all, live board rebuild
+CREATE INDEX IX_task_open ON task (emp_id, stop_time) INCLUDE (activity_name, start_time) WHERE stop_time IS NULL;
+CREATE INDEX IX_breaks_open ON breaks (emp_id, stop_time) INCLUDE (activity_name, start_time) WHERE stop_time IS NULL;
+CREATE INDEX IX_session_time_open ON session_time (emp_id, stop_time) INCLUDE (activity_name, start_time) WHERE stop_time IS NULL;
+
@@ -0,0 +1,63 @@
+-- One activity store instead of the task / breaks / session_time tables, which had
+-- identical columns. Existing rows are copied (with new ids) and the old names become
+-- views, so ad-hoc queries and scripts that read or write them keep working.
+
+CREATE TABLE activity (
+    id BIGINT IDENTITY(1,1) NOT NULL CONSTRAINT PK_activity PRIMARY KEY CLUSTERED,
+    emp_id VARCHAR(20) NOT NULL,
+    activity_type VARCHAR(10) NOT NULL
+        CONSTRAINT CK_activity_type CHECK (activity_type IN ('task', 'break', 'session')),
+    activity_name NVARCHAR(100) NOT NULL,
+    start_time DATETIME NOT NULL,
+    stop_time DATETIME NULL,
+    total_duration TIME(0) NULL
+);
+GO
+
+INSERT INTO activity (emp_id, activity_type, activity_name, start_time, stop_time, total_duration)
+SELECT emp_id, activity_type, activity_name, start_time, stop_time, total_duration
+FROM (
+    SELECT emp_id, 'task' AS activity_type, activity_name, start_time, stop_time, total_duration, id FROM task
+    UNION ALL
+    SELECT emp_id, 'break', activity_name, start_time, stop_time, total_duration, id FROM breaks
+    UNION ALL
+    SELECT emp_id, 'session', activity_name, start_time, stop_time, total_duration, id FROM session_time
+) AS old
+ORDER BY start_time, id;
+
+-- Per employee time ranges: team log, /stop, active session, reports
+CREATE INDEX IX_activity_emp_start ON activity (emp_id, start_time)
+    INCLUDE (activity_type, activity_name, stop_time, total_duration);
+
+-- Open activities only: current activity of an employee, open activities of a process
+-- (through cred (process, emp_id)), stop all, live board rebuild
+CREATE INDEX IX_activity_open ON activity (emp_id, start_time)
+    INCLUDE (activity_type, activity_name) WHERE stop_time IS NULL;
+
+DROP TABLE task;
+DROP TABLE breaks;
+DROP TABLE session_time;
+GO
+
+CREATE VIEW task AS
+SELECT id, emp_id, activity_name, start_time, stop_time, total_duration FROM activity WHERE activity_type = 'task';
+GO
+CREATE VIEW breaks AS
+SELECT id, emp_id, activity_name, start_time, stop_time, total_duration FROM activity WHERE activity_type = 'break';
+GO
+CREATE VIEW session_time AS
+SELECT id, emp_id, activity_name, start_time, stop_time, total_duration FROM activity WHERE activity_type = 'session';
+GO
+
+-- UPDATE and DELETE work on the views directly; INSERTs need the activity type filled in
+CREATE TRIGGER task_insert ON task INSTEAD OF INSERT AS
+INSERT INTO activity (emp_id, activity_type, activity_name, start_time, stop_time, total_duration)
+SELECT emp_id, 'task', activity_name, start_time, stop_time, total_duration FROM inserted;
+GO
+CREATE TRIGGER breaks_insert ON breaks INSTEAD OF INSERT AS
+INSERT INTO activity (emp_id, activity_type, activity_name, start_time, stop_time, total_duration)
+SELECT emp_id, 'break', activity_name, start_time, stop_time, total_duration FROM inserted;
+GO
+CREATE TRIGGER session_time_insert ON session_time INSTEAD OF INSERT AS
+INSERT INTO activity (emp_id, activity_type, activity_name, start_time, stop_time, total_duration)
+SELECT emp_id, 'session', activity_name, start_time, stop_time, total_duration FROM inserted;
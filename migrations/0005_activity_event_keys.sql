@@ -0,0 +1,11 @@
+-- Idempotency keys of the events applied through /api/activities/batch. A replayed
+-- key returns the stored outcome instead of applying the event again.
+
+CREATE TABLE activity_event_keys (
+    emp_id VARCHAR(20) NOT NULL,
+    idempotency_key VARCHAR(64) NOT NULL,
+    activity_id BIGINT NULL,
+    outcome VARCHAR(20) NOT NULL,
+    created_at DATETIME NOT NULL CONSTRAINT DF_activity_event_keys_created DEFAULT GETDATE(),
+    CONSTRAINT PK_activity_event_keys PRIMARY KEY CLUSTERED (emp_id, idempotency_key)
+);
@@ -0,0 +1,5 @@
+-- Team log pages walk the activity table newest first from a (start_time, id) keyset
+-- cursor and stop after one page, instead of sorting every row of the date range.
+
+CREATE INDEX IX_activity_start_id ON activity (start_time DESC, id DESC)
+    INCLUDE (emp_id, activity_type, activity_name, stop_time, total_duration);
@@ -0,0 +1,27 @@
+-- Retention (archive.py): closed activity rows and logs rows past the horizon move into
+-- monthly archive tables. archive_months tracks them; activity_history and logs_history
+-- read the live table plus every archive table and are re-created by the archiver
+-- whenever it adds a month. Until then they cover the live tables only.
+
+CREATE TABLE archive_months (
+    source VARCHAR(20) NOT NULL,
+    month DATE NOT NULL,
+    table_name SYSNAME NOT NULL,
+    rows_archived BIGINT NOT NULL CONSTRAINT DF_archive_months_rows DEFAULT 0,
+    updated_at DATETIME NOT NULL CONSTRAINT DF_archive_months_updated DEFAULT GETDATE(),
+    CONSTRAINT PK_archive_months PRIMARY KEY CLUSTERED (source, month)
+);
+GO
+
+-- The archiver finds and deletes logs rows by time range; without this every batch
+-- scans the whole table (activity has IX_activity_start_id for the same)
+CREATE INDEX IX_logs_time ON logs (timestamp);
+GO
+
+CREATE VIEW activity_history AS
+SELECT id, emp_id, activity_type, activity_name, start_time, stop_time, total_duration FROM activity;
+GO
+
+CREATE VIEW logs_history AS
+SELECT id, emp_id, activity_type, description, timestamp FROM logs;
+GO
@@ -0,0 +1,184 @@
+"""
+Intraday occupancy heatmap: how many associates of a process were on a task, a break,
+a session or logged in during each bucket (OCCUPANCY_BUCKET_MINUTES by default) of a
+date range, and the occupancy / utilization % of the logged-in time per bucket.
+
+Intervals are seconds from the start of the range. The computation is vectorized end to
+end, nothing loops over intervals or buckets in Python:
+
+  - overlapping intervals of one associate are merged first (sort + running max), so
+    the counts are associates, not rows;
+  - associate-seconds per bucket come from the integral of the coverage at every bucket
+    boundary, sum(max(boundary - start, 0)) - sum(max(boundary - stop, 0)), which is
+    a searchsorted over the sorted starts / stops and their prefix sums;
+  - the peak per bucket is the sweep line: +1/-1 events in time order, cumsum, and the
+    max of the levels settled inside each bucket with one reduceat.
+
+Occupancy is task + session time and utilization task time, as in the Excel report.
+"""
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from archive import activity_source
+from instrumentation import query_name
+from lifecycle import SHIFT_MAX_HOURS
+
+OCCUPANCY_BUCKET_MINUTES = int(os.environ.get('OCCUPANCY_BUCKET_MINUTES', '15'))
+OCCUPANCY_MAX_DAYS = int(os.environ.get('OCCUPANCY_MAX_DAYS', '62'))
+
+SERIES = ('task', 'break', 'session', 'logged_in')
+
+# Activities and shifts that started the day before the range may still reach into it
+_LOOKBACK = timedelta(days=1)
+
+# Open activities run until ? (now)
+ACTIVITY_INTERVALS_QUERY = """
+    SELECT a.emp_id, a.activity_type,
+           DATEDIFF(SECOND, ?, a.start_time), DATEDIFF(SECOND, ?, ISNULL(a.stop_time, ?))
+    FROM {source} a
+    JOIN cred u ON a.emp_id = u.emp_id
+    WHERE u.process = ? AND a.start_time >= ? AND a.start_time < ?
+"""
+
+# A shift may end after midnight; one without a logout counts for at most SHIFT_MAX_HOURS
+LOGIN_INTERVALS_QUERY = """
+    SELECT emp_id, DATEDIFF(SECOND, ?, started),
+           DATEDIFF(SECOND, ?, CASE WHEN logout_time IS NULL THEN DATEADD(MINUTE, ?, started)
+                                    ELSE DATEADD(DAY, CASE WHEN logout_time < login_time THEN 1 ELSE 0 END,
+                                                 CAST(log_date AS DATETIME) + CAST(logout_time AS DATETIME))
+                               END)
+    FROM (
+        SELECT l.emp_id, l.log_date, l.login_time, l.logout_time,
+               CAST(l.log_date AS DATETIME) + CAST(l.login_time AS DATETIME) AS started
+        FROM logins l
+        JOIN cred u ON l.emp_id = u.emp_id
+        WHERE u.process = ? AND l.log_date >= ? AND l.log_date < ?
+    ) shifts
+"""
+
+
+def valid_bucket_minutes(minutes):
+    """Buckets must tile a day, so every day of the heatmap has the same columns."""
+    return 1 <= minutes <= 1440 and 1440 % minutes == 0
+
+
+def merge_intervals(keys, starts, stops, span):
+    """
+    Union of the overlapping [start, stop) intervals of each key (values within
+    [0, span]). Returns the merged starts and stops.
+    """
+    if not len(starts):
+        return starts, stops
+    order = np.lexsort((starts, keys))
+    keys, starts, stops = keys[order], starts[order], stops[order]
+    new_key = np.r_[True, keys[1:] != keys[:-1]]
+    # Running max of the stops within each key: shifting every key past the previous ones
+    # lets one accumulate run over all of them
+    offset = (np.cumsum(new_key) - 1) * (span + 1)
+    reach = np.maximum.accumulate(stops + offset) - offset
+    begins = new_key.copy()
+    begins[1:] |= starts[1:] > reach[:-1]
+    first = np.flatnonzero(begins)
+    return starts[first], np.maximum.reduceat(stops, first)
+
+
+def coverage(starts, stops, buckets, width):
+    """
+    Covered seconds and peak concurrency of each of `buckets` buckets of `width`
+    seconds, for intervals already clipped to the range.
+    """
+    boundaries = np.arange(buckets + 1, dtype=np.int64) * width
+    starts, stops = np.sort(starts), np.sort(stops)
+
+    def integral(times):
+        # sum(max(boundary - t, 0)) over `times`, at every boundary
+        passed = np.searchsorted(times, boundaries, side='right')
+        prefix = np.concatenate(([0], np.cumsum(times)))
+        return passed * boundaries - prefix[passed]
+
+    seconds = np.diff(integral(starts) - integral(stops))
+
+    # Level at every bucket start, raised by the levels reached inside the bucket
+    peak = (np.searchsorted(starts, boundaries[:-1], side='right')
+            - np.searchsorted(stops, boundaries[:-1], side='right'))
+    times = np.concatenate((starts, stops))
+    deltas = np.concatenate((np.ones(len(starts), np.int64), -np.ones(len(stops), np.int64)))
+    order = np.argsort(times, kind='stable')
+    times, levels = times[order], np.cumsum(deltas[order])
+    # Only the level after the last event of a second is ever reached
+    settled = np.r_[times[1:] != times[:-1], True] & (times < boundaries[-1])
+    bucket, levels = times[settled] // width, levels[settled]
+    if len(bucket):
+        first = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        peak[bucket[first]] = np.maximum(peak[bucket[first]], np.maximum.reduceat(levels, first))
+    return seconds, peak
+
+
+def _percent(part, whole):
+    # Activity outside any logins row (clock skew, missed logout) would push past 100
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = np.minimum(np.round(part * 100.0 / whole, 1), 100.0)
+    return [None if whole_seconds == 0 else value for value, whole_seconds in zip(values.tolist(), whole.tolist())]
+
+
+def compute_occupancy(intervals, span, width):
+    """
+    intervals: {series: (emp_ids, starts, stops)}, seconds from the range start, for
+    the SERIES. Returns the per bucket average associates ('concurrency'), peak
+    associates and occupancy / utilization % of the logged-in time.
+    """
+    buckets = -(-span // width)
+    seconds, peaks = {}, {}
+    for series in SERIES:
+        emp_ids, starts, stops = intervals[series]
+        starts = np.clip(np.asarray(starts, dtype=np.int64), 0, span)
+        stops = np.clip(np.asarray(stops, dtype=np.int64), 0, span)
+        keep = stops > starts
+        codes, _ = pd.factorize(np.asarray(emp_ids, dtype=object)[keep])
+        merged = merge_intervals(codes, starts[keep], stops[keep], span)
+        seconds[series], peaks[series] = coverage(*merged, buckets, width)
+    # The last bucket may be cut short by the end of the range
+    bucket_seconds = np.minimum(np.arange(1, buckets + 1) * width, span) - np.arange(buckets) * width
+    return {
+        'concurrency': {series: np.round(seconds[series] / bucket_seconds, 2).tolist() for series in SERIES},
+        'peak': {series: peaks[series].tolist() for series in SERIES},
+        'occupancy_pct': _percent(seconds['task'] + seconds['session'], seconds['logged_in']),
+        'utilization_pct': _percent(seconds['task'], seconds['logged_in']),
+    }
+
+
+def _columns(rows, count):
+    return [list(column) for column in zip(*rows)] if rows else [[] for _ in range(count)]
+
+
+def load_occupancy(cursor, process, start_dt, end_dt, bucket_minutes=OCCUPANCY_BUCKET_MINUTES, now=None):
+    """Heatmap of `process` for [start_dt, end_dt), ready for JSON."""
+    now = now or datetime.now()
+    lookback = start_dt - _LOOKBACK
+    with query_name('occupancy.activity'):
+        cursor.execute(ACTIVITY_INTERVALS_QUERY.format(source=activity_source(lookback)),
+                       start_dt, start_dt, now, process, lookback, end_dt)
+        emp_ids, types, starts, stops = _columns(cursor.fetchall(), 4)
+    with query_name('occupancy.logins'):
+        cursor.execute(LOGIN_INTERVALS_QUERY, start_dt, start_dt, int(SHIFT_MAX_HOURS * 60),
+                       process, lookback.date(), end_dt.date())
+        login_ids, login_starts, login_stops = _columns(cursor.fetchall(), 3)
+
+    span = int((end_dt - start_dt).total_seconds())
+    # Nothing is on after `now`, whatever an open row says
+    until = min(max(int((now - start_dt).total_seconds()), 0), span)
+    types = np.asarray(types, dtype=object)
+    emp_ids, starts = np.asarray(emp_ids, dtype=object), np.asarray(starts, dtype=np.int64)
+    stops = np.minimum(np.asarray(stops, dtype=np.int64), until)
+    intervals = {series: (emp_ids[types == series], starts[types == series], stops[types == series])
+                 for series in ('task', 'break', 'session')}
+    intervals['logged_in'] = (login_ids, login_starts, np.minimum(np.asarray(login_stops, dtype=np.int64), until))
+
+    width = bucket_minutes * 60
+    result = compute_occupancy(intervals, span, width)
+    result.update(start=start_dt.isoformat(), bucket_minutes=bucket_minutes,
+                  buckets_per_day=1440 // bucket_minutes)
+    return result
@@ -0,0 +1,202 @@
+import os
+import threading
+import time
+from datetime import datetime, date
+
+import event_bus
+from db import get_db_connection
+
+# Activity type as sent by the associate page -> label used on the manager board
+ACTIVITY_LABELS = {'task': 'Task', 'break': 'Break', 'session': 'Session'}
+
+
+def _new_epoch(previous=0):
+    # Seconds and pid: a token from another worker, or from before a restart, never matches
+    return max(int(time.time()) * 100000 + os.getpid() % 100000, previous + 1)
+
+
+class PresenceEntry:
+    """What one employee is doing right now."""
+    __slots__ = ('emp_id', 'name', 'activity_type', 'activity_name', 'start_time')
+
+    def __init__(self, emp_id, name, activity_type, activity_name, start_time):
+        self.emp_id = emp_id
+        self.name = name
+        self.activity_type = activity_type  # 'Task', 'Break' or 'Session'
+        self.activity_name = activity_name
+        self.start_time = start_time        # datetime
+
+
+class PresenceRegistry:
+    """
+    In-memory "who is doing what right now" board, one entry per employee,
+    indexed by process so a manager view only touches its own associates.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._by_process = {}     # process -> {emp_id: PresenceEntry}
+        self._emp_processes = {}  # emp_id -> processes the entry is indexed under
+        self.loaded = False
+
+        # Change tracking for delta polling. Every start/stop bumps `version`; per process we
+        # remember the version at which each employee last changed (removals included), so a
+        # poll only returns what changed since the client's token. `epoch` changes on rebuild.
+        self.epoch = _new_epoch()
+        self.version = 0
+        self._changed_at = {}     # process -> {emp_id: version}
+        self._process_version = {}
+
+    # With several workers every start/stop is replayed on the other workers' registries
+    # (event_bus.py); propagate=False is the replay
+
+    def start(self, emp_id, name, processes, activity_type, activity_name, start_time, propagate=True):
+        if isinstance(processes, str):
+            processes = [processes]
+        entry = PresenceEntry(emp_id, name, ACTIVITY_LABELS.get(activity_type, activity_type),
+                              activity_name, start_time)
+        with self._lock:
+            self._remove(emp_id)
+            self._emp_processes[emp_id] = tuple(processes)
+            for process in processes:
+                self._by_process.setdefault(process, {})[emp_id] = entry
+            self._touch(emp_id, processes)
+        if propagate:
+            event_bus.publish('presence.start', emp_id, name, list(processes), activity_type, activity_name,
+                              start_time.isoformat())
+
+    def stop(self, emp_id, propagate=True):
+        with self._lock:
+            processes = self._remove(emp_id)
+            self._touch(emp_id, processes)
+        if propagate:
+            event_bus.publish('presence.stop', emp_id)
+
+    def _remove(self, emp_id):
+        processes = self._emp_processes.pop(emp_id, ())
+        for process in processes:
+            members = self._by_process.get(process)
+            if members is not None:
+                members.pop(emp_id, None)
+                if not members:
+                    del self._by_process[process]
+        return processes
+
+    def _touch(self, emp_id, processes):
+        if not processes:
+            return
+        self.version += 1
+        for process in processes:
+            self._changed_at.setdefault(process, {})[emp_id] = self.version
+            self._process_version[process] = self.version
+
+    def token(self, process):
+        """Opaque version token for a process; changes whenever its live board changes."""
+        with self._lock:
+            return f"{self.epoch}.{self._process_version.get(process, 0)}"
+
+    def changes_since(self, process, since):
+        """
+        Return (token, entries, removed_emp_ids, full) for `process`.
+        A missing or foreign token (e.g. from before a restart) yields a full snapshot.
+        """
+        today = datetime.combine(date.today(), datetime.min.time())
+        with self._lock:
+            token = f"{self.epoch}.{self._process_version.get(process, 0)}"
+            members = self._by_process.get(process, {})
+            try:
+                epoch, version = (int(part) for part in since.split('.'))
+            except (AttributeError, ValueError):
+                epoch, version = None, 0
+            if epoch != self.epoch:
+                entries = [entry for entry in members.values() if entry.start_time >= today]
+                return token, entries, [], True
+
+            entries, removed = [], []
+            for emp_id, changed in self._changed_at.get(process, {}).items():
+                if changed > version:
+                    entry = members.get(emp_id)
+                    if entry is None or entry.start_time < today:
+                        removed.append(emp_id)
+                    else:
+                        entries.append(entry)
+            return token, entries, removed, False
+
+    def live(self, process):
+        """Entries of a process started today, oldest first."""
+        today = datetime.combine(date.today(), datetime.min.time())
+        with self._lock:
+            entries = list(self._by_process.get(process, {}).values())
+        entries = [entry for entry in entries if entry.start_time >= today]
+        entries.sort(key=lambda entry: entry.start_time)
+        return entries
+
+    def counts(self, process):
+        counts = {'task': 0, 'break': 0, 'session': 0}
+        for entry in self.live(process):
+            counts[entry.activity_type.lower()] += 1
+        return counts
+
+    def rebuild(self, rows):
+        """
+        Replace the registry with `rows` of (emp_id, name, process, activity_type, activity_name, start_time).
+        When an employee has several open rows the latest one wins.
+        """
+        latest = {}
+        processes = {}
+        for emp_id, name, process, activity_type, activity_name, start_time in rows:
+            processes.setdefault(emp_id, set()).add(process)
+            current = latest.get(emp_id)
+            if current is None or start_time > current.start_time:
+                latest[emp_id] = PresenceEntry(emp_id, name, activity_type, activity_name, start_time)
+
+        by_process = {}
+        for emp_id, entry in latest.items():
+            for process in processes[emp_id]:
+                by_process.setdefault(process, {})[emp_id] = entry
+
+        with self._lock:
+            self._by_process = by_process
+            self._emp_processes = {emp_id: tuple(procs) for emp_id, procs in processes.items()}
+            self._changed_at = {}
+            self._process_version = {}
+            self.epoch = _new_epoch(self.epoch)
+            self.loaded = True
+
+
+# Open activities started today, one row per (activity, process of the employee)
+OPEN_ACTIVITIES_QUERY = """
+    SELECT a.emp_id, u.name, u.process, a.activity_type, a.activity_name, a.start_time
+    FROM activity a JOIN cred u ON a.emp_id = u.emp_id
+    WHERE a.stop_time IS NULL AND a.start_time >= ?
+"""
+
+registry = PresenceRegistry()
+
+
+def _replay_start(emp_id, name, processes, activity_type, activity_name, start_time):
+    registry.start(emp_id, name, processes, activity_type, activity_name,
+                   datetime.fromisoformat(start_time), propagate=False)
+
+
+event_bus.subscribe('presence.start', _replay_start)
+event_bus.subscribe('presence.stop', lambda emp_id: registry.stop(emp_id, propagate=False))
+
+
+def load_registry():
+    # Hold the lock while querying so no /start or /stop lands between the read and the swap
+    with registry._lock:
+        today = datetime.combine(date.today(), datetime.min.time())
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(OPEN_ACTIVITIES_QUERY, today)
+        registry.rebuild((emp_id, name, process, ACTIVITY_LABELS[activity_type], activity_name, start_time)
+                         for emp_id, name, process, activity_type, activity_name, start_time in cursor.fetchall())
+        conn.close()
+
+
+def ensure_registry_loaded():
+    if not registry.loaded:
+        with registry._lock:
+            if not registry.loaded:
+                load_registry()
@@ -0,0 +1,159 @@
+"""
+Cache of the reference data that changes rarely: the employee directory (`cred`)
+and the process -> tasks catalog (`Process_Tasks`).
+
+Entries live for REFDATA_TTL seconds, each cache keeps at most REFDATA_MAX_ENTRIES
+(least recently used are evicted), and /register invalidates the employee it
+writes, in every worker (event_bus.py). Unknown employees are cached as None as
+well. With REFDATA_WARMUP=1 both caches are filled with two queries at startup (see
+warm_up()).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import event_bus
+from db import get_db_connection
+
+REFDATA_TTL = float(os.environ.get('REFDATA_TTL', '3600'))
+REFDATA_MAX_ENTRIES = int(os.environ.get('REFDATA_MAX_ENTRIES', '5000'))
+REFDATA_WARMUP = os.environ.get('REFDATA_WARMUP', '0').lower() in ('1', 'true', 'yes')
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire `ttl` seconds after they were loaded."""
+
+    def __init__(self, ttl=REFDATA_TTL, max_entries=REFDATA_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._generation = 0           # bumped by every invalidate()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, load):
+        """Cached value of `key`, calling `load()` on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = self._generation
+
+        value = load()
+        with self._lock:
+            # Not kept if invalidated while loading, the value may predate the change
+            if generation == self._generation:
+                self._put(key, value, now)
+        return value
+
+    def put_many(self, items):
+        now = time.monotonic()
+        with self._lock:
+            for key, value in items:
+                self._put(key, value, now)
+
+    def _put(self, key, value, now):
+        self._entries[key] = (value, now + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key=None):
+        """Drop `key`, or everything when no key is given."""
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions}
+
+
+employees = TTLCache()
+process_tasks = TTLCache()
+
+
+def _employee(rows):
+    # All cred rows of one employee, one per process
+    first = rows[0]
+    return {
+        'emp_id': first.emp_id,
+        'name': first.name,
+        'password': first.password,
+        'role': first.role,
+        'process': [row.process for row in rows],
+    }
+
+
+def get_employee(emp_id):
+    """emp_id, name, password, role and the list of processes of an employee, or None."""
+    def load():
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT emp_id, name, password, role, process FROM cred WHERE emp_id = ?", emp_id)
+        rows = cursor.fetchall()
+        conn.close()
+        return _employee(rows) if rows else None
+
+    user = employees.get(emp_id, load)
+    # Callers may modify the dict (e.g. store it in the session)
+    return dict(user, process=list(user['process'])) if user else None
+
+
+def get_process_tasks(process, conn=None):
+    """Task names of a process. Loads on `conn` when given."""
+    def load():
+        connection = conn or get_db_connection()
+        cursor = connection.cursor()
+        cursor.execute("SELECT TaskName FROM Process_Tasks WHERE ProcessName = ?", process)
+        tasks = tuple(row.TaskName for row in cursor.fetchall())
+        if conn is None:
+            connection.close()
+        return tasks
+
+    return list(process_tasks.get(process, load))
+
+
+def invalidate_employee(emp_id):
+    employees.invalidate(emp_id)
+    event_bus.publish('refdata.employee', emp_id)
+
+
+event_bus.subscribe('refdata.employee', employees.invalidate)
+
+
+def warm_up():
+    """Load the whole employee directory and task catalog (two queries)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT emp_id, name, password, role, process FROM cred ORDER BY emp_id")
+    by_emp = OrderedDict()
+    for row in cursor.fetchall():
+        by_emp.setdefault(row.emp_id, []).append(row)
+    employees.put_many((emp_id, _employee(rows)) for emp_id, rows in by_emp.items())
+
+    cursor.execute("SELECT ProcessName, TaskName FROM Process_Tasks")
+    by_process = OrderedDict()
+    for row in cursor.fetchall():
+        by_process.setdefault(row.ProcessName, []).append(row.TaskName)
+    process_tasks.put_many((process, tuple(tasks)) for process, tasks in by_process.items())
+
+    conn.close()
+    return len(by_emp), len(by_process)
+
+
+def stats():
+    return {'employees': employees.stats(), 'process_tasks': process_tasks.stats()}
@@ -0,0 +1,419 @@
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime, time, timedelta
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+
+import pandas as pd
+import xlsxwriter
+
+from instrumentation import query_name
+from refdata import get_process_tasks
+from report_engine import (LOGIN_COLS, SUMMARY_COLS, TOTAL_COLS, compute_team_report, duration_columns,
+                           report_columns, seconds_to_excel, team_report_rows)
+
+# Ranges longer than this many days are always written in streaming mode
+STREAM_REPORT_DAYS = int(os.environ.get('STREAM_REPORT_DAYS', '31'))
+# Days of data read and written per chunk in streaming mode
+STREAM_CHUNK_DAYS = int(os.environ.get('STREAM_CHUNK_DAYS', '7'))
+# Streaming workbooks stay in memory up to this size, then spill to a temp file
+SPOOL_MAX_BYTES = int(os.environ.get('REPORT_SPOOL_MAX_BYTES', str(8 * 1024 * 1024)))
+
+# `process` value selecting the all-processes report (one sheet per process + summary)
+ALL_PROCESSES = '__all__'
+# Worker processes computing the per-process sheets of that report (1 = in the web worker)
+REPORT_PROCESSES = int(os.environ.get('REPORT_PROCESSES', str(os.cpu_count() or 1)))
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def parse_report_range(start_date, end_date):
+    """'YYYY-MM-DD' strings -> half-open (start, end) datetimes, or (None, None) for all history."""
+    if start_date and end_date:
+        try:
+            start_dt = datetime.strptime(start_date, "%Y-%m-%d")
+            end_dt = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+            return start_dt, end_dt
+        except ValueError:
+            pass
+    return None, None
+
+
+def report_filename(process, start_date):
+    report_date = start_date or datetime.today().strftime('%Y-%m-%d')
+    name = 'All' if not process or process == ALL_PROCESSES else process
+    return f"Team_Report_{name}_{report_date}.xlsx"
+
+
+def get_task_names(conn, process):
+    # Cached task catalog (see refdata.py), loaded on `conn` on a miss
+    return get_process_tasks(process, conn)
+
+
+def get_login_range(conn, process, processes=()):
+    """
+    First and last log_date of a process (or, for ALL_PROCESSES, of `processes`), used
+    when no date range was given.
+    """
+    cursor = conn.cursor()
+    if process == ALL_PROCESSES:
+        cursor.execute(f"""
+            SELECT MIN(l.log_date), MAX(l.log_date)
+            FROM cred u
+            JOIN logins l ON u.emp_id = l.emp_id
+            WHERE u.process IN ({', '.join('?' * len(processes))})
+        """, *processes)
+    else:
+        cursor.execute("""
+            SELECT MIN(l.log_date), MAX(l.log_date)
+            FROM cred u
+            JOIN logins l ON u.emp_id = l.emp_id
+            WHERE u.process = ?
+        """, process)
+    first, last = cursor.fetchone()
+    return first, last
+
+
+def read_report_frames(conn, process, start_dt=None, end_dt=None):
+    """
+    Read the login rows and the per emp/day/activity duration totals (in seconds)
+    for `process`, optionally limited to [start_dt, end_dt). Totals come from the
+    pre-aggregated activity_daily_rollup table (see rollup.py).
+    """
+    login_date_filter = ""
+    rollup_date_filter = ""
+
+    params = [process]
+    date_params = []
+
+    if start_dt and end_dt:
+        login_date_filter = " AND l.log_date >= ? AND l.log_date < ?"
+        rollup_date_filter = " AND r.log_date >= ? AND r.log_date < ?"
+        date_params = [start_dt.date(), end_dt.date()]
+        params += date_params
+
+    # Login Data
+    login_query = f"""
+        SELECT u.name, u.emp_id, u.process, l.login_time, l.logout_time, l.duration, l.log_date
+        FROM cred u
+        JOIN logins l ON u.emp_id = l.emp_id
+        WHERE u.process = ? {login_date_filter}
+        ORDER BY l.log_date, u.name
+    """
+    with query_name('report.logins'):
+        login_df = pd.read_sql(login_query, conn, params=params)
+
+    # Task Data (tasks of the process's catalog)
+    task_query = f"""
+        SELECT r.emp_id, r.activity_name, r.log_date AS date, SUM(r.total_seconds) AS duration
+        FROM activity_daily_rollup r
+        JOIN Process_Tasks pt ON r.activity_name = pt.TaskName
+        WHERE r.activity_type = 'task' AND pt.ProcessName = ? {rollup_date_filter}
+        GROUP BY r.emp_id, r.activity_name, r.log_date
+    """
+    with query_name('report.task_totals'):
+        task_df = pd.read_sql(task_query, conn, params=[process] + date_params)
+
+    # Break and Session Data (employees of the process only)
+    activity_query = f"""
+        SELECT r.emp_id, r.activity_name, r.log_date AS date, r.total_seconds AS duration
+        FROM activity_daily_rollup r
+        WHERE r.activity_type = ? {rollup_date_filter}
+          AND r.emp_id IN (SELECT emp_id FROM cred WHERE process = ?)
+    """
+    with query_name('report.break_totals'):
+        break_df = pd.read_sql(activity_query, conn, params=['break'] + date_params + [process])
+    with query_name('report.session_totals'):
+        session_df = pd.read_sql(activity_query, conn, params=['session'] + date_params + [process])
+
+    return login_df, task_df, break_df, session_df
+
+
+def read_org_report_frames(conn, start_dt, end_dt, processes):
+    """
+    The inputs of the reports of `processes` for [start_dt, end_dt) in four queries,
+    however many processes there are: login rows and task totals carry their process,
+    break and session totals (activity_type) are read once for all their employees.
+
+    Returns (task catalog {process: [task, ...]}, {process: (login_df, task_df, break_df, session_df)}).
+    """
+    processes = list(processes)
+    in_processes = ', '.join('?' * len(processes))
+    date_params = [start_dt.date(), end_dt.date()]
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT ProcessName, TaskName FROM Process_Tasks WHERE ProcessName IN ({in_processes})",
+                   *processes)
+    catalog = {}
+    for process, task in cursor.fetchall():
+        catalog.setdefault(process, []).append(task)
+
+    with query_name('report.org_logins'):
+        login_df = pd.read_sql(f"""
+            SELECT u.name, u.emp_id, u.process, l.login_time, l.logout_time, l.duration, l.log_date
+            FROM cred u
+            JOIN logins l ON u.emp_id = l.emp_id
+            WHERE u.process IN ({in_processes}) AND l.log_date >= ? AND l.log_date < ?
+            ORDER BY l.log_date, u.name
+        """, conn, params=processes + date_params)
+    with query_name('report.org_task_totals'):
+        task_df = pd.read_sql(f"""
+            SELECT pt.ProcessName AS process, r.emp_id, r.activity_name, r.log_date AS date,
+                   SUM(r.total_seconds) AS duration
+            FROM activity_daily_rollup r
+            JOIN Process_Tasks pt ON r.activity_name = pt.TaskName
+            WHERE pt.ProcessName IN ({in_processes}) AND r.activity_type = 'task'
+              AND r.log_date >= ? AND r.log_date < ?
+            GROUP BY pt.ProcessName, r.emp_id, r.activity_name, r.log_date
+        """, conn, params=processes + date_params)
+    with query_name('report.org_break_session_totals'):
+        activity_df = pd.read_sql(f"""
+            SELECT r.activity_type, r.emp_id, r.activity_name, r.log_date AS date, r.total_seconds AS duration
+            FROM activity_daily_rollup r
+            WHERE r.activity_type IN ('break', 'session') AND r.log_date >= ? AND r.log_date < ?
+              AND r.emp_id IN (SELECT emp_id FROM cred WHERE process IN ({in_processes}))
+        """, conn, params=date_params + processes)
+
+    # Breaks and sessions go to every process of the employee (employees may have several)
+    members = login_df[['emp_id', 'process']].drop_duplicates()
+    activity_df = activity_df.merge(members, on='emp_id')
+    tasks = dict(tuple(task_df.groupby('process', sort=False)))
+    activities = dict(tuple(activity_df.groupby('process', sort=False)))
+    no_tasks, no_activity = task_df.iloc[0:0], activity_df.iloc[0:0]
+
+    frames = {}
+    for process, logins in login_df.groupby('process', sort=False):
+        process_tasks = tasks.get(process, no_tasks).drop(columns='process')
+        process_activity = activities.get(process, no_activity)
+        breaks, sessions = (process_activity[process_activity['activity_type'] == kind]
+                            .drop(columns=['activity_type', 'process']) for kind in ('break', 'session'))
+        frames[process] = (logins.reset_index(drop=True), process_tasks, breaks, sessions)
+    return catalog, frames
+
+
+def _add_formats(workbook):
+    return {
+        'header': workbook.add_format({'bold': True, 'border': 1}),
+        'date': workbook.add_format({'num_format': 'yyyy-mm-dd'}),
+        'time': workbook.add_format({'num_format': 'hh:mm:ss'}),
+        'duration': workbook.add_format({'num_format': '[h]:mm:ss'}),
+    }
+
+
+def _set_column_formats(worksheet, columns, formats):
+    # Cells written without their own format pick up the column format
+    worksheet.set_column(0, 0, 12, formats['date'])
+    for name in ("login_time", "logout_time", "duration"):
+        col = columns.index(name)
+        worksheet.set_column(col, col, 11, formats['time'])
+    first = len(LOGIN_COLS)
+    worksheet.set_column(first, len(columns) - 1, 12, formats['duration'])
+
+
+def write_workbook(df_final, task_names):
+    """Buffered report: the whole workbook is built in memory."""
+    columns = report_columns(task_names)
+    frame = seconds_to_excel(df_final, duration_columns(task_names))
+
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        frame.to_excel(writer, index=False, sheet_name="Team Report")
+        _set_column_formats(writer.sheets["Team Report"], columns, _add_formats(writer.book))
+    output.seek(0)
+    return output
+
+
+def _date_windows(start_day, end_day, chunk_days):
+    # Half-open [window_start, window_end) day windows covering [start_day, end_day)
+    window_start = start_day
+    while window_start < end_day:
+        window_end = min(window_start + timedelta(days=chunk_days), end_day)
+        yield window_start, window_end
+        window_start = window_end
+
+
+def _write_rows(worksheet, row_index, rows):
+    """Append `rows` after `row_index`; returns the index of the last row written."""
+    for values in rows:
+        row_index += 1
+        for col, value in enumerate(values):
+            if value is None or value is pd.NaT:
+                continue
+            if isinstance(value, (datetime, date, time)):
+                worksheet.write_datetime(row_index, col, value)
+            else:
+                worksheet.write(row_index, col, value)
+    return row_index
+
+
+def stream_workbook(conn, process, start_dt, end_dt, chunk_days=STREAM_CHUNK_DAYS, output=None, progress=None):
+    """
+    Streaming report: reads `chunk_days` of data at a time and appends the rows with
+    XlsxWriter's constant-memory mode to a spooled temp file (or to `output`, a path
+    or file object), so peak memory depends on the chunk size, not on the width of
+    the date range. `progress(fraction)` is called after every chunk.
+
+    Returns (output, positioned at 0 if it is a file, number of data rows written).
+    """
+    task_names = get_task_names(conn, process)
+    columns = report_columns(task_names)
+    windows = list(_date_windows(start_dt, end_dt, chunk_days))
+
+    if output is None:
+        output = SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    worksheet = workbook.add_worksheet("Team Report")
+    formats = _add_formats(workbook)
+    _set_column_formats(worksheet, columns, formats)
+
+    worksheet.write_row(0, 0, columns, formats['header'])
+    row_index = 0
+    for done, (window_start, window_end) in enumerate(windows, start=1):
+        frames = read_report_frames(conn, process, window_start, window_end)
+        if not frames[0].empty:
+            chunk = seconds_to_excel(compute_team_report(*frames, task_names), duration_columns(task_names))
+            row_index = _write_rows(worksheet, row_index, chunk.itertuples(index=False, name=None))
+            del chunk
+        del frames
+        if progress:
+            progress(done / len(windows))
+
+    workbook.close()
+    if hasattr(output, 'seek'):
+        output.seek(0)
+    return output, row_index
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _report_pool():
+    """Worker processes shared by all-processes reports, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a worker with the DB pool, executor and hub threads is not safe
+            _pool = ProcessPoolExecutor(REPORT_PROCESSES, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _compute_sheets(frames, catalog):
+    """team_report_rows() of every process, in the worker processes when there are several."""
+    processes = list(frames)
+    task_names = [catalog.get(process, []) for process in processes]
+    args = ([frames[process][i] for process in processes] for i in range(4))
+    if REPORT_PROCESSES <= 1 or len(processes) <= 1:
+        return dict(zip(processes, map(team_report_rows, *args, task_names)))
+    global _pool
+    try:
+        return dict(zip(processes, _report_pool().map(team_report_rows, *args, task_names)))
+    except BrokenProcessPool:
+        with _pool_lock:
+            _pool = None  # a worker died (e.g. OOM killed); start a fresh pool next time
+        raise
+
+
+def _sheet_names(processes):
+    # Excel: at most 31 characters, none of []:*?/\, unique ignoring case, "Summary" taken
+    names, taken = {}, {'summary'}
+    for process in processes:
+        base = re.sub(r'[\[\]:*?/\\]', '_', str(process))[:31] or '_'
+        name, suffix = base, 1
+        while name.lower() in taken:
+            suffix += 1
+            name = f"{base[:31 - len(str(suffix)) - 1]}~{suffix}"
+        taken.add(name.lower())
+        names[process] = name
+    return names
+
+
+def list_report_processes(conn, start_dt, end_dt, processes):
+    """Those of `processes` with logins in [start_dt, end_dt)."""
+    processes = list(processes)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT DISTINCT u.process
+        FROM cred u
+        JOIN logins l ON u.emp_id = l.emp_id
+        WHERE u.process IN ({', '.join('?' * len(processes))}) AND l.log_date >= ? AND l.log_date < ?
+        ORDER BY u.process
+    """, *processes, start_dt.date(), end_dt.date())
+    return [row[0] for row in cursor.fetchall()]
+
+
+def stream_org_workbook(conn, start_dt, end_dt, processes, chunk_days=STREAM_CHUNK_DAYS, output=None,
+                        progress=None):
+    """
+    All-processes report of `processes` (those of the requesting manager, never the
+    whole organization): a "Summary" sheet (one row per process and a total) followed by
+    one sheet per process with the columns of its team report. Each `chunk_days` window
+    is read once for all processes (read_org_report_frames) and the per-process reports
+    are computed in parallel in REPORT_PROCESSES worker processes; the rows are appended
+    in constant-memory mode like stream_workbook().
+
+    Returns (output, positioned at 0 if it is a file, number of data rows written).
+    """
+    processes = list_report_processes(conn, start_dt, end_dt, processes) if processes else []
+    windows = list(_date_windows(start_dt, end_dt, chunk_days)) if processes else []
+
+    if output is None:
+        output = SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    formats = _add_formats(workbook)
+    summary_sheet = workbook.add_worksheet("Summary")
+    sheets, next_row, columns = {}, {}, {}
+    for process, name in _sheet_names(processes).items():
+        sheets[process] = workbook.add_worksheet(name)
+        next_row[process] = 0
+    associates = {process: set() for process in processes}
+    totals = {process: dict.fromkeys(TOTAL_COLS, 0) for process in processes}
+
+    for done, (window_start, window_end) in enumerate(windows, start=1):
+        catalog, frames = read_org_report_frames(conn, window_start, window_end, processes)
+        frames = {process: frame for process, frame in frames.items() if process in sheets}
+        for process, (rows, emp_ids, sums) in _compute_sheets(frames, catalog).items():
+            worksheet = sheets[process]
+            if process not in columns:
+                # Header from the catalog of the first window with data
+                columns[process] = report_columns(catalog.get(process, []))
+                _set_column_formats(worksheet, columns[process], formats)
+                worksheet.write_row(0, 0, columns[process], formats['header'])
+            next_row[process] = _write_rows(worksheet, next_row[process], rows)
+            associates[process].update(emp_ids)
+            for name, value in sums.items():
+                totals[process][name] += value
+        del frames
+        if progress:
+            progress(done / len(windows))
+
+    # Summary: durations as Excel time values like the process sheets
+    summary_sheet.set_column(0, 0, 24)
+    summary_sheet.set_column(3, len(SUMMARY_COLS) - 1, 14, formats['duration'])
+    summary_sheet.write_row(0, 0, SUMMARY_COLS, formats['header'])
+    summary_rows = [[process, len(associates[process]), next_row[process]]
+                    + [totals[process][name] / 86400.0 for name in TOTAL_COLS] for process in processes]
+    grand_total = ['Total', len(set().union(*associates.values())), sum(next_row.values())]
+    grand_total += [sum(row[3 + i] for row in summary_rows) for i in range(len(TOTAL_COLS))]
+    for row_index, values in enumerate(summary_rows + [grand_total], start=1):
+        summary_sheet.write_row(row_index, 0, values)
+
+    workbook.close()
+    if hasattr(output, 'seek'):
+        output.seek(0)
+    return output, sum(next_row.values())
+
+
+def iter_file(file, chunk_size=64 * 1024):
+    """Yield a file in chunks and close it afterwards (for streamed responses)."""
+    try:
+        while True:
+            data = file.read(chunk_size)
+            if not data:
+                break
+            yield data
+    finally:
+        file.close()
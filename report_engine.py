@@ -0,0 +1,131 @@
+"""
+Team report computation, independent of Flask and the database.
+
+Takes the login rows and the per emp/day/activity duration totals and returns one
+row per login with every activity column and the derived totals, all durations as
+seconds (int64). Formatting as time happens only when the workbook is written.
+"""
+import numpy as np
+import pandas as pd
+
+# Rename known session activities
+SESSION_RENAME_MAP = {
+    "Internal Meeting": "Internal Meeting",
+    "External Meeting": "External Meeting",
+    "Training Session": "Training",
+    "Waiting for work": "Waiting For Work",
+    "New Hire Training": "New Hire Training",
+    "On-Job-Training": "On-Job-Training",
+    "Downtime": "Downtime",
+    "Team Huddle": "Team Huddle"
+}
+BREAK_COLS = ["Break 1", "Lunch Break", "Break 2", "RR"]
+SESSION_COLS = list(SESSION_RENAME_MAP.values())
+TOTAL_COLS = ["Break Total Time", "Session & Downtime", "Occupancy", "Utilization"]
+SUMMARY_COLS = ["Process", "Associates", "Shifts"] + TOTAL_COLS
+LOGIN_COLS = ["date", "name", "emp_id", "login_time", "logout_time", "process", "duration"]
+
+
+def activity_columns(task_names):
+    return list(task_names) + BREAK_COLS + SESSION_COLS
+
+
+def duration_columns(task_names):
+    """Columns holding durations in seconds."""
+    return activity_columns(task_names) + TOTAL_COLS
+
+
+def report_columns(task_names):
+    return LOGIN_COLS + duration_columns(task_names)
+
+
+def _day_keys(emp_index, date_index, emp_ids, dates):
+    # (employee, day) -> one int64 key; -1 when either is not in the index
+    emp_codes = emp_index.get_indexer(emp_ids).astype(np.int64)
+    date_codes = date_index.get_indexer(dates).astype(np.int64)
+    keys = emp_codes * len(date_index) + date_codes
+    keys[(emp_codes < 0) | (date_codes < 0)] = -1
+    return keys
+
+
+def _column_positions(names, columns):
+    """
+    Report column of each activity name, -1 for names that are not reported.
+    Session activities are looked up under their raw and their renamed name.
+    """
+    position = {name: i for i, name in enumerate(columns)}
+    lookup = dict(position)
+    for raw, renamed in SESSION_RENAME_MAP.items():
+        lookup.setdefault(raw, position[renamed])
+    found = pd.Index(list(lookup)).get_indexer(names)
+    targets = np.fromiter(lookup.values(), dtype=np.int64, count=len(lookup))
+    return np.where(found >= 0, targets[found], -1)
+
+
+def compute_team_report(login_df, task_df, break_df, session_df, task_names):
+    """
+    Build the team report frame.
+
+    login_df: name, emp_id, process, login_time, logout_time, duration, log_date
+    task_df / break_df / session_df: emp_id, activity_name, date, duration (seconds)
+
+    Every activity total is summed into a (login emp/day x column) matrix with a single
+    bincount; activities whose name is not a report column or whose emp/day has no
+    login row are ignored.
+    """
+    task_names = list(dict.fromkeys(task_names))
+    columns = activity_columns(task_names)
+    # First occurrence wins if a task shares its name with a break or session column
+    unique_columns = list(dict.fromkeys(columns))
+    n_cols = len(unique_columns)
+
+    emp_index = pd.Index(login_df['emp_id'].unique())
+    date_index = pd.Index(login_df['log_date'].unique())
+    login_keys = _day_keys(emp_index, date_index, login_df['emp_id'], login_df['log_date'])
+    unique_keys, login_rows = np.unique(login_keys, return_inverse=True)
+
+    totals = np.zeros(len(unique_keys) * n_cols, dtype=np.float64)
+    activity = [df for df in (task_df, break_df, session_df) if not df.empty]
+    if activity and len(unique_keys):
+        activity = pd.concat(activity, ignore_index=True)
+        keys = _day_keys(emp_index, date_index, activity['emp_id'], activity['date'])
+        rows = np.searchsorted(unique_keys, keys).clip(max=len(unique_keys) - 1)
+        cols = _column_positions(activity['activity_name'], unique_columns)
+        seconds = pd.to_numeric(activity['duration'], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+
+        valid = (keys >= 0) & (unique_keys[rows] == keys) & (cols >= 0)
+        totals = np.bincount(rows[valid] * n_cols + cols[valid], weights=seconds[valid],
+                             minlength=len(unique_keys) * n_cols)
+    values = totals.astype(np.int64).reshape(len(unique_keys), n_cols)[login_rows.ravel()]
+
+    position = {name: i for i, name in enumerate(unique_columns)}
+    task_total = values[:, [position[name] for name in task_names]].sum(axis=1)
+    session_total = values[:, [position[name] for name in SESSION_COLS]].sum(axis=1)
+
+    df = login_df.rename(columns={'log_date': 'date'})[LOGIN_COLS].reset_index(drop=True)
+    activity_values = pd.DataFrame(values[:, [position[name] for name in columns]], columns=columns)
+    derived = pd.DataFrame({
+        'Break Total Time': values[:, [position[name] for name in BREAK_COLS]].sum(axis=1),
+        'Session & Downtime': session_total,
+        'Occupancy': session_total + task_total,
+        'Utilization': task_total,
+    })
+    return pd.concat([df, activity_values, derived], axis=1)
+
+
+def seconds_to_excel(frame, columns):
+    """Durations in seconds -> Excel time values (fractions of a day), vectorized."""
+    frame = frame.copy()
+    frame[columns] = frame[columns].to_numpy(dtype=np.float64) / 86400.0
+    return frame
+
+
+def team_report_rows(login_df, task_df, break_df, session_df, task_names):
+    """
+    One chunk of a process sheet, for the report worker processes: the rows ready for
+    the workbook, the employee ids and the TOTAL_COLS sums in seconds (summary sheet).
+    """
+    report = compute_team_report(login_df, task_df, break_df, session_df, task_names)
+    totals = {name: int(report[name].sum()) for name in TOTAL_COLS}
+    rows = list(seconds_to_excel(report, duration_columns(task_names)).itertuples(index=False, name=None))
+    return rows, report['emp_id'].unique().tolist(), totals
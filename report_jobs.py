@@ -0,0 +1,257 @@
+"""
+Background team report jobs with a file cache of finished workbooks.
+
+Workbooks are cached by (process, start_date, end_date); the all-processes report by
+the processes it covers instead, so managers of different processes never share one.
+Ranges entirely in the past never change and stay cached until evicted (LRU by total
+size); ranges that include today expire after a short TTL.
+
+The workbooks are built in REPORT_WORKERS spawned worker processes (build_report): the
+pandas and XlsxWriter work holds the CPU for seconds, which under eventlet/gevent would
+stall every request and websocket of the web worker. A (green) thread per running job
+only waits for its worker and copies the progress it publishes in shared memory.
+"""
+import hashlib
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime, timedelta
+
+from db import get_db_connection
+from report import ALL_PROCESSES, get_login_range, stream_org_workbook, stream_workbook
+
+REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', '2'))
+REPORT_CACHE_DIR = os.environ.get('REPORT_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'adherence_reports')
+REPORT_CACHE_MAX_BYTES = int(os.environ.get('REPORT_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+REPORT_CACHE_TODAY_TTL = float(os.environ.get('REPORT_CACHE_TODAY_TTL', '300'))
+# Finished job records are forgotten after this many seconds (cached files may live longer)
+REPORT_JOB_RETENTION = float(os.environ.get('REPORT_JOB_RETENTION', '3600'))
+# Seconds between two reads of a running job's progress
+REPORT_PROGRESS_INTERVAL = 0.5
+
+
+def report_key(process, start_dt, end_dt, processes=()):
+    """Cache key of a report; ALL_PROCESSES reports are keyed by their processes."""
+    scope = (ALL_PROCESSES,) + tuple(sorted(processes)) if process == ALL_PROCESSES else process
+    return scope, start_dt and start_dt.date(), end_dt and end_dt.date()
+
+
+class ReportJob:
+    def __init__(self, key, filename, process, processes):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.filename = filename
+        self.process = process
+        self.processes = processes  # every process whose data the workbook holds
+        self.status = 'queued'   # queued -> running -> done | failed
+        self.progress = 0.0
+        self.error = None
+        self.path = None
+        self.cached = False
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'progress': round(self.progress, 3),
+            'error': self.error,
+            'cached': self.cached,
+            'filename': self.filename,
+        }
+
+
+class ReportCache:
+    """LRU cache of workbook files, bounded by total size."""
+
+    def __init__(self, directory=REPORT_CACHE_DIR, max_bytes=REPORT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (path, size, expires_at or None)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.directory, f"{digest}-{uuid.uuid4().hex[:8]}.xlsx")
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                path, size, expires_at = entry
+                if (expires_at is None or expires_at > time.time()) and os.path.exists(path):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return path
+                self._drop(key)
+            self.misses += 1
+            return None
+
+    def put(self, key, path, ttl=None):
+        size = os.path.getsize(path)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (path, size, time.time() + ttl if ttl else None)
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        path, size, _ = self._entries.pop(key)
+        self._bytes -= size
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses}
+
+
+def cache_ttl(end_dt):
+    """None (cache until evicted) for ranges that ended before today, else the short TTL."""
+    today = datetime.combine(date.today(), datetime.min.time())
+    return REPORT_CACHE_TODAY_TTL if end_dt is None or end_dt > today else None
+
+
+_progress = None  # in a report worker process: the progress slots shared with the web worker
+
+
+def _init_worker(progress):
+    global _progress
+    _progress = progress
+
+
+def build_report(process, processes, start_dt, end_dt, path, slot):
+    """
+    Runs in a report worker process: writes the workbook of one job to `path` and
+    returns its number of data rows (0 = no login data). Progress goes to _progress[slot].
+    """
+    _progress[slot] = 0.0
+    conn = get_db_connection()
+    try:
+        if start_dt is None:
+            first_day, last_day = get_login_range(conn, process, processes)
+            if first_day is None:
+                return 0
+            start_dt = datetime.combine(first_day, datetime.min.time())
+            end_dt = datetime.combine(last_day, datetime.min.time()) + timedelta(days=1)
+
+        progress = lambda fraction: _progress.__setitem__(slot, fraction)
+        if process == ALL_PROCESSES:
+            _, row_count = stream_org_workbook(conn, start_dt, end_dt, processes, output=path, progress=progress)
+        else:
+            _, row_count = stream_workbook(conn, process, start_dt, end_dt, output=path, progress=progress)
+        return row_count
+    finally:
+        conn.close()
+
+
+class ReportJobQueue:
+    def __init__(self, workers=REPORT_WORKERS, cache=None):
+        self.cache = cache or ReportCache()
+        self.workers = workers
+        # One waiting thread per running job, so at most `workers` jobs hold a worker process
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='report')
+        self._lock = threading.Lock()
+        self._jobs = {}      # job id -> ReportJob
+        self._active = {}    # key -> job id of the queued/running job
+        self._pool = None    # worker processes, started with the first job
+        self._progress = None
+        self._slots = queue.Queue()
+        for slot in range(workers):
+            self._slots.put(slot)
+
+    def _worker_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking the web worker with its DB pool and hub threads is not safe
+                context = multiprocessing.get_context('spawn')
+                self._progress = context.RawArray('d', self.workers)
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=context,
+                                                 initializer=_init_worker, initargs=(self._progress,))
+            return self._pool, self._progress
+
+    def submit(self, process, start_dt, end_dt, filename, processes=()):
+        """
+        Return a job for the report of `process`, or of `processes` for ALL_PROCESSES;
+        finished immediately when the workbook is cached.
+        """
+        processes = sorted(processes) if process == ALL_PROCESSES else [process]
+        key = report_key(process, start_dt, end_dt, processes)
+        self._forget_old_jobs()
+
+        with self._lock:
+            active = self._active.get(key)
+            if active is not None:
+                return self._jobs[active]
+
+            job = ReportJob(key, filename, process, processes)
+            self._jobs[job.id] = job
+            path = self.cache.get(key)
+            if path is not None:
+                job.status, job.progress, job.path, job.cached = 'done', 1.0, path, True
+                job.finished_at = time.time()
+                return job
+            self._active[key] = job.id
+
+        self._executor.submit(self._run, job, start_dt, end_dt)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, start_dt, end_dt):
+        job.status = 'running'
+        slot = self._slots.get()
+        try:
+            path = self.cache.path_for(job.key)
+            pool, progress = self._worker_pool()
+            future = pool.submit(build_report, job.process, job.processes, start_dt, end_dt, path, slot)
+            while True:
+                try:
+                    row_count = future.result(timeout=REPORT_PROGRESS_INTERVAL)
+                    break
+                except TimeoutError:
+                    job.progress = progress[slot]
+            if row_count == 0:
+                if os.path.exists(path):
+                    os.remove(path)
+                raise LookupError("No login data found")
+
+            self.cache.put(job.key, path, ttl=cache_ttl(None if job.key[2] is None else end_dt))
+            job.path = path
+            job.progress = 1.0
+            job.status = 'done'
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                with self._lock:
+                    self._pool = None  # a worker died (e.g. OOM killed); start a fresh pool next time
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            self._slots.put(slot)
+            job.finished_at = time.time()
+            with self._lock:
+                self._active.pop(job.key, None)
+
+    def _forget_old_jobs(self):
+        cutoff = time.time() - REPORT_JOB_RETENTION
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items()
+                           if job.finished_at is not None and job.finished_at < cutoff]:
+                del self._jobs[job_id]
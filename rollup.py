@@ -0,0 +1,143 @@
+"""
+Per-employee, per-day, per-activity totals (activity_daily_rollup).
+
+Rows are maintained incrementally: every UPDATE that closes activities OUTPUTs the
+closed rows into @closed and the same batch MERGEs them into the rollup, so the
+rollup commits together with the stop. `flask rollup rebuild` backfills a date range
+from the activity table and `flask rollup check` compares the two.
+"""
+import sys
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+
+from db import get_db_connection
+
+_DECLARE_CLOSED = """
+SET NOCOUNT ON;
+DECLARE @closed TABLE (
+    emp_id VARCHAR(20), activity_type NVARCHAR(20), activity_name NVARCHAR(100),
+    start_time DATETIME, seconds INT
+);
+"""
+
+# HOLDLOCK: two batches closing activities of the same key at once must not both insert
+_MERGE_CLOSED = """
+MERGE activity_daily_rollup WITH (HOLDLOCK) AS r
+USING (
+    SELECT emp_id, CAST(start_time AS DATE) AS log_date, activity_type, activity_name,
+           SUM(seconds) AS seconds, COUNT(*) AS activities
+    FROM @closed
+    WHERE seconds IS NOT NULL
+    GROUP BY emp_id, CAST(start_time AS DATE), activity_type, activity_name
+) AS c
+ON r.emp_id = c.emp_id AND r.log_date = c.log_date
+   AND r.activity_type = c.activity_type AND r.activity_name = c.activity_name
+WHEN MATCHED THEN
+    UPDATE SET total_seconds = r.total_seconds + c.seconds, activity_count = r.activity_count + c.activities
+WHEN NOT MATCHED THEN
+    INSERT (emp_id, log_date, activity_type, activity_name, total_seconds, activity_count)
+    VALUES (c.emp_id, c.log_date, c.activity_type, c.activity_name, c.seconds, c.activities);
+"""
+
+
+# OUTPUT clause to place between SET and WHERE of an UPDATE of `activity` that closes rows
+CLOSED_OUTPUT = ("OUTPUT inserted.emp_id, inserted.activity_type, inserted.activity_name, inserted.start_time, "
+                 "DATEDIFF(SECOND, 0, inserted.total_duration) INTO @closed")
+
+
+def with_rollup(*updates):
+    """One batch: the given closing UPDATEs followed by the rollup MERGE."""
+    return _DECLARE_CLOSED + ";\n".join(updates) + ";\n" + _MERGE_CLOSED
+
+
+# Rollup rows recomputed from the activity table for [start, end), archived months included
+_RAW_TOTALS = """
+    SELECT emp_id, CAST(start_time AS DATE) AS log_date, activity_type, activity_name,
+           SUM(DATEDIFF(SECOND, 0, total_duration)) AS total_seconds, COUNT(*) AS activity_count
+    FROM activity_history
+    WHERE start_time >= ? AND start_time < ? AND stop_time IS NOT NULL AND total_duration IS NOT NULL
+    GROUP BY emp_id, CAST(start_time AS DATE), activity_type, activity_name
+"""
+
+
+def rebuild(cursor, start_day, end_day):
+    """Replace the rollup rows of [start_day, end_day) with totals from the activity table."""
+    params = [start_day, end_day]
+    cursor.execute("DELETE FROM activity_daily_rollup WHERE log_date >= ? AND log_date < ?", start_day, end_day)
+    cursor.execute(f"""
+        INSERT INTO activity_daily_rollup (emp_id, log_date, activity_type, activity_name, total_seconds, activity_count)
+        {_RAW_TOTALS}
+    """, params)
+    return cursor.rowcount
+
+
+def check(cursor, start_day, end_day):
+    """Rows of [start_day, end_day) where the rollup and the activity table disagree."""
+    params = [start_day, end_day, start_day, end_day]
+    cursor.execute(f"""
+        SELECT COALESCE(raw.emp_id, r.emp_id), COALESCE(raw.log_date, r.log_date),
+               COALESCE(raw.activity_type, r.activity_type), COALESCE(raw.activity_name, r.activity_name),
+               raw.total_seconds, r.total_seconds, raw.activity_count, r.activity_count
+        FROM ({_RAW_TOTALS}) AS raw
+        FULL OUTER JOIN (
+            SELECT * FROM activity_daily_rollup WHERE log_date >= ? AND log_date < ?
+        ) AS r
+          ON r.emp_id = raw.emp_id AND r.log_date = raw.log_date
+         AND r.activity_type = raw.activity_type AND r.activity_name = raw.activity_name
+        WHERE raw.emp_id IS NULL OR r.emp_id IS NULL
+           OR raw.total_seconds <> r.total_seconds OR raw.activity_count <> r.activity_count
+        ORDER BY 2, 1, 3, 4
+    """, params)
+    return cursor.fetchall()
+
+
+def _day_range(start, end):
+    start_day = datetime.strptime(start, "%Y-%m-%d").date()
+    end_day = datetime.strptime(end, "%Y-%m-%d").date() + timedelta(days=1)
+    return start_day, end_day
+
+
+@click.group('rollup')
+def rollup_cli():
+    """Maintain the activity_daily_rollup table."""
+
+
+@rollup_cli.command('rebuild')
+@click.option('--start', required=True, help="First day, YYYY-MM-DD")
+@click.option('--end', required=True, help="Last day (inclusive), YYYY-MM-DD")
+@click.option('--batch-days', default=31, show_default=True, help="Days rebuilt per transaction")
+@with_appcontext
+def rebuild_command(start, end, batch_days):
+    """Backfill / rebuild the rollup from the activity table."""
+    start_day, end_day = _day_range(start, end)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    day = start_day
+    while day < end_day:
+        batch_end = min(day + timedelta(days=batch_days), end_day)
+        rows = rebuild(cursor, day, batch_end)
+        conn.commit()
+        click.echo(f"{day} .. {batch_end - timedelta(days=1)}: {rows} rollup rows")
+        day = batch_end
+    conn.close()
+
+
+@rollup_cli.command('check')
+@click.option('--start', required=True, help="First day, YYYY-MM-DD")
+@click.option('--end', required=True, help="Last day (inclusive), YYYY-MM-DD")
+@with_appcontext
+def check_command(start, end):
+    """Compare the rollup with the activity table; exits 1 on mismatches."""
+    start_day, end_day = _day_range(start, end)
+    conn = get_db_connection()
+    mismatches = check(conn.cursor(), start_day, end_day)
+    conn.close()
+
+    for emp_id, log_date, activity_type, activity_name, raw_seconds, rollup_seconds, raw_count, rollup_count in mismatches:
+        click.echo(f"{log_date} {emp_id} {activity_type}/{activity_name}: "
+                   f"raw {raw_seconds}s x{raw_count}, rollup {rollup_seconds}s x{rollup_count}")
+    click.echo(f"{len(mismatches)} mismatching rollup rows")
+    if mismatches:
+        sys.exit(1)
@@ -0,0 +1,40 @@
+"""
+Production entry point: one worker process serving HTTP and SocketIO on eventlet
+(default) or gevent, with the database calls on the bounded DB executor (db_executor.py).
+
+    pip install eventlet
+    python serve.py                                 # SOCKETIO_ASYNC_MODE=eventlet
+    SOCKETIO_ASYNC_MODE=gevent python serve.py      # pip install gevent gevent-websocket
+
+or under gunicorn, which does the monkey patching itself (one worker per process; for
+several, set SOCKETIO_MESSAGE_QUEUE and use sticky sessions, see event_bus.py and README):
+
+    SOCKETIO_ASYNC_MODE=eventlet gunicorn -k eventlet -w 1 -b 0.0.0.0:5000 serve:app
+"""
+import os
+
+# The report worker processes (report.py, report_jobs.py, spawned) import this module as
+# __mp_main__; they use plain threads, query inline and never join the message queue
+REPORT_WORKER = __name__ == '__mp_main__'
+if REPORT_WORKER:
+    os.environ.update(SOCKETIO_ASYNC_MODE='threading', DB_OFFLOAD='0')
+    os.environ.pop('SOCKETIO_MESSAGE_QUEUE', None)
+ASYNC_MODE = os.environ.setdefault('SOCKETIO_ASYNC_MODE', 'eventlet')
+
+# Cooperative sockets, locks and sleeps everywhere; must run before anything else is imported
+if ASYNC_MODE == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+elif ASYNC_MODE in ('gevent', 'gevent_uwsgi'):
+    from gevent import monkey
+    monkey.patch_all()
+
+from app import app, socketio, startup  # noqa: E402
+
+if not REPORT_WORKER:
+    startup()
+
+if __name__ == '__main__':
+    # threading mode falls back to Werkzeug, only meant for comparisons (benchmarks/bench_async.py)
+    options = {'allow_unsafe_werkzeug': True} if socketio.async_mode == 'threading' else {}
+    socketio.run(app, host=os.environ.get('HOST', '0.0.0.0'), port=int(os.environ.get('PORT', '5000')), **options)
@@ -0,0 +1,68 @@
+"""
+Per-employee cache of the active-session lookup (helpers.get_active_session).
+
+"No active activity" is cached too, so requests of idle associates stop hitting the
+database. /start, /stop and stop_all_open_activities invalidate the employee's entry;
+the TTL bounds how long a change made by another worker process can go unseen.
+"""
+import os
+import threading
+import time
+
+ACTIVE_SESSION_CACHE_TTL = float(os.environ.get('ACTIVE_SESSION_CACHE_TTL', '60'))
+ACTIVE_SESSION_CACHE_SIZE = int(os.environ.get('ACTIVE_SESSION_CACHE_SIZE', '10000'))
+
+
+class ActiveSessionCache:
+    def __init__(self, load, ttl=ACTIVE_SESSION_CACHE_TTL, max_entries=ACTIVE_SESSION_CACHE_SIZE):
+        self._load = load
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}  # emp_id -> (active session dict or None, expires_at)
+        self._generation = 0  # bumped by every invalidate()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, emp_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(emp_id)
+            if entry is not None and entry[1] > now:
+                self.hits += 1
+                if entry[0] is None:
+                    self.negative_hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = self._generation
+
+        value = self._load(emp_id)
+        with self._lock:
+            if generation != self._generation:
+                # Invalidated while loading: the value may already be stale, don't keep it
+                return value
+            if len(self._entries) >= self.max_entries and emp_id not in self._entries:
+                # Drop the oldest entry (dicts keep insertion order)
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[emp_id] = (value, now + self.ttl)
+        return value
+
+    def invalidate(self, emp_id):
+        with self._lock:
+            self._generation += 1
+            if self._entries.pop(emp_id, None) is not None:
+                self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'negative_hits': self.negative_hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'invalidations': self.invalidations,
+            }